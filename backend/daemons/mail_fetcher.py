@@ -14,5 +14,5 @@ settings.update(settings.global_conf)
 app_config = CFG(settings)
 app_config.configure_filedepot()
 
-daemon = MailFetcherDaemon(app_config, burst=False)
+daemon = MailFetcherDaemon(app_config, burst=False, settings=settings)
 daemon.run()
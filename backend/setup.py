@@ -77,6 +77,14 @@ mysql_require = [
 postgresql_require = [
     'psycopg2',
 ]
+
+argon2_require = [
+    'argon2-cffi',
+]
+
+bcrypt_require = [
+    'bcrypt',
+]
 # Python version adaptations
 if sys.version_info < (3, 5):
     requires.append('typing')
@@ -111,6 +119,8 @@ setup(
         'testing': tests_require,
         'mysql': mysql_require,
         'postgresql': postgresql_require,
+        'argon2': argon2_require,
+        'bcrypt': bcrypt_require,
     },
     install_requires=requires,
     entry_points={
@@ -128,6 +138,9 @@ setup(
             'db_init = tracim_backend.command.database:InitializeDBCommand',
             'db_delete = tracim_backend.command.database:DeleteDBCommand',
             'webdav start = tracim_backend.command.webdav:WebdavRunnerCommand',
+            'preview cache report = tracim_backend.command.preview:PreviewCacheReportCommand',
+            'preview cache prune = tracim_backend.command.preview:PreviewCachePruneCommand',
+            'revision compact = tracim_backend.command.revision:RevisionCompactCommand',
         ]
     },
     message_extractors={'tracim_backend': [
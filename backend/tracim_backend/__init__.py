@@ -22,6 +22,9 @@ from tracim_backend.lib.utils.authentification import BASIC_AUTH_WEBUI_REALM
 from tracim_backend.lib.utils.authorization import AcceptAllAuthorizationPolicy
 from tracim_backend.lib.utils.authorization import TRACIM_DEFAULT_PERM
 from tracim_backend.lib.utils.cors import add_cors_support
+from tracim_backend.lib.utils.session import REDIS_SESSION_TYPE
+from tracim_backend.lib.utils.session import configure_redis_session_store
+from tracim_backend.lib.utils.session import configure_redis_user_versions
 from tracim_backend.lib.webdav import WebdavAppFactory
 from tracim_backend.views import BASE_API_V2
 from tracim_backend.views.contents_api.html_document_controller import HTMLDocumentController  # nopep8
@@ -60,9 +63,14 @@ def web(global_config, **local_settings):
     # set CFG object
     app_config = CFG(settings)
     app_config.configure_filedepot()
+    app_config.configure_password_hasher()
     settings['CFG'] = app_config
     configurator = Configurator(settings=settings, autocommit=True)
     # Add AuthPolicy
+    if app_config.SESSION_TYPE == REDIS_SESSION_TYPE:
+        configure_redis_session_store(app_config)
+    elif app_config.MULTI_NODE_ENABLED:
+        configure_redis_user_versions(app_config)
     configurator.include("pyramid_beaker")
     configurator.include("pyramid_multiauth")
     policies = [
@@ -72,7 +80,8 @@ def web(global_config, **local_settings):
             api_user_email_login_header=TRACIM_API_USER_EMAIL_LOGIN_HEADER
         ),
         TracimBasicAuthAuthenticationPolicy(
-            realm=BASIC_AUTH_WEBUI_REALM
+            realm=BASIC_AUTH_WEBUI_REALM,
+            credentials_cache=app_config.get_credentials_cache(),
         ),
     ]
     configurator.include(add_cors_support)
@@ -71,6 +71,7 @@ class InitializeDBCommand(AppContextCommand):
         engine = get_engine(settings)
         session_factory = get_session_factory(engine)
         app_config = CFG(settings)
+        app_config.configure_password_hasher()
         print("- Populate database with default data -")
         with transaction.manager:
             dbsession = get_tm_session(session_factory, transaction.manager)
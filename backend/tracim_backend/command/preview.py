@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+import argparse
+
+from pyramid.paster import get_appsettings
+
+from tracim_backend import CFG
+from tracim_backend.command import AppContextCommand
+from tracim_backend.lib.preview.cache import PreviewCacheManager
+
+
+class PreviewCacheCommand(AppContextCommand):
+    auto_setup_context = False
+
+    def get_preview_cache_manager(
+            self,
+            parsed_args: argparse.Namespace,
+    ) -> PreviewCacheManager:
+        settings = get_appsettings(parsed_args.config_file)
+        settings.update(settings.global_conf)
+        app_config = CFG(settings)
+        return PreviewCacheManager.from_config(app_config)
+
+
+class PreviewCacheReportCommand(PreviewCacheCommand):
+
+    def get_description(self) -> str:
+        return "Report preview cache usage and hit/miss rates"
+
+    def take_action(self, parsed_args: argparse.Namespace) -> None:
+        super(PreviewCacheReportCommand, self).take_action(parsed_args)
+        preview_cache = self.get_preview_cache_manager(parsed_args)
+        report = preview_cache.report()
+        print('Preview cache dir: {}'.format(preview_cache.cache_dir))
+        print('Size: {} bytes ({} files)'.format(
+            report.size,
+            report.files_count,
+        ))
+        print('Max size: {}'.format(
+            '{} bytes'.format(report.max_size) if report.max_size
+            else 'unlimited'
+        ))
+        print('Eviction policy: {}'.format(preview_cache.eviction_policy))
+        print('Hits: {}'.format(report.hits))
+        print('Misses: {}'.format(report.misses))
+        if report.hit_rate is not None:
+            print('Hit rate: {:.1%}'.format(report.hit_rate))
+        print('Evictions: {}'.format(report.evictions))
+
+
+class PreviewCachePruneCommand(PreviewCacheCommand):
+
+    def get_description(self) -> str:
+        return "Remove previews from cache according to eviction policy"
+
+    def get_parser(self, prog_name: str) -> argparse.ArgumentParser:
+        parser = super().get_parser(prog_name)
+        parser.add_argument(
+            "--max-size",
+            help='max size of preview cache in bytes, default is '
+                 'preview_cache.max_size config value',
+            dest='max_size',
+            type=int,
+            required=False,
+            default=None,
+        )
+        return parser
+
+    def take_action(self, parsed_args: argparse.Namespace) -> None:
+        super(PreviewCachePruneCommand, self).take_action(parsed_args)
+        preview_cache = self.get_preview_cache_manager(parsed_args)
+        max_size = parsed_args.max_size
+        if max_size is None:
+            max_size = preview_cache.max_size
+        if not max_size:
+            print(
+                'Preview cache size is unlimited, set '
+                'preview_cache.max_size or use --max-size'
+            )
+            return
+        evicted_entries = preview_cache.prune(max_size=max_size)
+        print('{} previews removed ({} bytes)'.format(
+            len(evicted_entries),
+            sum(entry.size for entry in evicted_entries),
+        ))
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import argparse
+
+from pyramid.scripting import AppEnvironment
+
+from tracim_backend.command import AppContextCommand
+from tracim_backend.lib.core.revision_compaction import RevisionCompactor
+
+
+class RevisionCompactCommand(AppContextCommand):
+
+    def get_description(self) -> str:
+        return "Coalesce file revisions made by same author within " \
+               "revision_compaction.window, except recent ones"
+
+    def get_parser(self, prog_name: str) -> argparse.ArgumentParser:
+        parser = super().get_parser(prog_name)
+        parser.add_argument(
+            "--window",
+            help='max delay in seconds between coalesced revisions, '
+                 'default is revision_compaction.window config value',
+            dest='window',
+            type=int,
+            required=False,
+            default=None,
+        )
+        parser.add_argument(
+            "--retention-days",
+            help='keep all revisions of last days, default is '
+                 'revision_compaction.retention_days config value',
+            dest='retention_days',
+            type=int,
+            required=False,
+            default=None,
+        )
+        return parser
+
+    def take_app_action(
+            self,
+            parsed_args: argparse.Namespace,
+            app_context: AppEnvironment
+    ) -> None:
+        session = app_context['request'].dbsession
+        app_config = app_context['registry'].settings['CFG']
+        compactor = RevisionCompactor.from_config(session, app_config)
+        if parsed_args.window is not None:
+            compactor.window = parsed_args.window
+        if parsed_args.retention_days is not None:
+            compactor.retention_days = parsed_args.retention_days
+        if not compactor.enabled:
+            print(
+                'Revision compaction is disabled, set '
+                'revision_compaction.window or use --window'
+            )
+            return
+        removed_nb = compactor.compact_all()
+        print('{} revisions removed'.format(removed_nb))
@@ -11,6 +11,17 @@ from paste.deploy.converters import asbool
 from tracim_backend.app_models.validator import update_validators
 from tracim_backend.extensions import app_list
 from tracim_backend.lib.utils.logger import logger
+from tracim_backend.lib.utils.password import BCRYPT_DEFAULT_ROUNDS
+from tracim_backend.lib.utils.password import CREDENTIALS_CACHE_DEFAULT_MAX_SIZE  # nopep8
+from tracim_backend.lib.utils.password import CREDENTIALS_CACHE_DEFAULT_TTL
+from tracim_backend.lib.utils.password import PASSWORD_HASH_SCHEMES
+from tracim_backend.lib.utils.password import PBKDF2_DEFAULT_ITERATIONS
+from tracim_backend.lib.utils.password import PBKDF2_SHA256_SCHEME
+from tracim_backend.lib.utils.password import PasswordHasher
+from tracim_backend.lib.utils.password import AuthenticatedUserCache
+from tracim_backend.lib.utils.password import VerifiedCredentialsCache
+from tracim_backend.lib.utils.password import set_authenticated_user_cache
+from tracim_backend.lib.utils.password import set_password_hasher
 from depot.manager import DepotManager
 from tracim_backend.app_models.applications import Application
 from tracim_backend.app_models.contents import CONTENT_TYPES
@@ -109,6 +120,18 @@ class CFG(object):
             raise Exception(
                 mandatory_msg.format('depot_storage_name')
             )
+        self.DEPOT_STORAGE_DEDUPLICATION = asbool(settings.get(
+            'depot_storage_deduplication',
+            False,
+        ))
+        self.REVISION_COMPACTION_WINDOW = int(settings.get(
+            'revision_compaction.window',
+            0,
+        ))
+        self.REVISION_COMPACTION_RETENTION_DAYS = int(settings.get(
+            'revision_compaction.retention_days',
+            0,
+        ))
         self.PREVIEW_CACHE_DIR = settings.get(
             'preview_cache_dir',
         )
@@ -117,6 +140,21 @@ class CFG(object):
                 'ERROR: preview_cache_dir configuration is mandatory. '
                 'Set it before continuing.'
             )
+        self.PREVIEW_CACHE_MAX_SIZE = int(settings.get(
+            'preview_cache.max_size',
+            0,
+        ))
+        self.PREVIEW_CACHE_EVICTION_POLICY = settings.get(
+            'preview_cache.eviction_policy',
+            'lru',
+        ).upper()
+        if self.PREVIEW_CACHE_EVICTION_POLICY not in ('LRU', 'LFU'):
+            raise Exception(
+                'preview_cache.eviction_policy '
+                'can ''be "lru" or "lfu", not "{}"'.format(
+                    self.PREVIEW_CACHE_EVICTION_POLICY,
+                )
+            )
 
         # TODO - G.M - 2018-09-11 - Deprecated param
         # self.DATA_UPDATE_ALLOWED_DURATION = int(settings.get(
@@ -132,6 +170,11 @@ class CFG(object):
             'session.reissue_time',
             120
         ))
+        self.SESSION_TYPE = settings.get('session.type', 'file')
+        self.SESSION_TIMEOUT = int(settings.get(
+            'session.timeout',
+            604800,
+        ))
         self.WEBSITE_TITLE = settings.get(
             'website.title',
             'TRACIM',
@@ -219,6 +262,34 @@ class CFG(object):
             'user.reset_password.validity',
             '900'
         ))
+        self.USER_PASSWORD_HASH_SCHEME = settings.get(
+            'user.password.hash_scheme',
+            PBKDF2_SHA256_SCHEME,
+        ).lower()
+        if self.USER_PASSWORD_HASH_SCHEME not in PASSWORD_HASH_SCHEMES:
+            raise Exception(
+                'user.password.hash_scheme '
+                'can ''be "{}", not "{}"'.format(
+                    '", "'.join(PASSWORD_HASH_SCHEMES),
+                    self.USER_PASSWORD_HASH_SCHEME,
+                )
+            )
+        self.USER_PASSWORD_PBKDF2_ITERATIONS = int(settings.get(
+            'user.password.pbkdf2_iterations',
+            PBKDF2_DEFAULT_ITERATIONS,
+        ))
+        self.USER_PASSWORD_BCRYPT_ROUNDS = int(settings.get(
+            'user.password.bcrypt_rounds',
+            BCRYPT_DEFAULT_ROUNDS,
+        ))
+        self.USER_AUTH_CACHE_TTL = int(settings.get(
+            'user.auth_cache.ttl',
+            CREDENTIALS_CACHE_DEFAULT_TTL,
+        ))
+        self.USER_AUTH_CACHE_MAX_SIZE = int(settings.get(
+            'user.auth_cache.max_size',
+            CREDENTIALS_CACHE_DEFAULT_MAX_SIZE,
+        ))
 
         self.DEBUG = asbool(settings.get('debug', False))
         # TODO - G.M - 27-03-2018 - [Email] Restore email config
@@ -379,10 +450,103 @@ class CFG(object):
             'email.reply.lockfile_path',
             ''
         )
+        self.EMAIL_REPLY_WORKERS = int(settings.get(
+            'email.reply.workers',
+            4,
+        ))
+        self.EMAIL_REPLY_INGESTION_MODE = settings.get(
+            'email.reply.ingestion_mode',
+            'http',
+        ).upper()
+        if self.EMAIL_REPLY_INGESTION_MODE not in (
+                self.CST.HTTP,
+                self.CST.DIRECT,
+        ):
+            raise Exception(
+                'email.reply.ingestion_mode '
+                'can ''be "{}" or "{}", not "{}"'.format(
+                    self.CST.HTTP,
+                    self.CST.DIRECT,
+                    self.EMAIL_REPLY_INGESTION_MODE,
+                )
+            )
+        self.EMAIL_REPLY_INGESTION_BATCH_SIZE = int(settings.get(
+            'email.reply.ingestion.batch_size',
+            50,
+        ))
         if not self.EMAIL_REPLY_LOCKFILE_PATH and self.EMAIL_REPLY_ACTIVATED:
             raise Exception(
                 mandatory_msg.format('email.reply.lockfile_path')
             )
+        default_uid_state_path = ''
+        if self.EMAIL_REPLY_LOCKFILE_PATH:
+            default_uid_state_path = '{}.uids.json'.format(
+                self.EMAIL_REPLY_LOCKFILE_PATH,
+            )
+        self.EMAIL_REPLY_UID_STATE_PATH = settings.get(
+            'email.reply.uid_state_path',
+            default_uid_state_path,
+        )
+        self.EMAIL_REPLY_IMAP_FETCH_CHUNK_SIZE = int(settings.get(
+            'email.reply.imap.fetch_chunk_size',
+            50,
+        ))
+        # Default mailbox first, then additional ones whose settings default
+        # to default mailbox ones.
+        self.EMAIL_REPLY_IMAP_MAILBOXES = [
+            ImapMailbox(
+                name=ImapMailbox.DEFAULT_NAME,
+                server=self.EMAIL_REPLY_IMAP_SERVER,
+                port=self.EMAIL_REPLY_IMAP_PORT,
+                user=self.EMAIL_REPLY_IMAP_USER,
+                password=self.EMAIL_REPLY_IMAP_PASSWORD,
+                folder=self.EMAIL_REPLY_IMAP_FOLDER,
+                use_ssl=self.EMAIL_REPLY_IMAP_USE_SSL,
+                use_idle=self.EMAIL_REPLY_IMAP_USE_IDLE,
+            )
+        ]
+        mailbox_names = settings.get('email.reply.imap.mailboxes', '')
+        for name in mailbox_names.split(','):
+            name = name.strip()
+            if not name:
+                continue
+            if name in [m.name for m in self.EMAIL_REPLY_IMAP_MAILBOXES]:
+                raise Exception(
+                    'email.reply.imap.mailboxes: mailbox "{}" is '
+                    'defined twice'.format(name)
+                )
+            prefix = 'email.reply.imap.mailbox.{}.'.format(name)
+            self.EMAIL_REPLY_IMAP_MAILBOXES.append(ImapMailbox(
+                name=name,
+                server=settings.get(
+                    prefix + 'server',
+                    self.EMAIL_REPLY_IMAP_SERVER,
+                ),
+                port=settings.get(
+                    prefix + 'port',
+                    self.EMAIL_REPLY_IMAP_PORT,
+                ),
+                user=settings.get(
+                    prefix + 'user',
+                    self.EMAIL_REPLY_IMAP_USER,
+                ),
+                password=settings.get(
+                    prefix + 'password',
+                    self.EMAIL_REPLY_IMAP_PASSWORD,
+                ),
+                folder=settings.get(
+                    prefix + 'folder',
+                    self.EMAIL_REPLY_IMAP_FOLDER,
+                ),
+                use_ssl=asbool(settings.get(
+                    prefix + 'use_ssl',
+                    self.EMAIL_REPLY_IMAP_USE_SSL,
+                )),
+                use_idle=asbool(settings.get(
+                    prefix + 'use_idle',
+                    self.EMAIL_REPLY_IMAP_USE_IDLE,
+                )),
+            ))
 
         self.EMAIL_PROCESSING_MODE = settings.get(
             'email.processing_mode',
@@ -415,6 +579,17 @@ class CFG(object):
             0,
         ))
 
+        ###
+        # MULTI NODE
+        ###
+
+        # coordinate nodes (mail fetcher lock, webdav locks, user cache
+        # invalidation) through redis configured with email.async.redis.*
+        self.MULTI_NODE_ENABLED = asbool(settings.get(
+            'multi_node.enabled',
+            False,
+        ))
+
         ###
         # WSGIDAV (Webdav server)
         ###
@@ -546,6 +721,27 @@ class CFG(object):
 
         self.PREVIEW_JPG_ALLOWED_DIMS = allowed_dims
 
+        self.PREVIEW_GENERATION_PROCESSING_MODE = settings.get(
+            'preview.generation.processing_mode',
+            'lazy',
+        ).upper()
+        if self.PREVIEW_GENERATION_PROCESSING_MODE not in (
+                self.CST.ASYNC,
+                self.CST.LAZY,
+        ):
+            raise Exception(
+                'preview.generation.processing_mode '
+                'can ''be "{}" or "{}", not "{}"'.format(
+                    self.CST.ASYNC,
+                    self.CST.LAZY,
+                    self.PREVIEW_GENERATION_PROCESSING_MODE,
+                )
+            )
+        self.PREVIEW_GENERATION_JPG_PAGES = int(settings.get(
+            'preview.generation.jpg_pages',
+            1,
+        ))
+
         self.FRONTEND_SERVE = asbool(settings.get(
             'frontend.serve', False
         ))
@@ -587,11 +783,37 @@ class CFG(object):
         depot_storage_name = self.DEPOT_STORAGE_NAME
         depot_storage_path = self.DEPOT_STORAGE_DIR
         depot_storage_settings = {'depot.storage_path': depot_storage_path}
+        if self.DEPOT_STORAGE_DEDUPLICATION:
+            depot_storage_settings['depot.backend'] = \
+                'tracim_backend.lib.storage.depot_storage.DeduplicatedFileStorage'
         DepotManager.configure(
             depot_storage_name,
             depot_storage_settings,
         )
 
+    def configure_password_hasher(self):
+
+        # Be careful, like DepotManager, password hasher is process wide.
+        set_password_hasher(PasswordHasher(
+            scheme=self.USER_PASSWORD_HASH_SCHEME,
+            pbkdf2_iterations=self.USER_PASSWORD_PBKDF2_ITERATIONS,
+            bcrypt_rounds=self.USER_PASSWORD_BCRYPT_ROUNDS,
+        ))
+
+    def get_credentials_cache(self) -> VerifiedCredentialsCache:
+        return VerifiedCredentialsCache(
+            ttl=self.USER_AUTH_CACHE_TTL,
+            max_size=self.USER_AUTH_CACHE_MAX_SIZE,
+        )
+
+    def configure_authenticated_user_cache(self):
+
+        # Be careful, authenticated user cache is process wide.
+        set_authenticated_user_cache(AuthenticatedUserCache(
+            ttl=self.USER_AUTH_CACHE_TTL,
+            max_size=self.USER_AUTH_CACHE_MAX_SIZE,
+        ))
+
     def _set_default_app(self, enabled_app_list: typing.List[str]):
 
         # init applications
@@ -711,11 +933,48 @@ class CFG(object):
     class CST(object):
         ASYNC = 'ASYNC'
         SYNC = 'SYNC'
+        LAZY = 'LAZY'
+        HTTP = 'HTTP'
+        DIRECT = 'DIRECT'
 
         TREEVIEW_FOLDERS = 'folders'
         TREEVIEW_ALL = 'all'
 
 
+class ImapMailbox(object):
+    """
+    Imap mailbox folder watched by mail fetcher
+    """
+    DEFAULT_NAME = 'default'
+
+    def __init__(
+        self,
+        name: str,
+        server: str,
+        port: str,
+        user: str,
+        password: str,
+        folder: str,
+        use_ssl: bool,
+        use_idle: bool,
+    ) -> None:
+        self.name = name
+        self.server = server
+        self.port = port
+        self.user = user
+        self.password = password
+        self.folder = folder
+        self.use_ssl = use_ssl
+        self.use_idle = use_idle
+
+    def __repr__(self):
+        return "<ImapMailbox name:{name} user:{user} folder:{folder}>".format(
+            name=self.name,
+            user=self.user,
+            folder=self.folder,
+        )
+
+
 class PreviewDim(object):
 
     def __init__(self, width: int, height: int) -> None:
@@ -2,23 +2,33 @@
 import datetime
 import os
 import re
+import time
 import typing
+from bisect import bisect_left
 from contextlib import contextmanager
+from itertools import groupby
 
 import sqlalchemy
 import transaction
 from depot.io.utils import FileIntent
 from depot.manager import DepotManager
+from filelock import FileLock
 from preview_generator.exception import UnsupportedMimeType
 from preview_generator.manager import PreviewManager
 from sqlalchemy import desc
 from sqlalchemy import func
 from sqlalchemy import or_
+from sqlalchemy import select
+from sqlalchemy import type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Query
 from sqlalchemy.orm import aliased
 from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import selectinload
 from sqlalchemy.orm.attributes import get_history
 from sqlalchemy.orm.attributes import QueryableAttribute
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.exc import MultipleResultsFound
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.orm.session import Session
 from sqlalchemy.sql.elements import and_
@@ -40,19 +50,29 @@ from tracim_backend.exceptions import SameValueError
 from tracim_backend.exceptions import UnallowedSubContent
 from tracim_backend.exceptions import WorkspacesDoNotMatch
 from tracim_backend.lib.core.notifications import NotifierFactory
+from tracim_backend.lib.preview.cache import PreviewCacheManager
+from tracim_backend.lib.preview.generator import enqueue_previews_generation
+from tracim_backend.lib.preview.generator import get_preview_lock
+from tracim_backend.lib.storage.depot_storage import compute_content_digest
+from tracim_backend.lib.storage.depot_storage import get_stored_file_digest
+from tracim_backend.lib.storage.depot_storage import spool_content
 from tracim_backend.lib.utils.logger import logger
 from tracim_backend.lib.utils.translation import DEFAULT_FALLBACK_LANG
 from tracim_backend.lib.utils.translation import Translator
 from tracim_backend.lib.utils.utils import cmp_to_key
 from tracim_backend.lib.utils.utils import current_date_for_filename
 from tracim_backend.lib.utils.utils import preview_manager_page_format
+from tracim_backend.models import get_session_transaction_manager
 from tracim_backend.models.auth import User
+from tracim_backend.models.content_tree import IN_CLAUSE_MAX_SIZE
 from tracim_backend.models.context_models import ContentInContext
 from tracim_backend.models.context_models import PreviewAllowedDim
 from tracim_backend.models.context_models import RevisionInContext
 from tracim_backend.models.data import ActionDescription
 from tracim_backend.models.data import Content
+from tracim_backend.models.data import ContentProperty
 from tracim_backend.models.data import ContentRevisionRO
+from tracim_backend.models.data import ContentTreePath
 from tracim_backend.models.data import NodeTreeItem
 from tracim_backend.models.data import RevisionReadStatus
 from tracim_backend.models.data import UserRoleInWorkspace
@@ -61,6 +81,9 @@ from tracim_backend.models.revision_protection import new_revision
 
 __author__ = 'damien'
 
+# Number of contents flushed at once by subtree operations
+SUBTREE_BATCH_SIZE = 500
+
 
 # TODO - G.M - 2018-07-24 - [Cleanup] Is this method already needed ?
 def compare_content_for_sorting_by_type_and_name(
@@ -149,6 +172,7 @@ class ContentApi(object):
         self._force_show_all_types = force_show_all_types
         self._disable_user_workspaces_filter = disable_user_workspaces_filter
         self.preview_manager = PreviewManager(self._config.PREVIEW_CACHE_DIR, create_folder=True)  # nopep8
+        self.preview_cache = PreviewCacheManager.from_config(self._config)
         default_lang = None
         if self._user:
             default_lang = self._user.lang
@@ -187,9 +211,101 @@ class ContentApi(object):
     def get_content_in_context(self, content: Content) -> ContentInContext:
         return ContentInContext(content, self._session, self._config, self._user)  # nopep8
 
-    def get_revision_in_context(self, revision: ContentRevisionRO) -> RevisionInContext:  # nopep8
-        # TODO - G.M - 2018-06-173 - create revision in context object
-        return RevisionInContext(revision, self._session, self._config, self._user) # nopep8
+    def get_revision_in_context(
+            self,
+            revision: ContentRevisionRO,
+            comment_ids: typing.Optional[typing.List[int]] = None,
+            compute_preview_infos: bool = True,
+    ) -> RevisionInContext:
+        """
+        :param comment_ids: comment ids of revision if already computed,
+        see get_revisions_in_context()
+        :param compute_preview_infos: compute preview infos of revision if
+        not known yet
+        """
+        return RevisionInContext(
+            revision,
+            self._session,
+            self._config,
+            self._user,
+            comment_ids=comment_ids,
+            compute_preview_infos=compute_preview_infos,
+        )
+
+    def get_revisions(
+            self,
+            content: Content,
+            limit: typing.Optional[int] = None,
+            after_revision_id: typing.Optional[int] = None,
+    ) -> typing.List[ContentRevisionRO]:
+        """
+        Get revisions of content, oldest first.
+        :param limit: maximum number of revisions to return, all if None or 0
+        :param after_revision_id: cursor, only return revisions more recent
+        than this one (the last revision of the previous page)
+        """
+        query = self._session.query(ContentRevisionRO)\
+            .filter(ContentRevisionRO.content_id == content.content_id)\
+            .order_by(ContentRevisionRO.revision_id)
+        if after_revision_id:
+            query = query.filter(
+                ContentRevisionRO.revision_id > after_revision_id
+            )
+        if limit:
+            query = query.limit(limit)
+        return query.all()
+
+    def get_revisions_in_context(
+            self,
+            content: Content,
+            revisions: typing.List[ContentRevisionRO],
+            compute_preview_infos: bool = True,
+    ) -> typing.List[RevisionInContext]:
+        """
+        Get given revisions of content (see get_revisions()) in context, with
+        their comment ids computed by two queries instead of queries for each
+        revision. Like RevisionInContext.comment_ids, comments of a revision
+        are comments created between its update and the next revision update.
+        :param compute_preview_infos: compute preview infos of revisions not
+        known yet, this may be slow for files with many revisions.
+        """
+        if not revisions:
+            return []
+        revisions = sorted(revisions, key=lambda revision: revision.revision_id)  # nopep8
+        # update date of revision following the last one ends comments of
+        # the last revision
+        next_updated = self._session.query(ContentRevisionRO.updated)\
+            .filter(
+                ContentRevisionRO.content_id == content.content_id,
+                ContentRevisionRO.revision_id > revisions[-1].revision_id,
+            )\
+            .order_by(ContentRevisionRO.revision_id)\
+            .limit(1)\
+            .scalar()
+        comments = Content.get_comments_query(
+            self._session,
+            [content.content_id],
+        ).filter(ContentRevisionRO.created > revisions[0].updated)
+        if next_updated:
+            comments = comments.filter(ContentRevisionRO.created < next_updated)
+
+        revisions_updated = [revision.updated for revision in revisions]
+        comment_ids = [[] for _ in revisions]
+        for comment in comments:
+            next_index = bisect_left(revisions_updated, comment.created)
+            if next_index < len(revisions) \
+                    and revisions_updated[next_index] == comment.created:
+                continue
+            comment_ids[next_index - 1].append(comment.content_id)
+
+        return [
+            self.get_revision_in_context(
+                revision,
+                comment_ids=revision_comment_ids,
+                compute_preview_infos=compute_preview_infos,
+            )
+            for revision, revision_comment_ids in zip(revisions, comment_ids)
+        ]
     
     def _get_revision_join(self) -> sqlalchemy.sql.elements.BooleanClauseList:
         """
@@ -685,11 +801,70 @@ class ContentApi(object):
         :return: The corresponding filepath
         """
         revision = self.get_one_revision(revision_id)
+        return self._get_revision_filepath(revision)
+
+    def _get_revision_filepath(self, revision: ContentRevisionRO) -> str:
         depot = DepotManager.get()
         depot_stored_file = depot.get(revision.depot_file)  # type: StoredFile
         depot_file_path = depot_stored_file._file_path  # type: str
         return depot_file_path
 
+    def fill_revision_preview_infos(
+            self,
+            revision: ContentRevisionRO,
+            file_path: str = None,
+    ) -> None:
+        """
+        Compute page number and pdf preview availability of revision file
+        with preview manager, if not already known. They are stored in
+        revision, so preview manager is asked once per revision.
+        :param revision: revision with depot file
+        :param file_path: path of revision file if already known
+        """
+        if revision.preview_available is not None:
+            return
+        file_path = file_path or self._get_revision_filepath(revision)
+        try:
+            with self._preview_lock(file_path):
+                page_nb = self.preview_manager.get_page_nb(file_path)
+                pdf_available = self.preview_manager.has_pdf_preview(
+                    file_path
+                )
+        except UnsupportedMimeType:
+            revision.preview_available = False
+            revision.preview_page_nb = None
+            revision.preview_pdf_available = False
+            return
+        revision.preview_available = True
+        revision.preview_page_nb = page_nb
+        revision.preview_pdf_available = pdf_available
+
+    def _get_revision_page_nb(
+            self,
+            revision: ContentRevisionRO,
+            file_path: str,
+    ) -> int:
+        """
+        :return: page number of revision file
+        :raise UnsupportedMimeType: if revision file has no preview
+        """
+        self.fill_revision_preview_infos(revision, file_path)
+        if not revision.preview_available:
+            raise UnsupportedMimeType(
+                'No preview available for revision {}'.format(
+                    revision.revision_id
+                )
+            )
+        return revision.preview_page_nb
+
+    def _preview_lock(self, file_path: str) -> FileLock:
+        """
+        Lock to hold while generating previews of given file, this prevent
+        concurrent generations of the same preview (by requests or by
+        preview generator daemon).
+        """
+        return get_preview_lock(self._config.PREVIEW_CACHE_DIR, file_path)
+
     # TODO - G.M - 2018-09-04 - [Cleanup] Is this method already needed ?
     def get_one_by_label_and_parent(
             self,
@@ -803,32 +978,33 @@ class ContentApi(object):
         :param workspace: workspace of folders
         :return: Content folder
         """
-        query = self._base_query(workspace)
+        # All candidate folders are loaded at once, path is resolved from
+        # their parents.
+        folders = self._base_query(workspace) \
+            .filter(
+                Content.type == CONTENT_TYPES.Folder.slug,
+                Content.label.in_(set(path_labels)),
+                Content.workspace_id == workspace.workspace_id,
+            ) \
+            .all()
         folder = None
 
         for label in path_labels:
-            # Filter query on label
-            folder_query = query \
-                .filter(
-                    Content.type == CONTENT_TYPES.Folder.slug,
-                    Content.label == label,
-                    Content.workspace_id == workspace.workspace_id,
+            parent_id = folder.content_id if folder else None
+            candidates = [
+                candidate for candidate in folders
+                if candidate.label == label
+                and candidate.parent_id == parent_id
+            ]
+            if not candidates:
+                raise NoResultFound(
+                    'No folder {} in folder {}'.format(label, parent_id)
                 )
-
-            # Search into parent folder (if already deep)
-            if folder:
-                folder_query = folder_query\
-                    .filter(
-                        Content.parent_id == folder.content_id,
-                    )
-            else:
-                folder_query = folder_query \
-                    .filter(Content.parent_id == None)
-
-            # Get thirst corresponding folder
-            folder = folder_query \
-                .order_by(Content.revision_id.desc()) \
-                .one()
+            if len(candidates) > 1:
+                raise MultipleResultsFound(
+                    'Several folders {} in folder {}'.format(label, parent_id)
+                )
+            folder = candidates[0]
 
         return folder
 
@@ -898,24 +1074,29 @@ class ContentApi(object):
         :param page_number: page number of the preview, useful for multipage content
         :return: preview_path as string
         """
-        file_path = self.get_one_revision_filepath(revision_id)
+        request_time = time.time()
+        revision = self.get_one_revision(revision_id)
+        file_path = self._get_revision_filepath(revision)
         try:
             page_number = preview_manager_page_format(page_number)
-            if page_number >= self.preview_manager.get_page_nb(file_path):
+            page_nb = self._get_revision_page_nb(revision, file_path)
+            if page_number >= page_nb:
                 raise PageOfPreviewNotFound(
                     'page_number {page_number} of content {content_id} does not exist'.format(
                         page_number=page_number,
                         content_id=content_id
                     ),
                 )
-            jpg_preview_path = self.preview_manager.get_pdf_preview(
-                file_path,
-                page=page_number
-            )
+            with self._preview_lock(file_path):
+                jpg_preview_path = self.preview_manager.get_pdf_preview(
+                    file_path,
+                    page=page_number
+                )
         except UnsupportedMimeType as exc:
             raise UnavailablePreview(
                 'No preview available for content {}, revision {}'.format(content_id, revision_id) # nopep8
             ) from exc
+        self.preview_cache.record_access(jpg_preview_path, request_time)
         return jpg_preview_path
 
     def get_full_pdf_preview_path(self, revision_id: int) -> str:
@@ -924,13 +1105,18 @@ class ContentApi(object):
         :param revision_id: id of revision
         :return: path of the full pdf preview of this revision
         """
+        request_time = time.time()
         file_path = self.get_one_revision_filepath(revision_id)
         try:
-            pdf_preview_path = self.preview_manager.get_pdf_preview(file_path)
+            with self._preview_lock(file_path):
+                pdf_preview_path = self.preview_manager.get_pdf_preview(
+                    file_path
+                )
         except UnsupportedMimeType as exc:
             raise UnavailablePreview(
                 'No preview available for revision {}'.format(revision_id)
             ) from exc
+        self.preview_cache.record_access(pdf_preview_path, request_time)
         return pdf_preview_path
 
     def get_jpg_preview_allowed_dim(self) -> PreviewAllowedDim:
@@ -959,10 +1145,13 @@ class ContentApi(object):
         :param height: height in pixel
         :return: preview_path as string
         """
-        file_path = self.get_one_revision_filepath(revision_id)
+        request_time = time.time()
+        revision = self.get_one_revision(revision_id)
+        file_path = self._get_revision_filepath(revision)
         try:
             page_number = preview_manager_page_format(page_number)
-            if page_number >= self.preview_manager.get_page_nb(file_path):
+            page_nb = self._get_revision_page_nb(revision, file_path)
+            if page_number >= page_nb:
                 raise PageOfPreviewNotFound(
                     'page {page_number} of revision {revision_id} of content {content_id} does not exist'.format(  # nopep8
                         page_number=page_number,
@@ -987,16 +1176,18 @@ class ContentApi(object):
                         height=height,
                     )
                 )
-            jpg_preview_path = self.preview_manager.get_jpeg_preview(
-                file_path,
-                page=page_number,
-                width=width,
-                height=height,
-            )
+            with self._preview_lock(file_path):
+                jpg_preview_path = self.preview_manager.get_jpeg_preview(
+                    file_path,
+                    page=page_number,
+                    width=width,
+                    height=height,
+                )
         except UnsupportedMimeType as exc:
             raise UnavailablePreview(
                 'No preview available for content {}, revision {}'.format(content_id, revision_id)  # nopep8
             ) from exc
+        self.preview_cache.record_access(jpg_preview_path, request_time)
         return jpg_preview_path
 
     def _get_all_query(
@@ -1376,6 +1567,19 @@ class ContentApi(object):
 
         self._is_content_label_free_or_raise(label, workspace, parent)
         content = item.copy(parent)
+        self._add_copy_revision(content, item, parent, workspace, label)
+        if do_save:
+            self.save(content, ActionDescription.COPY, do_notify=do_notify)
+        return content
+
+    def _add_copy_revision(
+        self,
+        content: Content,
+        item: Content,
+        parent: Content,
+        workspace: Workspace,
+        label: str,
+    ) -> ContentRevisionRO:
         # INFO - GM - 15-03-2018 - add "copy" revision
         with new_revision(
             session=self._session,
@@ -1391,27 +1595,207 @@ class ContentApi(object):
                 'content': item.id,
                 'revision': item.last_revision.revision_id,
             }
-        if do_save:
-            self.save(content, ActionDescription.COPY, do_notify=do_notify)
-        return content
+        return content.revision
+
+    def load_children(self, contents: typing.List[Content]) -> None:
+        """
+        Load children (from their current revisions) of all given contents,
+        with one query for each IN_CLAUSE_MAX_SIZE contents instead of one
+        query per content when Content.children is used. Revisions of
+        children are loaded with them.
+        """
+        contents_by_id = {content.content_id: content for content in contents}
+        children = {content_id: [] for content_id in contents_by_id}
+        content_ids = list(contents_by_id)
+        for index in range(0, len(content_ids), IN_CLAUSE_MAX_SIZE):
+            rows = self._session.query(Content, ContentTreePath.ancestor_id)\
+                .join(
+                    ContentTreePath,
+                    ContentTreePath.descendant_id == Content.id,
+                )\
+                .filter(
+                    ContentTreePath.ancestor_id.in_(
+                        content_ids[index:index + IN_CLAUSE_MAX_SIZE]
+                    ),
+                    ContentTreePath.depth == 1,
+                )\
+                .order_by(Content.id)\
+                .options(selectinload(Content.revisions))
+            for child, parent_id in rows:
+                children[parent_id].append(child)
+        for content_id, content_children in children.items():
+            set_committed_value(
+                contents_by_id[content_id],
+                'child_contents',
+                content_children,
+            )
 
-    def copy_children(self, origin_content: Content, new_content: Content):
-        for child in origin_content.children:
-            self.copy(child, new_content)
+    def get_comments(
+            self,
+            content: Content,
+            limit: typing.Optional[int] = None,
+            offset: int = 0,
+    ) -> typing.List[Content]:
+        """
+        Get valid comments of content, oldest first, with a single query.
+        :param limit: maximum number of comments to return, all if None or 0
+        :param offset: number of comments to skip
+        """
+        query = Content.get_comments_query(self._session, [content.content_id])  # nopep8
+        if offset:
+            query = query.offset(offset)
+        if limit:
+            query = query.limit(limit)
+        return query.all()
 
-    def move_recursively(self, item: Content,
-                         new_parent: Content, new_workspace: Workspace):
+    def get_comments_by_parent(
+            self,
+            contents: typing.List[Content],
+    ) -> typing.Dict[int, typing.List[Content]]:
+        """
+        Get valid comments of all given contents, oldest first, with one query
+        for each IN_CLAUSE_MAX_SIZE contents.
+        :return: comments by content id, all given contents included
+        """
+        content_ids = [content.content_id for content in contents]
+        comments = {content_id: [] for content_id in content_ids}
+        for index in range(0, len(content_ids), IN_CLAUSE_MAX_SIZE):
+            query = Content.get_comments_query(
+                self._session,
+                content_ids[index:index + IN_CLAUSE_MAX_SIZE],
+            )
+            for comment in query:
+                comments[comment.parent_id].append(comment)
+        return comments
+
+    def _get_subtree_levels(
+        self,
+        item: Content,
+    ) -> typing.Iterator[typing.List[Content]]:
+        """
+        Get all descendants of item (deleted, archived and comments
+        included), level by level, with a single query. Revisions of contents
+        are loaded with them.
+        """
+        descendants = self.get_canonical_query()\
+            .join(ContentTreePath, ContentTreePath.descendant_id == Content.id)\
+            .filter(
+                ContentTreePath.ancestor_id == item.content_id,
+                ContentTreePath.depth > 0,
+            )\
+            .order_by(ContentTreePath.depth)\
+            .add_columns(ContentTreePath.depth)\
+            .options(selectinload(Content.revisions))
+        for _, level in groupby(descendants, key=lambda row: row[1]):
+            yield [content for content, _ in level]
+
+    def _mark_revisions_read(
+        self,
+        revisions: typing.List[ContentRevisionRO],
+        read_datetime: datetime.datetime,
+    ) -> None:
+        """
+        Mark new revisions made by current user as read, like save() does,
+        without loading read statuses of other revisions.
+        """
+        if not self._user:
+            return
+        for revision in revisions:
+            revision.read_by[self._user] = read_datetime
+
+    def copy_children(
+        self,
+        origin_content: Content,
+        new_content: Content,
+    ) -> None:
+        """
+        Copy all descendants of origin_content into new_content. Contents
+        are copied level by level, with one flush for each batch of
+        contents. Copies are not notified one by one: new_content copy is
+        the notified event.
+        :param origin_content: content whose descendants are copied
+        :param new_content: new parent of copied children, usually the
+        copy of origin_content
+        """
+        read_datetime = datetime.datetime.now()
+        # Labels of copied descendants are already unique in their new
+        # parents, except in new_content which may have children.
+        used_labels = set()
+        if new_content.content_id:
+            used_labels = set(
+                label for label, in self.get_base_query(new_content.workspace)
+                .filter(Content.parent_id == new_content.content_id)
+                .with_entities(ContentRevisionRO.label)
+            )
+        copies = {origin_content.content_id: new_content}
+        for level in self._get_subtree_levels(origin_content):
+            copy_revisions = []
+            for index, child in enumerate(level, start=1):
+                parent = copies[child.parent_id]
+                if parent is new_content and child.label \
+                        and child.label in used_labels:
+                    raise ContentLabelAlreadyUsedHere(
+                        'A Content already exist with the same label {label} '
+                        ' in workspace {workspace_id} and parent as content '
+                        '{parent_id}'.format(
+                            label=child.label,
+                            workspace_id=new_content.workspace_id,
+                            parent_id=new_content.content_id,
+                        )
+                    )
+                content = child.copy(parent)
+                copy_revisions.append(self._add_copy_revision(
+                    content,
+                    child,
+                    parent,
+                    new_content.workspace,
+                    child.label,
+                ))
+                copies[child.content_id] = content
+                if index % SUBTREE_BATCH_SIZE == 0:
+                    self._session.flush()
+            self._mark_revisions_read(copy_revisions, read_datetime)
+            # next level copies need ids of their parents
+            self._session.flush()
+
+    def move_recursively(
+        self,
+        item: Content,
+        new_parent: Content,
+        new_workspace: Workspace,
+        do_notify: bool=True,
+    ) -> None:
+        """
+        Move item into new_parent of new_workspace, and all its descendants
+        into new_workspace. Item must be updatable, see new_revision.
+        Descendants keep their parent, a move revision is created for each of
+        them, level by level, with one flush for each batch of contents.
+        Only item move is notified.
+        """
+        read_datetime = datetime.datetime.now()
         self.move(item, new_parent, False, new_workspace)
-        self.save(item, do_notify=False)
+        self._session.add(item)
+        self._session.flush()
+        self._mark_revisions_read([item.revision], read_datetime)
+
+        for level in self._get_subtree_levels(item):
+            move_revisions = []
+            for index, child in enumerate(level, start=1):
+                with new_revision(
+                    session=self._session,
+                    tm=transaction.manager,
+                    content=child
+                ):
+                    child.workspace = new_workspace
+                    child.revision_type = ActionDescription.MOVE
+                move_revisions.append(child.revision)
+                if index % SUBTREE_BATCH_SIZE == 0:
+                    self._session.flush()
+            self._mark_revisions_read(move_revisions, read_datetime)
+            self._session.flush()
 
-        for child in item.children:
-            with new_revision(
-                session=self._session,
-                tm=transaction.manager,
-                content=child
-            ):
-                self.move_recursively(child, item, new_workspace)
-        return
+        if do_notify:
+            self.do_notify(item)
 
     def update_content(self, item: Content, new_label: str, new_content: str=None) -> Content:
         if item.label == new_label and item.description == new_content:
@@ -1434,9 +1818,44 @@ class ContentApi(object):
         item.revision_type = ActionDescription.EDITION
         return item
 
-    def update_file_data(self, item: Content, new_filename: str, new_mimetype: str, new_content: bytes) -> Content:
+    def _is_same_file_content(
+            self,
+            item: Content,
+            new_digest: str,
+            new_size: int,
+    ) -> bool:
+        """
+        Check if new file content is the same as current one by comparing
+        sizes and sha256 digests. Digest of current file is read from
+        current revision, or from deduplicated depot storage for revisions
+        created before digests were stored: stored file is only streamed
+        if none of them know it.
+        :param item: content to check
+        :param new_digest: sha256 digest of new file content
+        :param new_size: size of new file content
+        :return: True if content did not changed
+        """
+        if not item.depot_file:
+            return False
+        if item.file_sha256 is not None:
+            return item.file_size == new_size \
+                and item.file_sha256 == new_digest
+        stored_file = item.depot_file.file
+        stored_digest = get_stored_file_digest(stored_file)
+        if stored_digest is None:
+            stored_digest = compute_content_digest(stored_file)
+        return stored_digest == new_digest
+
+    def update_file_data(self, item: Content, new_filename: str, new_mimetype: str, new_content: typing.Union[bytes, typing.IO]) -> Content:  # nopep8
+        # New content is read only once: digest and size are computed while
+        # spooling it, storage uses the spooled copy.
+        new_content = spool_content(new_content)
         if new_mimetype == item.file_mimetype and \
-                new_content == item.depot_file.file.read():
+                self._is_same_file_content(
+                    item,
+                    new_content.digest,
+                    new_content.content_length,
+                ):
             raise SameValueError('The content did not changed')
         item.owner = self._user
         item.file_name = new_filename
@@ -1446,7 +1865,19 @@ class ContentApi(object):
             new_filename,
             new_mimetype,
         )
+        item.file_sha256 = new_content.digest
+        item.file_size = new_content.content_length
+        # new file: preview informations copied from previous revision are
+        # not valid anymore
+        item.revision.preview_available = None
+        item.revision.preview_page_nb = None
+        item.revision.preview_pdf_available = None
         item.revision_type = ActionDescription.REVISION
+        enqueue_previews_generation(
+            self._config,
+            item.revision,
+            get_session_transaction_manager(self._session),
+        )
         return item
 
     def archive(self, content: Content):
@@ -1486,20 +1917,14 @@ class ContentApi(object):
         content.revision_type = ActionDescription.UNDELETION
 
     def get_preview_page_nb(self, revision_id: int) -> typing.Optional[int]:
-        file_path = self.get_one_revision_filepath(revision_id)
-        try:
-            nb_pages = self.preview_manager.get_page_nb(file_path)
-        except UnsupportedMimeType:
-            return None
-        return nb_pages
+        revision = self.get_one_revision(revision_id)
+        self.fill_revision_preview_infos(revision)
+        return revision.preview_page_nb
 
     def has_pdf_preview(self, revision_id: int) -> bool:
-        file_path = self.get_one_revision_filepath(revision_id)
-        try:
-            has_pdf_preview = self.preview_manager.has_pdf_preview(file_path)
-        except UnsupportedMimeType:
-            has_pdf_preview = False
-        return has_pdf_preview
+        revision = self.get_one_revision(revision_id)
+        self.fill_revision_preview_infos(revision)
+        return bool(revision.preview_pdf_available)
 
     def mark_read__all(
             self,
@@ -1717,25 +2142,95 @@ class ContentApi(object):
                 contents.remove(content)
         return contents
 
+    def _get_ancestors_query(self, content_id: int) -> Query:
+        """
+        :return: query of ancestors of content, with their current revision
+        """
+        return self.get_canonical_query()\
+            .join(ContentTreePath, ContentTreePath.ancestor_id == Content.id)\
+            .filter(
+                ContentTreePath.descendant_id == content_id,
+                ContentTreePath.depth > 0,
+            )
+
     # TODO - G.M - 2018-07-24 - [Cleanup] Is this method already needed ?
     def content_under_deleted(self, content: Content) -> bool:
-        if content.parent:
-            if content.parent.is_deleted:
-                return True
-            if content.parent.parent:
-                return self.content_under_deleted(content.parent)
-        return False
+        return self._session.query(
+            self._get_ancestors_query(content.content_id)
+            .filter(Content.is_deleted == True)
+            .exists()
+        ).scalar()
 
     # TODO - G.M - 2018-07-24 - [Cleanup] Is this method already needed ?
     def content_under_archived(self, content: Content) -> bool:
-        if content.parent:
-            if content.parent.is_archived:
-                return True
-            if content.parent.parent:
-                return self.content_under_archived(content.parent)
-        return False
+        return self._session.query(
+            self._get_ancestors_query(content.content_id)
+            .filter(Content.is_archived == True)
+            .exists()
+        ).scalar()
+
+    def _get_properties_filter(
+            self,
+            properties: typing.Dict[str, typing.Any],
+    ) -> sqlalchemy.sql.elements.ClauseElement:
+        """
+        Return filter of contents whose current revision has all given top
+        level properties. With PostgreSQL, it's a JSONB containment using
+        revision properties GIN index, ContentProperty rows are used
+        otherwise.
+        :param properties: property values, must be indexable (see
+        ContentProperty.encode_value)
+        """
+        for key, value in properties.items():
+            if len(key) > ContentProperty.KEY_MAX_LENGTH:
+                raise ValueError(
+                    'Property {} can not be used as filter: only keys '
+                    'shorter than {} characters can be'.format(
+                        key,
+                        ContentProperty.KEY_MAX_LENGTH,
+                    )
+                )
+            if ContentProperty.encode_value(value) is None:
+                raise ValueError(
+                    'Property {} value can not be used as filter: only '
+                    'strings, numbers and booleans shorter than {} '
+                    'characters once JSON encoded can be'.format(
+                        key,
+                        ContentProperty.VALUE_MAX_LENGTH,
+                    )
+                )
+
+        if self._session.get_bind().dialect.name == 'postgresql':
+            return type_coerce(Content._properties, JSONB).contains(
+                properties
+            )
+        return and_(*[
+            Content.id.in_(
+                select([ContentProperty.content_id]).where(and_(
+                    ContentProperty.key == key,
+                    ContentProperty.value == ContentProperty.encode_value(value),  # nopep8
+                ))
+            )
+            for key, value in properties.items()
+        ])
+
+    def get_all_by_properties(
+            self,
+            properties: typing.Dict[str, typing.Any],
+            workspace: Workspace=None,
+    ) -> typing.List[Content]:
+        """
+        Return contents whose current revision has all given top level
+        properties, without scanning properties of all contents.
+        :param properties: property values, only strings, numbers and
+        booleans can be used
+        :param workspace: Workspace who contains Contents
+        :return: Found Contents
+        """
+        return self._base_query(workspace=workspace)\
+            .filter(self._get_properties_filter(properties))\
+            .all()
 
-    # TODO - G.M - 2018-07-24 - [Cleanup] Is this method already needed ?
     def find_one_by_unique_property(
             self,
             property_name: str,
@@ -1751,16 +2246,8 @@ class ContentApi(object):
         :param workspace: Workspace who contains Content
         :return: Found Content
         """
-        # TODO - 20160602 - Bastien: Should be JSON type query
-        # see https://www.compose.io/articles/using-json-extensions-in-\
-        # postgresql-from-python-2/
         query = self._base_query(workspace=workspace).filter(
-            Content._properties.like(
-                '%"{property_name}": "{property_value}"%'.format(
-                    property_name=property_name,
-                    property_value=property_value,
-                )
-            )
+            self._get_properties_filter({property_name: property_value})
         )
         return query.one()
 
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+import datetime
+import typing
+
+from depot.fields.upload import UploadedFile
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+from zope.sqlalchemy import mark_changed
+
+from tracim_backend.lib.utils.logger import logger
+from tracim_backend.models import get_session_transaction_manager
+from tracim_backend.models.data import ActionDescription
+from tracim_backend.models.data import Content
+from tracim_backend.models.data import ContentRevisionRO
+from tracim_backend.models.data import RevisionReadStatus
+
+if typing.TYPE_CHECKING:
+    from tracim_backend.config import CFG
+
+# Only file data updates are coalesced, other revisions (creation, status,
+# label, move...) are always kept.
+COALESCABLE_REVISION_TYPES = (ActionDescription.REVISION,)
+
+
+class RevisionCompactor(object):
+    """
+    Coalesce consecutive file revisions made by the same author: when two
+    consecutive revisions are separated by less than window seconds, only the
+    most recent one is kept. Files of removed revisions are deleted from
+    depot once transaction is committed.
+
+    Revisions are protected against deletion (see
+    tracim_backend.models.revision_protection), they are removed here with
+    SQL statements: this is the only place where history is rewritten.
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        window: int,
+        retention_days: int = 0,
+    ) -> None:
+        """
+        :param window: max delay in seconds between two coalesced revisions,
+        0 disables compaction
+        :param retention_days: revisions of last retention_days days are
+        not removed by compact_content() and compact_all()
+        """
+        self._session = session
+        self.window = window
+        self.retention_days = retention_days
+
+    @classmethod
+    def from_config(
+        cls,
+        session: Session,
+        config: 'CFG',
+    ) -> 'RevisionCompactor':
+        return cls(
+            session,
+            window=config.REVISION_COMPACTION_WINDOW,
+            retention_days=config.REVISION_COMPACTION_RETENTION_DAYS,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def is_coalescable(
+        self,
+        revision: ContentRevisionRO,
+        next_revision: ContentRevisionRO,
+    ) -> bool:
+        """
+        :return: True if revision can be removed in favour of next_revision
+        """
+        return (
+            revision.revision_type in COALESCABLE_REVISION_TYPES
+            and next_revision.revision_type in COALESCABLE_REVISION_TYPES
+            and revision.owner_id == next_revision.owner_id
+            and next_revision.updated - revision.updated
+            <= datetime.timedelta(seconds=self.window)
+        )
+
+    def get_coalescable_revisions(
+        self,
+        revisions: typing.List[ContentRevisionRO],
+        before: typing.Optional[datetime.datetime] = None,
+    ) -> typing.List[ContentRevisionRO]:
+        """
+        :param revisions: all revisions of a content, oldest first
+        :param before: only revisions updated before this date are returned
+        :return: revisions to remove, current revision is never returned
+        """
+        coalescable = []
+        for revision, next_revision in zip(revisions, revisions[1:]):
+            if before and revision.updated >= before:
+                break
+            if self.is_coalescable(revision, next_revision):
+                coalescable.append(revision)
+        return coalescable
+
+    def coalesce_last_revision(self, content: Content) -> bool:
+        """
+        Remove previous revision of content if current one coalesces it,
+        retention is not applied. Called after each file update.
+        :return: True if previous revision has been removed
+        """
+        if not self.enabled:
+            return False
+        self._session.flush()
+        revisions = self._get_revisions(content)
+        if len(revisions) < 2:
+            return False
+        previous_revision, current_revision = revisions[-2:]
+        if not self.is_coalescable(previous_revision, current_revision):
+            return False
+        self.remove_revisions(content, [previous_revision])
+        return True
+
+    def compact_content(self, content: Content) -> int:
+        """
+        Remove coalescable revisions of content older than retention days.
+        :return: number of removed revisions
+        """
+        if not self.enabled:
+            return 0
+        before = None
+        if self.retention_days:
+            before = datetime.datetime.utcnow() \
+                - datetime.timedelta(days=self.retention_days)
+        revisions = self.get_coalescable_revisions(
+            self._get_revisions(content),
+            before=before,
+        )
+        if revisions:
+            self.remove_revisions(content, revisions)
+        return len(revisions)
+
+    def compact_all(self) -> int:
+        """
+        Compact revisions of all contents having at least two coalescable
+        revisions, see compact_content().
+        :return: number of removed revisions
+        """
+        if not self.enabled:
+            return 0
+        content_ids = self._session.query(ContentRevisionRO.content_id)\
+            .filter(
+                ContentRevisionRO.revision_type.in_(COALESCABLE_REVISION_TYPES)
+            )\
+            .group_by(ContentRevisionRO.content_id)\
+            .having(func.count(ContentRevisionRO.revision_id) > 1)\
+            .order_by(ContentRevisionRO.content_id)
+        removed_nb = 0
+        for content_id, in content_ids.all():
+            content = self._session.query(Content).get(content_id)
+            removed_nb += self.compact_content(content)
+        return removed_nb
+
+    def remove_revisions(
+        self,
+        content: Content,
+        revisions: typing.List[ContentRevisionRO],
+    ) -> None:
+        """
+        Delete given revisions of content (and their read statuses), then
+        delete their files once transaction is committed.
+        """
+        self._session.flush()
+        revision_ids = [revision.revision_id for revision in revisions]
+        assert None not in revision_ids
+        parent_id = content.parent_id
+        kept_file_ids = set(
+            revision.depot_file.file_id
+            for revision in content.revisions
+            if revision.revision_id not in revision_ids and revision.depot_file
+        )
+        removed_files = [
+            revision.depot_file for revision in revisions
+            if revision.depot_file
+            and revision.depot_file.file_id not in kept_file_ids
+        ]
+
+        self._session.execute(
+            RevisionReadStatus.__table__.delete().where(
+                RevisionReadStatus.revision_id.in_(revision_ids)
+            )
+        )
+        self._session.execute(
+            ContentRevisionRO.__table__.delete().where(
+                ContentRevisionRO.revision_id.in_(revision_ids)
+            )
+        )
+        mark_changed(self._session)
+
+        for revision in revisions:
+            self._session.expunge(revision)
+        self._session.expire(content, ['revisions'])
+        # root contents have no parent to refresh
+        if parent_id is not None:
+            parent = self._session.identity_map.get(
+                identity_key(Content, parent_id)
+            )
+            if parent is not None:
+                self._session.expire(parent, ['children_revisions'])
+
+        if removed_files:
+            self._delete_files_after_commit(removed_files)
+
+    def _get_revisions(
+        self,
+        content: Content,
+    ) -> typing.List[ContentRevisionRO]:
+        return sorted(
+            content.revisions,
+            key=lambda revision: revision.revision_id,
+        )
+
+    def _delete_files_after_commit(
+        self,
+        depot_files: typing.List[UploadedFile],
+    ) -> None:
+        def delete_files(commit_succeeded: bool) -> None:
+            if not commit_succeeded:
+                return
+            for depot_file in depot_files:
+                try:
+                    depot_file.depot.delete(depot_file.file_id)
+                except Exception as exc:
+                    logger.error(
+                        self,
+                        'Unable to delete file {} of removed revision: '
+                        '{}'.format(depot_file.path, str(exc)),
+                    )
+
+        transaction_manager = get_session_transaction_manager(self._session)
+        transaction_manager.get().addAfterCommitHook(delete_files)
@@ -23,6 +23,9 @@ from tracim_backend.exceptions import UserNotActive
 from tracim_backend.exceptions import WrongUserPassword
 from tracim_backend.lib.core.group import GroupApi
 from tracim_backend.lib.mail_notifier.notifier import get_email_manager
+from tracim_backend.lib.utils.password import get_authenticated_user_cache
+from tracim_backend.lib.utils.session import invalidate_user_sessions
+from tracim_backend.models import get_session_transaction_manager
 from tracim_backend.models.auth import Group
 from tracim_backend.models.auth import User
 from tracim_backend.models.context_models import TypeUser
@@ -348,9 +351,11 @@ class UserApi(object):
         if email is not None and email != user.email:
             self._check_email(email)
             user.email = email
+            self._invalidate_authentications(user)
 
         if password is not None:
             user.password = password
+            self._invalidate_authentications(user)
 
         if timezone is not None:
             user.timezone = timezone
@@ -367,6 +372,7 @@ class UserApi(object):
             for group in groups:
                 if group not in user.groups:
                     user.groups.append(group)
+            self._invalidate_authentications(user)
 
         if do_save:
             self.save(user)
@@ -476,11 +482,13 @@ class UserApi(object):
 
     def disable(self, user: User, do_save=False):
         user.is_active = False
+        self._invalidate_authentications(user)
         if do_save:
             self.save(user)
 
     def delete(self, user: User, do_save=False):
         user.is_deleted = True
+        self._invalidate_authentications(user)
         if do_save:
             self.save(user)
 
@@ -492,6 +500,25 @@ class UserApi(object):
     def save(self, user: User):
         self._session.flush()
 
+    def _invalidate_authentications(self, user: User) -> None:
+        """
+        Forget cached authentications of user (see AuthenticatedUserCache)
+        and user summaries cached in their sessions.
+        """
+        if user.user_id is None:
+            return
+        user_id = user.user_id
+
+        def invalidate(*args) -> None:
+            get_authenticated_user_cache().invalidate_user(user_id)
+            invalidate_user_sessions(user_id)
+
+        invalidate()
+        # again once changes are committed: a request may have cached user
+        # as it was before commit meanwhile.
+        transaction_manager = get_session_transaction_manager(self._session)
+        transaction_manager.get().addAfterCommitHook(invalidate)
+
     def execute_created_user_actions(self, created_user: User) -> None:
         """
         Execute actions when user just been created
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+import typing
+
+import transaction
+from sqlalchemy.orm import Session
+from sqlalchemy.orm import sessionmaker
+
+from tracim_backend.app_models.contents import CONTENT_TYPES
+from tracim_backend.exceptions import ContentNotFound
+from tracim_backend.exceptions import EmptyEmailBody
+from tracim_backend.exceptions import InsufficientUserRoleInWorkspace
+from tracim_backend.exceptions import NoSpecialKeyFound
+from tracim_backend.exceptions import UserDoesNotExist
+from tracim_backend.exceptions import UserNotActive
+from tracim_backend.lib.core.content import ContentApi
+from tracim_backend.lib.core.user import UserApi
+from tracim_backend.lib.utils.logger import logger
+from tracim_backend.models import get_tm_session
+from tracim_backend.models.data import Content
+from tracim_backend.models.data import UserRoleInWorkspace
+
+if typing.TYPE_CHECKING:
+    from tracim_backend.config import CFG
+    from tracim_backend.lib.mail_fetcher.email_fetcher import DecodedMail
+    from tracim_backend.models import User
+
+COMMENT_INGESTER_DEFAULT_BATCH_SIZE = 50
+# Mails rejected with these errors will never be usable
+UNUSABLE_MAIL_ERRORS = (
+    ContentNotFound,
+    EmptyEmailBody,
+    InsufficientUserRoleInWorkspace,
+    NoSpecialKeyFound,
+    UserDoesNotExist,
+    UserNotActive,
+)
+
+
+class CommentIngester(object):
+    """
+    Create comments from fetched mails directly in tracim database with
+    ContentApi, instead of sending them to tracim http api. Comments are
+    created in batched transactions.
+    """
+
+    def __init__(
+        self,
+        config: 'CFG',
+        session_factory: sessionmaker,
+        use_html_parsing: bool,
+        use_txt_parsing: bool,
+        batch_size: int = COMMENT_INGESTER_DEFAULT_BATCH_SIZE,
+    ) -> None:
+        """
+        :param config: tracim config
+        :param session_factory: factory of database sessions
+        :param use_html_parsing: parse html mail
+        :param use_txt_parsing: parse txt mail
+        :param batch_size: max number of comments created in one transaction
+        """
+        self.config = config
+        self.session_factory = session_factory
+        self.use_html_parsing = use_html_parsing
+        self.use_txt_parsing = use_txt_parsing
+        self.batch_size = max(batch_size, 1)
+
+    def ingest(
+        self,
+        mails: typing.List['DecodedMail'],
+    ) -> typing.Tuple[typing.List['DecodedMail'], typing.List['DecodedMail']]:  # nopep8
+        """
+        Create a comment for each mail.
+        :param mails: mails to ingest
+        :return: mails whose comment was created and committed, and mails
+        which will never be usable (no key, empty body, unknown user...).
+        Other mails failed and can be ingested again later.
+        """
+        ingested_mails = []
+        unusable_mails = []
+        for start in range(0, len(mails), self.batch_size):
+            batch = mails[start:start + self.batch_size]
+            try:
+                batch_ingested, batch_unusable = self._ingest_batch(batch)
+            except Exception as exc:
+                log = 'Fail to ingest batch of {} mails, retry them one by one: {}'  # nopep8
+                logger.error(self, log.format(len(batch), str(exc)))
+                for mail in batch:
+                    try:
+                        batch_ingested, batch_unusable = \
+                            self._ingest_batch([mail])
+                    except Exception as exc:
+                        log = 'Fail to ingest fetched mail : {}'
+                        logger.error(self, log.format(str(exc)))
+                        continue
+                    ingested_mails.extend(batch_ingested)
+                    unusable_mails.extend(batch_unusable)
+                continue
+            ingested_mails.extend(batch_ingested)
+            unusable_mails.extend(batch_unusable)
+        return ingested_mails, unusable_mails
+
+    def _ingest_batch(
+        self,
+        mails: typing.List['DecodedMail'],
+    ) -> typing.Tuple[typing.List['DecodedMail'], typing.List['DecodedMail']]:  # nopep8
+        """
+        Create comments of given mails in one transaction. Invalid mails
+        are skipped, any other error aborts the whole transaction.
+        :return: ingested and unusable mails, see ingest()
+        """
+        users = {}  # type: typing.Dict[str, User]
+        contents = {}  # type: typing.Dict[typing.Tuple[int, int], Content]
+        ingested_mails = []
+        unusable_mails = []
+        dbsession = get_tm_session(self.session_factory, transaction.manager)  # nopep8
+        try:
+            with transaction.manager:
+                for mail in mails:
+                    try:
+                        user, content, comment_body = self._check_mail(
+                            dbsession,
+                            mail,
+                            users,
+                            contents,
+                        )
+                    except UNUSABLE_MAIL_ERRORS as exc:
+                        log = 'Fetched mail is not usable, skip it : {}'
+                        logger.error(self, log.format(str(exc)))
+                        unusable_mails.append(mail)
+                        continue
+                    except Exception as exc:
+                        log = 'Fail to create comment from fetched mail : {}'
+                        logger.error(self, log.format(str(exc)))
+                        continue
+                    api = ContentApi(
+                        show_archived=True,
+                        show_deleted=True,
+                        current_user=user,
+                        session=dbsession,
+                        config=self.config,
+                    )
+                    api.create_comment(
+                        content.workspace,
+                        content,
+                        comment_body,
+                        do_save=True,
+                    )
+                    ingested_mails.append(mail)
+        finally:
+            dbsession.close()
+        return ingested_mails, unusable_mails
+
+    def _check_mail(
+        self,
+        dbsession: Session,
+        mail: 'DecodedMail',
+        users: typing.Dict[str, 'User'],
+        contents: typing.Dict[typing.Tuple[int, int], Content],
+    ) -> typing.Tuple['User', Content, str]:
+        """
+        Do same checks as comment creation endpoint: user must be active and
+        at least contributor in content workspace.
+        :return: author, commented content and comment body
+        """
+        key = mail.get_key()
+        try:
+            content_id = int(key)
+        except (TypeError, ValueError) as exc:
+            raise NoSpecialKeyFound(
+                'Invalid content key {} in mail'.format(key)
+            ) from exc
+        email = mail.get_from_address()
+        user = users.get(email)
+        if user is None:
+            user = UserApi(
+                None,
+                session=dbsession,
+                config=self.config,
+            ).get_one_by_email(email)
+            users[email] = user
+        if not user.is_active:
+            raise UserNotActive('User {} is not active'.format(email))
+
+        content = contents.get((user.user_id, content_id))
+        if content is None:
+            content = ContentApi(
+                show_archived=True,
+                show_deleted=True,
+                current_user=user,
+                session=dbsession,
+                config=self.config,
+            ).get_one(content_id, content_type=CONTENT_TYPES.Any_SLUG)
+            contents[(user.user_id, content_id)] = content
+        role = content.workspace.get_user_role(user)
+        if role < UserRoleInWorkspace.CONTRIBUTOR:
+            raise InsufficientUserRoleInWorkspace(
+                'User {} can not comment content {}'.format(email, content_id)
+            )
+
+        comment_body = mail.get_body(
+            use_html_parsing=self.use_html_parsing,
+            use_txt_parsing=self.use_txt_parsing,
+        )
+        if not comment_body:
+            raise EmptyEmailBody()
+        return user, content, comment_body
@@ -1,50 +1,163 @@
+import threading
 import typing
+from concurrent.futures import ThreadPoolExecutor
 
 from tracim_backend import BASE_API_V2
+from tracim_backend.config import ImapMailbox
+from tracim_backend.lib.mail_fetcher.comment_ingester import CommentIngester
 from tracim_backend.lib.mail_fetcher.email_fetcher import MailFetcher
+from tracim_backend.lib.mail_fetcher.email_fetcher import RedisMailboxLock
+from tracim_backend.lib.mail_fetcher.email_fetcher import create_http_session
 from tracim_backend.lib.utils.daemon import FakeDaemon
 from tracim_backend.lib.utils.logger import logger
+from tracim_backend.lib.utils.utils import get_redis_connection
+from tracim_backend.models import get_engine
+from tracim_backend.models import get_session_factory
 
 
 class MailFetcherDaemon(FakeDaemon):
     """
-    Thread containing a daemon who fetch new mail from a mailbox and
+    Thread containing a daemon who fetch new mail from mailboxes and
     send http request to a tracim endpoint to handle them.
+    Each mailbox has its own connection and thread, mails are sent to tracim
+    by a pool of threads shared by all mailboxes.
     """
-    def __init__(self, config: 'CFG', burst=True, *args, **kwargs):
+    def __init__(
+        self,
+        config: 'CFG',
+        burst=True,
+        settings: typing.Optional[dict] = None,
+        *args,
+        **kwargs
+    ):
         """
         :param config: Tracim Config
         :param burst: if true, run one time, if false, run continously
+        :param settings: Tracim settings, database settings are required
+        with direct ingestion mode
         """
         super().__init__(*args, **kwargs)
         self.config = config
-        self._fetcher = None  # type: MailFetcher
+        self._fetchers = []  # type: typing.List[MailFetcher]
         self.burst = burst
+        self.settings = settings
 
     def append_thread_callback(self, callback: typing.Callable) -> None:
         logger.warning('MailFetcherrDaemon not implement append_thread_callback')  # nopep8
         pass
 
     def stop(self) -> None:
-        if self._fetcher:
-            self._fetcher.stop()
+        for fetcher in self._fetchers:
+            fetcher.stop()
 
-    def run(self) -> None:
-        self._fetcher = MailFetcher(
-            host=self.config.EMAIL_REPLY_IMAP_SERVER,
-            port=self.config.EMAIL_REPLY_IMAP_PORT,
-            user=self.config.EMAIL_REPLY_IMAP_USER,
-            password=self.config.EMAIL_REPLY_IMAP_PASSWORD,
-            use_ssl=self.config.EMAIL_REPLY_IMAP_USE_SSL,
-            folder=self.config.EMAIL_REPLY_IMAP_FOLDER,
-            heartbeat=self.config.EMAIL_REPLY_CHECK_HEARTBEAT,
-            use_idle=self.config.EMAIL_REPLY_IMAP_USE_IDLE,
-            connection_max_lifetime=self.config.EMAIL_REPLY_CONNECTION_MAX_LIFETIME,  # nopep8
-            api_base_url=self.config.WEBSITE_BASE_URL + BASE_API_V2,
-            api_key=self.config.API_KEY,
+    def _get_comment_ingester(self) -> typing.Optional[CommentIngester]:
+        if self.config.EMAIL_REPLY_INGESTION_MODE != self.config.CST.DIRECT:
+            return None
+        if self.settings is None:
+            raise Exception(
+                'Database settings are required by email.reply.ingestion_mode '
+                '"{}"'.format(self.config.CST.DIRECT)
+            )
+        session_factory = get_session_factory(get_engine(self.settings))
+        return CommentIngester(
+            config=self.config,
+            session_factory=session_factory,
             use_html_parsing=self.config.EMAIL_REPLY_USE_HTML_PARSING,
             use_txt_parsing=self.config.EMAIL_REPLY_USE_TXT_PARSING,
-            lockfile_path=self.config.EMAIL_REPLY_LOCKFILE_PATH,
-            burst=self.burst
+            batch_size=self.config.EMAIL_REPLY_INGESTION_BATCH_SIZE,
+        )
+
+    def _get_mailbox_file_path(
+        self,
+        path: str,
+        mailbox: ImapMailbox,
+    ) -> typing.Optional[str]:
+        """
+        Each mailbox has its own lockfile and uid state file, default
+        mailbox use configured paths.
+        """
+        if not path or mailbox.name == ImapMailbox.DEFAULT_NAME:
+            return path or None
+        return '{}.{}'.format(path, mailbox.name)
+
+    def _get_mailbox_lock(
+        self,
+        mailbox: ImapMailbox,
+    ) -> typing.Optional[RedisMailboxLock]:
+        """
+        In multi node mode, mailboxes are locked in redis instead of
+        lockfile, so only one node fetch a mailbox at once.
+        """
+        if not self.config.MULTI_NODE_ENABLED:
+            return None
+        return RedisMailboxLock(
+            get_redis_connection(self.config),
+            'tracim:mail_fetcher:{}@{}:{}/{}'.format(
+                mailbox.user,
+                mailbox.server,
+                mailbox.port,
+                mailbox.folder,
+            ),
         )
-        self._fetcher.run()
+
+    def run(self) -> None:
+        mailboxes = self.config.EMAIL_REPLY_IMAP_MAILBOXES
+        workers = self.config.EMAIL_REPLY_WORKERS
+        comment_ingester = self._get_comment_ingester()
+        executor = None
+        session = None
+        if len(mailboxes) > 1:
+            executor = ThreadPoolExecutor(max_workers=workers)
+            session = create_http_session(workers)
+
+        self._fetchers = [
+            MailFetcher(
+                host=mailbox.server,
+                port=mailbox.port,
+                user=mailbox.user,
+                password=mailbox.password,
+                use_ssl=mailbox.use_ssl,
+                folder=mailbox.folder,
+                heartbeat=self.config.EMAIL_REPLY_CHECK_HEARTBEAT,
+                use_idle=mailbox.use_idle,
+                connection_max_lifetime=self.config.EMAIL_REPLY_CONNECTION_MAX_LIFETIME,  # nopep8
+                api_base_url=self.config.WEBSITE_BASE_URL + BASE_API_V2,
+                api_key=self.config.API_KEY,
+                use_html_parsing=self.config.EMAIL_REPLY_USE_HTML_PARSING,
+                use_txt_parsing=self.config.EMAIL_REPLY_USE_TXT_PARSING,
+                lockfile_path=self._get_mailbox_file_path(
+                    self.config.EMAIL_REPLY_LOCKFILE_PATH,
+                    mailbox,
+                ),
+                burst=self.burst,
+                workers=workers,
+                comment_ingester=comment_ingester,
+                uid_state_path=self._get_mailbox_file_path(
+                    self.config.EMAIL_REPLY_UID_STATE_PATH,
+                    mailbox,
+                ),
+                fetch_chunk_size=self.config.EMAIL_REPLY_IMAP_FETCH_CHUNK_SIZE,  # nopep8
+                executor=executor,
+                session=session,
+                lock=self._get_mailbox_lock(mailbox),
+            )
+            for mailbox in mailboxes
+        ]
+        if len(self._fetchers) == 1:
+            self._fetchers[0].run()
+            return
+
+        threads = []
+        for mailbox, fetcher in zip(mailboxes, self._fetchers):
+            thread = threading.Thread(
+                target=fetcher.run,
+                name='MailFetcher-{}'.format(mailbox.name),
+                daemon=True,
+            )
+            thread.start()
+            threads.append(thread)
+        try:
+            for thread in threads:
+                thread.join()
+        finally:
+            executor.shutdown()
@@ -1,10 +1,16 @@
 # -*- coding: utf-8 -*-
 
 import json
+import os
 import socket
 import ssl
+import threading
 import time
 import typing
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from contextlib import contextmanager
 from email import message_from_bytes
 from email.header import decode_header
 from email.header import make_header
@@ -16,6 +22,8 @@ import imapclient
 import markdown
 import requests
 from email_reply_parser import EmailReplyParser
+from redis import Redis
+from redis.exceptions import LockError
 
 from tracim_backend.exceptions import BadStatusCode
 from tracim_backend.exceptions import EmptyEmailBody
@@ -27,6 +35,9 @@ from tracim_backend.lib.utils.authentification import TRACIM_API_KEY_HEADER
 from tracim_backend.lib.utils.authentification import TRACIM_API_USER_EMAIL_LOGIN_HEADER  # nopep8
 from tracim_backend.lib.utils.logger import logger
 
+if typing.TYPE_CHECKING:
+    from tracim_backend.lib.mail_fetcher.comment_ingester import CommentIngester  # nopep8
+
 TRACIM_SPECIAL_KEY_HEADER = 'X-Tracim-Key'
 CONTENT_TYPE_TEXT_PLAIN = 'text/plain'
 CONTENT_TYPE_TEXT_HTML = 'text/html'
@@ -35,7 +46,11 @@ IMAP_CHECKED_FLAG = imapclient.FLAGGED
 IMAP_SEEN_FLAG = imapclient.SEEN
 
 MAIL_FETCHER_FILELOCK_TIMEOUT = 10
+# max duration of mailbox redis lock if not refreshed (fetcher crash)
+MAIL_FETCHER_REDIS_LOCK_TTL = 60*10
 MAIL_FETCHER_CONNECTION_TIMEOUT = 60*3
+MAIL_FETCHER_DEFAULT_WORKERS = 4
+MAIL_FETCHER_DEFAULT_FETCH_CHUNK_SIZE = 50
 MAIL_FETCHER_IDLE_RESPONSE_TIMEOUT = 60*9   # this should be not more
 # that 29 minutes according to rfc2177.(server wait 30min by default)
 
@@ -95,8 +110,9 @@ class DecodedMail(object):
                 html_body = body_part.get_payload(decode=True).decode(
                     charset)
                 if use_html_parsing:
-                    html_body = str(ParsedHTMLMail(html_body))
-                body = HtmlSanitizer.sanitize(html_body)
+                    body = ParsedHTMLMail(html_body).get_sanitized_body()
+                else:
+                    body = HtmlSanitizer.sanitize(html_body)
             if not body:
                 raise EmptyEmailBody()
         return body
@@ -162,6 +178,122 @@ class BadIMAPFetchResponse(Exception):
     pass
 
 
+def create_http_session(pool_size: int) -> requests.Session:
+    """
+    Create http session keeping up to pool_size connections alive by host
+    """
+    session = requests.Session()
+    session.mount(
+        'http://',
+        requests.adapters.HTTPAdapter(pool_maxsize=pool_size),
+    )
+    session.mount(
+        'https://',
+        requests.adapters.HTTPAdapter(pool_maxsize=pool_size),
+    )
+    return session
+
+
+class MailboxUidWatermark(object):
+    """
+    Highest uid of a mailbox folder under which all mails are handled.
+    Watermark is only valid for one UIDVALIDITY value of the folder (see
+    rfc3501), it is persisted in a json file shared by mailboxes if path is
+    given, kept in memory otherwise.
+    """
+
+    def __init__(self, mailbox_key: str, path: str = None) -> None:
+        """
+        :param mailbox_key: unique identifier of mailbox folder
+        :param path: path of json file where watermarks are stored
+        """
+        self.mailbox_key = mailbox_key
+        self.path = path
+        self._uidvalidity = None  # type: typing.Optional[int]
+        self._last_uid = 0
+        if self.path:
+            state = self._read_states().get(self.mailbox_key, {})
+            self._uidvalidity = state.get('uidvalidity')
+            self._last_uid = state.get('last_uid', 0)
+
+    def get(self, uidvalidity: int) -> int:
+        """
+        :param uidvalidity: current UIDVALIDITY of folder
+        :return: last handled uid, 0 if UIDVALIDITY changed.
+        """
+        if uidvalidity != self._uidvalidity:
+            return 0
+        return self._last_uid
+
+    def set(self, uidvalidity: int, last_uid: int) -> None:
+        if uidvalidity == self._uidvalidity and last_uid == self._last_uid:
+            return
+        self._uidvalidity = uidvalidity
+        self._last_uid = last_uid
+        if self.path:
+            states = self._read_states()
+            states[self.mailbox_key] = {
+                'uidvalidity': uidvalidity,
+                'last_uid': last_uid,
+            }
+            tmp_path = '{}.tmp'.format(self.path)
+            with open(tmp_path, 'w') as state_file:
+                json.dump(states, state_file)
+            os.replace(tmp_path, self.path)
+
+    def _read_states(self) -> dict:
+        try:
+            with open(self.path) as state_file:
+                return json.load(state_file)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            log = 'Invalid mail fetcher uid state file {}, ignore it'
+            logger.warning(self, log.format(self.path))
+            return {}
+
+
+class RedisMailboxLock(object):
+    """
+    Mailbox lock shared by mail fetchers of all nodes using same redis,
+    used like filelock.FileLock in multi node mode. Lock expires after
+    ttl seconds if its owner does not refresh it.
+    """
+
+    def __init__(
+        self,
+        redis_connection: Redis,
+        name: str,
+        ttl: int = MAIL_FETCHER_REDIS_LOCK_TTL,
+    ) -> None:
+        self.name = name
+        self.ttl = ttl
+        self._lock = redis_connection.lock(name, timeout=ttl)
+
+    @contextmanager
+    def acquire(self, timeout: float) -> typing.Generator:
+        """
+        :param timeout: seconds to wait for lock
+        :raise filelock.Timeout: if lock can't be acquired in time
+        """
+        if not self._lock.acquire(blocking_timeout=timeout):
+            raise filelock.Timeout(self.name)
+        try:
+            yield self
+        finally:
+            try:
+                self._lock.release()
+            except LockError as e:
+                log = 'Mail Fetcher lock {} expired before release: {}'
+                logger.warning(self, log.format(self.name, e.__str__()))
+
+    def refresh(self) -> None:
+        """
+        Give ttl more seconds to lock owner.
+        """
+        self._lock.extend(self.ttl)
+
+
 class MailFetcher(object):
     def __init__(
         self,
@@ -180,6 +312,13 @@ class MailFetcher(object):
         use_txt_parsing: bool,
         lockfile_path: str,
         burst: bool,
+        workers: int = MAIL_FETCHER_DEFAULT_WORKERS,
+        comment_ingester: 'CommentIngester' = None,
+        uid_state_path: str = None,
+        fetch_chunk_size: int = MAIL_FETCHER_DEFAULT_FETCH_CHUNK_SIZE,
+        executor: ThreadPoolExecutor = None,
+        session: requests.Session = None,
+        lock: RedisMailboxLock = None,
     ) -> None:
         """
         Fetch mail from a mailbox folder through IMAP and add their content to
@@ -202,6 +341,19 @@ class MailFetcher(object):
         :param use_txt_parsing: parse txt mail
         :param burst: if true, run only one time,
         if false run as continous daemon.
+        :param workers: number of threads used to send fetched mails to
+        tracim.
+        :param comment_ingester: if given, comments are created directly in
+        database with it instead of through tracim http api.
+        :param uid_state_path: path of file where last handled mail uid is
+        stored, if not given, it is only kept in memory.
+        :param fetch_chunk_size: max number of mails fetched at once.
+        :param executor: thread pool used to send mails to tracim, shared
+        between fetchers of several mailboxes. If not given, a pool of
+        workers threads is created for each batch of mails.
+        :param session: http session used to send mails to tracim, shared
+        between fetchers of several mailboxes.
+        :param lock: lock shared between nodes, used instead of lockfile.
         """
         self.host = host
         self.port = port
@@ -216,9 +368,28 @@ class MailFetcher(object):
         self.api_key = api_key
         self.use_html_parsing = use_html_parsing
         self.use_txt_parsing = use_txt_parsing
-        self.lock = filelock.FileLock(lockfile_path)
+        self.lock = lock or filelock.FileLock(lockfile_path)
         self._is_active = True
         self.burst = burst
+        self.workers = max(workers, 1)
+        self.comment_ingester = comment_ingester
+        self.fetch_chunk_size = max(fetch_chunk_size, 1)
+        self.uid_watermark = MailboxUidWatermark(
+            mailbox_key='{}@{}:{}/{}'.format(user, host, port, folder),
+            path=uid_state_path,
+        )
+        self._uidvalidity = None  # type: typing.Optional[int]
+        # uids of mails handled in current chunk
+        self._handled_uids = set()  # type: typing.Set[int]
+        self.executor = executor
+        # Keep-alive connections to tracim api, shared by workers
+        self._session = session or create_http_session(self.workers)
+        # imapclient is not thread safe
+        self._imap_lock = threading.Lock()
+        # content info by (content_id, user_email), reset for each batch
+        # of mails
+        self._content_info_cache = {}  # type: typing.Dict[typing.Tuple[str, str], dict]  # nopep8
+        self._content_info_cache_lock = threading.Lock()
 
     def run(self) -> None:
         logger.info(self, 'Starting MailFetcher')
@@ -237,7 +408,8 @@ class MailFetcher(object):
                 logger.debug(self, 'Select folder {}'.format(
                     self.folder,
                 ))
-                imapc.select_folder(self.folder)
+                folder_status = imapc.select_folder(self.folder)
+                self._uidvalidity = folder_status.get(b'UIDVALIDITY')
 
                 # force renew connection when deadline is reached
                 deadline = time.time() + self.connection_max_lifetime
@@ -354,29 +526,85 @@ class MailFetcher(object):
         with self.lock.acquire(
                 timeout=MAIL_FETCHER_FILELOCK_TIMEOUT
         ):
-            messages = self._fetch(imapc)
-            cleaned_mails = [DecodedMail(m.message, m.uid)
-                             for m in messages]
-            self._notify_tracim(cleaned_mails, imapc)
+            uids = self._search_new_uids(imapc)
+            watermark_blocked = False
+            # Mails are fetched and sent to tracim by chunks to keep memory
+            # usage bounded whatever the number of waiting mails.
+            for start in range(0, len(uids), self.fetch_chunk_size):
+                if not self._is_active:
+                    break
+                if isinstance(self.lock, RedisMailboxLock):
+                    self.lock.refresh()
+                chunk_uids = uids[start:start + self.fetch_chunk_size]
+                self._handled_uids = set()
+                messages = self._fetch(imapc, chunk_uids)
+                cleaned_mails = [DecodedMail(m.message, m.uid)
+                                 for m in messages]
+                self._notify_tracim(cleaned_mails, imapc)
+                # Watermark can't go over a mail which will have to be
+                # retried, following mails will be searched again too.
+                if not watermark_blocked:
+                    watermark_blocked = not self._update_uid_watermark(
+                        chunk_uids,
+                    )
 
     def stop(self) -> None:
         self._is_active = False
 
+    def _search_new_uids(
+        self,
+        imapc: imapclient.IMAPClient,
+    ) -> typing.List[int]:
+        """
+        Search unflagged mails above uid watermark.
+        :return: sorted uids of mails to fetch
+        """
+        last_uid = self.uid_watermark.get(self._uidvalidity)
+        logger.debug(self, 'Search unflagged messages after uid {}'.format(
+            last_uid,
+        ))
+        criteria = ['UNFLAGGED']
+        if last_uid:
+            criteria.extend(['UID', '{}:*'.format(last_uid + 1)])
+        # "n:*" range always match the last mail of folder, even if its uid
+        # is lower than n.
+        uids = sorted(uid for uid in imapc.search(criteria) if uid > last_uid)
+        logger.debug(self, 'Found {} unflagged mails'.format(
+            len(uids),
+        ))
+        return uids
+
+    def _update_uid_watermark(self, uids: typing.List[int]) -> bool:
+        """
+        Move uid watermark after given uids as long as they are handled.
+        :param uids: sorted uids of last processed chunk
+        :return: True if all uids were handled
+        """
+        last_uid = None
+        for uid in uids:
+            if uid not in self._handled_uids:
+                break
+            last_uid = uid
+        if last_uid is not None and self._uidvalidity is not None:
+            self.uid_watermark.set(self._uidvalidity, last_uid)
+        return last_uid == uids[-1]
+
+    def _mark_mail_handled(self, mail: DecodedMail) -> None:
+        with self._imap_lock:
+            self._handled_uids.add(mail.uid)
+
     def _fetch(
-        self, 
+        self,
         imapc: imapclient.IMAPClient,
+        uids: typing.List[int],
     ) -> typing.List[MessageContainer]:
         """
-        Get news message from mailbox
+        Get given messages from mailbox
+        :param uids: uids of mails to fetch
         :return: list of new mails
         """
         messages = []
 
-        logger.debug(self, 'Fetch unflagged messages')
-        uids = imapc.search(['UNFLAGGED'])
-        logger.debug(self, 'Found {} unflagged mails'.format(
-            len(uids),
-        ))
         for msgid, data in imapc.fetch(uids, ['BODY.PEEK[]']).items():
             # INFO - G.M - 2017-12-08 - Fetch BODY.PEEK[]
             # Retrieve all mail(body and header) but don't set mail
@@ -416,21 +644,76 @@ class MailFetcher(object):
         logger.debug(self, 'Notify tracim about {} new responses'.format(
             len(mails),
         ))
+        if self.comment_ingester:
+            # Database session is not shared between threads, batches are
+            # ingested sequentially.
+            ingested_mails, unusable_mails = self.comment_ingester.ingest(
+                mails,
+            )
+            for mail in ingested_mails:
+                self._flag_mail(imapc, mail)
+            for mail in unusable_mails:
+                # Mail will never be usable, do not search it again
+                self._mark_mail_handled(mail)
+            return
+
+        with self._content_info_cache_lock:
+            self._content_info_cache = {}
+
+        # Mails about the same content are sent sequentially, in the
+        # same worker, to keep comments order. Others are sent in parallel.
+        mails_by_key = OrderedDict()  # type: typing.Dict[typing.Any, typing.List[DecodedMail]]  # nopep8
+        while mails:
+            mail = mails.pop()
+            try:
+                key = mail.get_key()
+            except Exception:
+                # Error will be logged when creating comment request
+                key = None
+            if key is None:
+                key = id(mail)
+            mails_by_key.setdefault(key, []).append(mail)
+
+        executor = self.executor
+        if executor is None:
+            workers = min(self.workers, len(mails_by_key)) or 1
+            executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            wait([
+                executor.submit(self._notify_tracim_mails, key_mails, imapc)
+                for key_mails in mails_by_key.values()
+            ])
+        finally:
+            if executor is not self.executor:
+                executor.shutdown()
+
+    def _notify_tracim_mails(
+        self,
+        mails: typing.List[DecodedMail],
+        imapc: imapclient.IMAPClient
+    ) -> None:
+        """
+        Send http requests to tracim endpoint for each mail, sequentially.
+        :param mails: list of mails to send
+        :return: none
+        """
         # TODO BS 20171124: Look around mail.get_from_address(), mail.get_key()
         # , mail.get_body() etc ... for raise InvalidEmailError if missing
         #  required informations (actually get_from_address raise IndexError
         #  if no from address for example) and catch it here
-        while mails:
-            mail = mails.pop()
+        for mail in mails:
             try:
                 method, endpoint, json_body_dict = self._create_comment_request(mail)  # nopep8
             except NoSpecialKeyFound as exc:
                 log = 'Failed to create comment request due to missing specialkey in mail {}'  # nopep8
                 logger.error(self, log.format(exc.__str__()))
+                # Mail will never be usable, do not search it again
+                self._mark_mail_handled(mail)
                 continue
             except EmptyEmailBody as exc:
                 log = 'Empty body, skip mail'
                 logger.error(self, log)
+                self._mark_mail_handled(mail)
                 continue
             except Exception as exc:
                 log = 'Failed to create comment request in mail fetcher error {}'  # nopep8
@@ -451,6 +734,9 @@ class MailFetcher(object):
             except requests.exceptions.RequestException as e:
                 log = 'Fail to transmit fetched mail to tracim : {}'
                 logger.error(self, log.format(str(e)))
+            except Exception as e:
+                log = 'Fail to transmit fetched mail to tracim : {}'
+                logger.error(self, log.format(str(e)))
 
     def _get_auth_headers(self, user_email) -> dict:
         return {
@@ -463,7 +749,7 @@ class MailFetcher(object):
             api_base_url=self.api_base_url,
             content_id=content_id,
         )
-        result = requests.get(
+        result = self._session.get(
             endpoint,
             headers=self._get_auth_headers(user_email)
         )
@@ -474,9 +760,23 @@ class MailFetcher(object):
             raise BadStatusCode(msg)
         return result.json()
 
+    def _get_cached_content_info(self, content_id, user_email) -> dict:
+        """
+        Same as _get_content_info but content info is asked once by batch
+        of mails for each content and user.
+        """
+        cache_key = (content_id, user_email)
+        with self._content_info_cache_lock:
+            content_info = self._content_info_cache.get(cache_key)
+        if content_info is None:
+            content_info = self._get_content_info(content_id, user_email)
+            with self._content_info_cache_lock:
+                self._content_info_cache[cache_key] = content_info
+        return content_info
+
     def _create_comment_request(self, mail: DecodedMail) -> typing.Tuple[str, str, dict]:  # nopep8
         content_id = mail.get_key()
-        content_info = self._get_content_info(content_id, mail.get_from_address())  # nopep8
+        content_info = self._get_cached_content_info(content_id, mail.get_from_address())  # nopep8
         mail_body = mail.get_body(
             use_html_parsing=self.use_html_parsing,
             use_txt_parsing=self.use_txt_parsing,
@@ -509,7 +809,7 @@ class MailFetcher(object):
             ),
         )
         if method == 'POST':
-            request_method = requests.post
+            request_method = self._session.post
         else:
             # TODO - G.M - 2018-08-24 - Better handling exception
             raise UnsupportedRequestMethod('Request method not supported')
@@ -526,5 +826,17 @@ class MailFetcher(object):
             raise BadStatusCode(msg)
         # Flag all correctly checked mail
         if r.status_code in [200, 204]:
+            self._flag_mail(imapc, mail)
+
+    def _flag_mail(
+        self,
+        imapc: imapclient.IMAPClient,
+        mail: DecodedMail,
+    ) -> None:
+        """
+        Flag mail as checked and seen in mailbox
+        """
+        with self._imap_lock:
             imapc.add_flags((mail.uid,), IMAP_CHECKED_FLAG)
             imapc.add_flags((mail.uid,), IMAP_SEEN_FLAG)
+            self._handled_uids.add(mail.uid)
@@ -1,6 +1,13 @@
+# -*- coding: utf-8 -*-
+import typing
+
 from bs4 import BeautifulSoup
+from bs4 import NavigableString
+from bs4 import PageElement
+from bs4 import Tag
 
-# -*- coding: utf-8 -*-
+# bs4 tree builder used to parse mails
+HTML_PARSER = 'lxml'
 
 
 class BodyMailPartType(object):
@@ -12,11 +19,37 @@ class BodyMailPartType(object):
 class BodyMailPart(object):
     def __init__(
             self,
-            text: str,
-            part_type: str
+            text: typing.Optional[str],
+            part_type: str,
+            elements: typing.List[PageElement] = None,
     )-> None:
-        self.text = text
+        """
+        :param text: html of part, if None it is serialized from elements
+        only when needed
+        :param part_type: BodyMailPartType value
+        :param elements: parsed html elements of part, if any
+        """
+        self._text = text
         self.part_type = part_type
+        self.elements = elements or []
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = ''.join(str(elem) for elem in self.elements)
+        return self._text
+
+    @text.setter
+    def text(self, value: str) -> None:
+        self._text = value
+
+    def merge(self, other: 'BodyMailPart') -> None:
+        """
+        Add content of other part at the end of this one
+        """
+        if self._text is not None or other._text is not None:
+            self._text = self.text + other.text
+        self.elements.extend(other.elements)
 
 
 class BodyMailParts(object):
@@ -60,7 +93,7 @@ class BodyMailParts(object):
             self._list.append(value)
         else:
             if self._list[-1].part_type == value.part_type or follow:
-                self._list[-1].text += value.text
+                self._list[-1].merge(value)
             else:
                 self._list.append(value)
 
@@ -94,6 +127,15 @@ class BodyMailParts(object):
                 count += 1
         return count
 
+    def get_nodes(self) -> typing.List[PageElement]:
+        """
+        Get parsed html elements of all parts
+        """
+        nodes = []
+        for elem in self._list:
+            nodes.extend(elem.elements)
+        return nodes
+
     def __str__(self) -> str:
         s_mail = ''
         for elem in self._list:
@@ -106,11 +148,32 @@ class HtmlBodyMailParts(BodyMailParts):
     def append(self, value):
         # INFO - G.M - 2017-12-01 - Override part_type is elem has no content.
         # Choose last elem part_type instead of the proposed one.
-        if len(self._list) > 0:
-            txt = BeautifulSoup(value.text, 'html.parser').get_text()
-            txt = txt.replace('\n', '').strip()
-            img = BeautifulSoup(value.text, 'html.parser').find('img')
-            if not txt and not img:
-                value.part_type = self._list[-1].part_type
+        if len(self._list) > 0 and not self._has_content(value):
+            value.part_type = self._list[-1].part_type
         BodyMailParts._check_value(value)
         BodyMailParts._append(self, value)
+
+    @classmethod
+    def _has_content(cls, value: BodyMailPart) -> bool:
+        """
+        Check if part contains text or image, using its parsed elements
+        when available to avoid parsing its html again.
+        """
+        if not value.elements:
+            value = BodyMailPart(
+                value.text,
+                value.part_type,
+                elements=[BeautifulSoup(value.text, HTML_PARSER)],
+            )
+        for elem in value.elements:
+            if isinstance(elem, Tag):
+                if elem.name == 'img' or elem.find('img'):
+                    return True
+                txt = elem.get_text()
+            elif isinstance(elem, NavigableString):
+                txt = str(elem)
+            else:
+                continue
+            if txt.replace('\n', '').strip():
+                return True
+        return False
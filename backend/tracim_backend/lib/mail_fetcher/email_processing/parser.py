@@ -1,12 +1,17 @@
 # -*- coding: utf-8 -*-
+import typing
+
 from bs4 import BeautifulSoup
+from bs4 import Tag
 
 from tracim_backend.lib.mail_fetcher.email_processing.checkers import ProprietaryHTMLAttrValues
 from tracim_backend.lib.mail_fetcher.email_processing.checkers import HtmlMailQuoteChecker
 from tracim_backend.lib.mail_fetcher.email_processing.checkers import HtmlMailSignatureChecker
 from tracim_backend.lib.mail_fetcher.email_processing.models import BodyMailPartType
 from tracim_backend.lib.mail_fetcher.email_processing.models import BodyMailPart
+from tracim_backend.lib.mail_fetcher.email_processing.models import HTML_PARSER
 from tracim_backend.lib.mail_fetcher.email_processing.models import HtmlBodyMailParts
+from tracim_backend.lib.mail_fetcher.email_processing.sanitizer import HtmlSanitizer
 
 
 class PreSanitizeConfig(object):
@@ -14,7 +19,7 @@ class PreSanitizeConfig(object):
     To avoid problems, html need to be sanitize a bit during parsing to distinct
     Main,Quote and Signature elements
     """
-    meta_tag = ['body', 'div']
+    meta_tag = frozenset(['body', 'div'])
 
 
 class ParsedHTMLMail(object):
@@ -22,6 +27,8 @@ class ParsedHTMLMail(object):
     Parse HTML Mail depending of some rules.
     Distinct part of html mail body using BodyMailParts object and
     process differents rules using HtmlChecker(s)
+    Html is parsed only once, the same tree is used to distinct parts and to
+    sanitize kept parts.
     """
 
     def __init__(self, html_body: str):
@@ -30,6 +37,14 @@ class ParsedHTMLMail(object):
     def __str__(self):
         return str(self._parse_mail())
 
+    def get_sanitized_body(self) -> typing.Optional[str]:
+        """
+        Get sanitized html of main parts of mail.
+        :return: html or None if there is no content
+        """
+        elements = self._parse_mail()
+        return HtmlSanitizer.sanitize_nodes(elements.get_nodes())
+
     def get_elements(self) -> HtmlBodyMailParts:
         tree = self._get_proper_main_body_tree()
         return self._distinct_elements(tree)
@@ -39,38 +54,38 @@ class ParsedHTMLMail(object):
         elements = self._process_elements(elements)
         return elements
 
-    def _get_proper_main_body_tree(self) -> BeautifulSoup:
+    def _get_proper_main_body_tree(self) -> Tag:
         """
         Get html body tree without some kind of wrapper.
         We need to have text, quote and signature parts at the same tree level
         """
-        tree = BeautifulSoup(self.src_html_body, 'html.parser')
+        tree = BeautifulSoup(self.src_html_body, HTML_PARSER)
 
         # Only parse body part of html if available
         subtree = tree.find('body')
         if subtree:
-            tree = BeautifulSoup(str(subtree), 'html.parser')
+            tree = subtree
 
         # if some kind of "meta_div", unwrap it
-        while len(tree.findAll(recursive=None)) == 1 and \
-                tree.find().name.lower() in PreSanitizeConfig.meta_tag:
-            tree.find().unwrap()
-
-        for tag in tree.findAll():
-            # HACK - G.M - 2017-11-28 - Unwrap outlook.com mail
-            # if Text -> Signature -> Quote Mail
-            # Text and signature are wrapped into divtagdefaultwrapper
-            if tag.attrs.get('id'):
-                if ProprietaryHTMLAttrValues.Outlook_com_wrapper_id\
-                        in tag.attrs['id']:
-                    tag.unwrap()
+        children = tree.find_all(recursive=False)
+        while len(children) == 1 and \
+                children[0].name.lower() in PreSanitizeConfig.meta_tag:
+            children[0].unwrap()
+            children = tree.find_all(recursive=False)
+
+        # HACK - G.M - 2017-11-28 - Unwrap outlook.com mail
+        # if Text -> Signature -> Quote Mail
+        # Text and signature are wrapped into divtagdefaultwrapper
+        for tag in tree.find_all(id=True):
+            if ProprietaryHTMLAttrValues.Outlook_com_wrapper_id \
+                    in tag.attrs['id']:
+                tag.unwrap()
         return tree
 
     @classmethod
-    def _distinct_elements(cls, tree: BeautifulSoup) -> HtmlBodyMailParts:
+    def _distinct_elements(cls, tree: Tag) -> HtmlBodyMailParts:
         parts = HtmlBodyMailParts()
         for elem in list(tree):
-            part_txt = str(elem)
             part_type = BodyMailPartType.Main
 
             if HtmlMailQuoteChecker.is_quote(elem):
@@ -78,7 +93,7 @@ class ParsedHTMLMail(object):
             elif HtmlMailSignatureChecker.is_signature(elem):
                 part_type = BodyMailPartType.Signature
 
-            part = BodyMailPart(part_txt, part_type)
+            part = BodyMailPart(None, part_type, elements=[elem])
             parts.append(part)
             # INFO - G.M - 2017-11-28 - Outlook.com special case
             # all after quote tag is quote
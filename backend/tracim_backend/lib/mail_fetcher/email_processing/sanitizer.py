@@ -1,20 +1,26 @@
 import typing
-from bs4 import BeautifulSoup, Tag
+from bs4 import BeautifulSoup, CData, NavigableString, PageElement, Tag
+from bs4.dammit import EntitySubstitution
+from bs4.element import PreformattedString
+from tracim_backend.lib.mail_fetcher.email_processing.models import HTML_PARSER  # nopep8
 from tracim_backend.lib.mail_fetcher.email_processing.sanitizer_config.attrs_whitelist import ATTRS_WHITELIST  # nopep8
 from tracim_backend.lib.mail_fetcher.email_processing.sanitizer_config.class_blacklist import CLASS_BLACKLIST  # nopep8
 from tracim_backend.lib.mail_fetcher.email_processing.sanitizer_config.id_blacklist import ID_BLACKLIST  # nopep8
 from tracim_backend.lib.mail_fetcher.email_processing.sanitizer_config.tag_blacklist import TAG_BLACKLIST  # nopep8
 from tracim_backend.lib.mail_fetcher.email_processing.sanitizer_config.tag_whitelist import TAG_WHITELIST  # nopep8
 
+# strings considered as text content, like in bs4 get_text()
+TEXT_TYPES = (NavigableString, CData)
+
 
 class HtmlSanitizerConfig(object):
     # whitelist : keep tag and content
-    Tag_whitelist = TAG_WHITELIST
-    Attrs_whitelist = ATTRS_WHITELIST
+    Tag_whitelist = frozenset(TAG_WHITELIST)
+    Attrs_whitelist = frozenset(ATTRS_WHITELIST)
     # blacklist : remove content
-    Tag_blacklist = TAG_BLACKLIST
-    Class_blacklist = CLASS_BLACKLIST
-    Id_blacklist = ID_BLACKLIST
+    Tag_blacklist = frozenset(TAG_BLACKLIST)
+    Class_blacklist = frozenset(CLASS_BLACKLIST)
+    Id_blacklist = frozenset(ID_BLACKLIST)
 
 
 class HtmlSanitizer(object):
@@ -30,38 +36,98 @@ class HtmlSanitizer(object):
 
     @classmethod
     def sanitize(cls, html_body: str) -> typing.Optional[str]:
-        soup = BeautifulSoup(html_body, 'html.parser')
-        for tag in soup.findAll():
-            if cls._tag_to_extract(tag):
-                tag.extract()
-            elif tag.name.lower() in HtmlSanitizerConfig.Tag_whitelist:
-                attrs = dict(tag.attrs)
-                for attr in attrs:
-                    if attr not in HtmlSanitizerConfig.Attrs_whitelist:
-                        del tag.attrs[attr]
-            else:
-                tag.unwrap()
+        soup = BeautifulSoup(html_body, HTML_PARSER)
+        # html parser add html and body tags, only body content is kept
+        tree = soup.find('body') or soup
+        return cls.sanitize_nodes(list(tree))
+
+    @classmethod
+    def sanitize_nodes(
+            cls,
+            nodes: typing.List[PageElement],
+    ) -> typing.Optional[str]:
+        """
+        Sanitize already parsed html elements. Sanitized html is directly
+        serialized from elements, they are not modified.
+        :param nodes: html elements to sanitize
+        :return: sanitized html or None if there is no content
+        """
+        output = []
+        has_content = False
+        # (node, closing tag) items, tree is walked without recursion to
+        # support deeply nested html.
+        stack = [(node, None) for node in reversed(nodes)]
+        while stack:
+            node, closing_tag = stack.pop()
+            if closing_tag:
+                output.append(closing_tag)
+            elif isinstance(node, NavigableString):
+                if isinstance(node, PreformattedString) \
+                        and not isinstance(node, CData):
+                    # comment, doctype...
+                    output.append(node.output_ready(formatter='minimal'))
+                else:
+                    # Text is escaped here: bs4 formatters don't escape
+                    # strings of some tags (script, style...) in all
+                    # versions.
+                    output.append(EntitySubstitution.substitute_xml(node))
+                if not has_content and type(node) in TEXT_TYPES:
+                    has_content = bool(node.replace('\n', '').strip())
+            elif isinstance(node, Tag):
+                tag_name = node.name.lower()
+                if cls._tag_to_extract(node, tag_name):
+                    continue
+                if tag_name in HtmlSanitizerConfig.Tag_whitelist:
+                    if tag_name == 'img':
+                        has_content = True
+                    output.append(cls._get_opening_tag(node))
+                    if node.is_empty_element:
+                        continue
+                    stack.append((None, '</{}>'.format(node.name)))
+                # Children of other tags are kept without their parent
+                stack.extend((child, None) for child in reversed(node.contents))
 
-        if cls._is_content_empty(soup):
+        if not has_content:
             return None
         else:
-            return str(soup)
+            return ''.join(output)
 
     @classmethod
-    def _is_content_empty(cls, soup):
-        img = soup.find('img')
-        txt = soup.get_text().replace('\n', '').strip()
-        return (not img and not txt)
+    def _get_opening_tag(cls, tag: Tag) -> str:
+        """
+        Serialize tag opening like bs4 does, with whitelisted attributes only
+        """
+        attrs = []
+        for key, value in tag.attrs.items():
+            if key not in HtmlSanitizerConfig.Attrs_whitelist:
+                continue
+            if value is None:
+                attrs.append(' {}'.format(key))
+                continue
+            if isinstance(value, list):
+                value = ' '.join(value)
+            attrs.append(' {}={}'.format(
+                key,
+                EntitySubstitution.quoted_attribute_value(
+                    EntitySubstitution.substitute_xml(value)
+                ),
+            ))
+        return '<{}{}{}>'.format(
+            tag.name,
+            ''.join(attrs),
+            '/' if tag.is_empty_element else '',
+        )
 
     @classmethod
-    def _tag_to_extract(cls, tag: Tag) -> bool:
-        if tag.name.lower() in HtmlSanitizerConfig.Tag_blacklist:
+    def _tag_to_extract(cls, tag: Tag, tag_name: str) -> bool:
+        if tag_name in HtmlSanitizerConfig.Tag_blacklist:
             return True
-        if 'class' in tag.attrs:
-            for elem in HtmlSanitizerConfig.Class_blacklist:
-                if elem in tag.attrs['class']:
-                    return True
-        if 'id' in tag.attrs:
+        if HtmlSanitizerConfig.Class_blacklist and 'class' in tag.attrs:
+            if not HtmlSanitizerConfig.Class_blacklist.isdisjoint(
+                    tag.get_attribute_list('class')
+            ):
+                return True
+        if HtmlSanitizerConfig.Id_blacklist and 'id' in tag.attrs:
             for elem in HtmlSanitizerConfig.Id_blacklist:
                 if elem in tag.attrs['id']:
                     return True
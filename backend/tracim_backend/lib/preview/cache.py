@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+import os
+import sqlite3
+import time
+import typing
+from contextlib import contextmanager
+
+from tracim_backend.lib.preview.generator import PREVIEW_LOCKS_FOLDER_NAME
+from tracim_backend.lib.utils.logger import logger
+
+PREVIEW_CACHE_INDEX_FILE_NAME = '.preview_cache.sqlite'
+PREVIEW_CACHE_LRU = 'LRU'
+PREVIEW_CACHE_LFU = 'LFU'
+PREVIEW_CACHE_EVICTION_POLICIES = (PREVIEW_CACHE_LRU, PREVIEW_CACHE_LFU)
+# Recently accessed previews are never evicted: they may be currently
+# sent to a client.
+PREVIEW_CACHE_EVICTION_GRACE_DELAY = 60
+
+
+class PreviewCacheEntry(object):
+    def __init__(
+        self,
+        path: str,
+        size: int,
+        last_access: float,
+        hits: int,
+    ) -> None:
+        self.path = path
+        self.size = size
+        self.last_access = last_access
+        self.hits = hits
+
+
+class PreviewCacheReport(object):
+    def __init__(
+        self,
+        max_size: int,
+        size: int,
+        files_count: int,
+        hits: int,
+        misses: int,
+        evictions: int,
+    ) -> None:
+        self.max_size = max_size
+        self.size = size
+        self.files_count = files_count
+        self.hits = hits
+        self.misses = misses
+        self.evictions = evictions
+
+    @property
+    def hit_rate(self) -> typing.Optional[float]:
+        """
+        :return: ratio of preview accesses served from cache, None if no
+        access has been recorded
+        """
+        if not self.hits + self.misses:
+            return None
+        return self.hits / (self.hits + self.misses)
+
+
+class PreviewCacheManager(object):
+    """
+    Preview cache accounting and eviction.
+
+    Preview manager write previews in cache dir without any limit: this
+    manager record previews accesses (hits and misses) in an sqlite index
+    stored in cache dir, shared by all tracim process, and remove least
+    recently (LRU) or least frequently (LFU) used previews when cache size
+    exceed max_size bytes. max_size of 0 means unlimited cache.
+    Eviction walks the whole cache dir, so it is never done while serving
+    previews: it is run by "tracimcli preview cache prune" command, which
+    should be scheduled (cron).
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_size: int = 0,
+        eviction_policy: str = PREVIEW_CACHE_LRU,
+        eviction_grace_delay: int = PREVIEW_CACHE_EVICTION_GRACE_DELAY,
+    ) -> None:
+        assert eviction_policy in PREVIEW_CACHE_EVICTION_POLICIES
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.eviction_policy = eviction_policy
+        self.eviction_grace_delay = eviction_grace_delay
+        self._index_path = os.path.join(
+            cache_dir,
+            PREVIEW_CACHE_INDEX_FILE_NAME,
+        )
+
+    @classmethod
+    def from_config(cls, config: 'CFG') -> 'PreviewCacheManager':
+        return cls(
+            config.PREVIEW_CACHE_DIR,
+            max_size=config.PREVIEW_CACHE_MAX_SIZE,
+            eviction_policy=config.PREVIEW_CACHE_EVICTION_POLICY,
+        )
+
+    def record_access(self, preview_path: str, request_time: float) -> None:
+        """
+        Record access to a preview returned by preview manager. Preview is
+        a cache hit if it was written before request time, a miss otherwise.
+        Accounting errors are logged, never raised: preview is available
+        anyway.
+        :param preview_path: path of preview in cache dir
+        :param request_time: timestamp of the beginning of preview request
+        """
+        preview_path = os.path.normpath(preview_path)
+        try:
+            stat = os.stat(preview_path)
+        except OSError:
+            return
+        hit = stat.st_mtime < request_time
+        now = time.time()
+        try:
+            with self._index() as index:
+                index.execute(
+                    'INSERT OR IGNORE INTO previews (path, size, last_access, hits) '  # nopep8
+                    'VALUES (?, ?, ?, 0)',
+                    (preview_path, stat.st_size, now),
+                )
+                index.execute(
+                    'UPDATE previews SET size = ?, last_access = ?, '
+                    'hits = hits + 1 WHERE path = ?',
+                    (stat.st_size, now, preview_path),
+                )
+                self._increment_metric(index, 'hits' if hit else 'misses')
+        except sqlite3.Error as exc:
+            logger.warning(
+                self,
+                'Unable to record preview cache access: {}'.format(str(exc)),
+            )
+
+    def report(self) -> PreviewCacheReport:
+        """
+        Synchronize index with cache dir content and return cache usage.
+        """
+        with self._index() as index:
+            self._synchronize_index(index)
+            size, files_count = index.execute(
+                'SELECT COALESCE(SUM(size), 0), COUNT(*) FROM previews'
+            ).fetchone()
+            return PreviewCacheReport(
+                max_size=self.max_size,
+                size=size,
+                files_count=files_count,
+                hits=self._get_metric(index, 'hits'),
+                misses=self._get_metric(index, 'misses'),
+                evictions=self._get_metric(index, 'evictions'),
+            )
+
+    def prune(
+        self,
+        max_size: int = None,
+        target_size: int = None,
+    ) -> typing.List[PreviewCacheEntry]:
+        """
+        If cache size exceeds max size, remove previews according to
+        eviction policy until cache size is lower than target size.
+        :param max_size: max size in bytes, default is configured max size.
+        0 means no limit: nothing is removed.
+        :param target_size: size in bytes to reduce cache to, default is
+        max size
+        :return: removed entries
+        """
+        max_size = self.max_size if max_size is None else max_size
+        if not max_size:
+            return []
+        target_size = max_size if target_size is None else target_size
+
+        evicted_entries = []
+        with self._index() as index:
+            self._synchronize_index(index)
+            size = self._get_indexed_size(index)
+            if size <= max_size:
+                return []
+            if self.eviction_policy == PREVIEW_CACHE_LFU:
+                order_by = 'hits ASC, last_access ASC'
+            else:
+                order_by = 'last_access ASC'
+            rows = index.execute(
+                'SELECT path, size, last_access, hits FROM previews '
+                'WHERE last_access < ? ORDER BY {}'.format(order_by),
+                (time.time() - self.eviction_grace_delay, ),
+            ).fetchall()
+            for row in rows:
+                if size <= target_size:
+                    break
+                entry = PreviewCacheEntry(*row)
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+                except OSError as exc:
+                    logger.warning(
+                        self,
+                        'Unable to remove preview {}: {}'.format(
+                            entry.path,
+                            str(exc),
+                        ),
+                    )
+                    continue
+                index.execute(
+                    'DELETE FROM previews WHERE path = ?',
+                    (entry.path, ),
+                )
+                size -= entry.size
+                evicted_entries.append(entry)
+            self._increment_metric(
+                index,
+                'evictions',
+                len(evicted_entries),
+            )
+        logger.info(
+            self,
+            '{} previews removed from preview cache'.format(
+                len(evicted_entries),
+            ),
+        )
+        return evicted_entries
+
+    @contextmanager
+    def _index(self) -> typing.Generator[sqlite3.Connection, None, None]:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        connection = sqlite3.connect(self._index_path, timeout=10)
+        try:
+            with connection:
+                connection.execute(
+                    'CREATE TABLE IF NOT EXISTS previews ('
+                    'path TEXT PRIMARY KEY, '
+                    'size INTEGER NOT NULL, '
+                    'last_access REAL NOT NULL, '
+                    'hits INTEGER NOT NULL)'
+                )
+                connection.execute(
+                    'CREATE TABLE IF NOT EXISTS metrics ('
+                    'name TEXT PRIMARY KEY, '
+                    'value INTEGER NOT NULL)'
+                )
+                yield connection
+        finally:
+            connection.close()
+
+    def _synchronize_index(self, index: sqlite3.Connection) -> None:
+        """
+        Add previews not yet indexed (generated before accounting or by
+        preview generator daemon) and remove vanished previews from index.
+        """
+        indexed_paths = {
+            row[0] for row in index.execute('SELECT path FROM previews')
+        }
+        cache_paths = set()
+        for preview_path, stat in self._walk_cache_dir():
+            cache_paths.add(preview_path)
+            if preview_path not in indexed_paths:
+                index.execute(
+                    'INSERT INTO previews (path, size, last_access, hits) '
+                    'VALUES (?, ?, ?, 0)',
+                    (preview_path, stat.st_size, stat.st_mtime),
+                )
+        vanished_paths = indexed_paths - cache_paths
+        index.executemany(
+            'DELETE FROM previews WHERE path = ?',
+            [(path, ) for path in vanished_paths],
+        )
+
+    def _walk_cache_dir(
+        self,
+    ) -> typing.Generator[typing.Tuple[str, os.stat_result], None, None]:
+        for dir_path, dir_names, file_names in os.walk(self.cache_dir):
+            if PREVIEW_LOCKS_FOLDER_NAME in dir_names:
+                dir_names.remove(PREVIEW_LOCKS_FOLDER_NAME)
+            for file_name in file_names:
+                if file_name.startswith(PREVIEW_CACHE_INDEX_FILE_NAME):
+                    # index and its sqlite journal
+                    continue
+                preview_path = os.path.normpath(
+                    os.path.join(dir_path, file_name)
+                )
+                try:
+                    yield preview_path, os.stat(preview_path)
+                except FileNotFoundError:
+                    continue
+
+    @classmethod
+    def _get_indexed_size(cls, index: sqlite3.Connection) -> int:
+        return index.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM previews'
+        ).fetchone()[0]
+
+    @classmethod
+    def _get_metric(cls, index: sqlite3.Connection, name: str) -> int:
+        row = index.execute(
+            'SELECT value FROM metrics WHERE name = ?',
+            (name, ),
+        ).fetchone()
+        return row[0] if row else 0
+
+    @classmethod
+    def _increment_metric(
+        cls,
+        index: sqlite3.Connection,
+        name: str,
+        value: int = 1,
+    ) -> None:
+        index.execute(
+            'INSERT OR IGNORE INTO metrics (name, value) VALUES (?, 0)',
+            (name, ),
+        )
+        index.execute(
+            'UPDATE metrics SET value = value + ? WHERE name = ?',
+            (value, name),
+        )
@@ -0,0 +1,65 @@
+import typing
+from tracim_backend.lib.mail_notifier.daemon import RQWorker
+from tracim_backend.lib.preview.generator import PREVIEW_GENERATOR_QUEUE_NAME
+from tracim_backend.lib.preview.generator import set_preview_infos_session_factory  # nopep8
+from tracim_backend.lib.utils.daemon import FakeDaemon
+from tracim_backend.lib.utils.logger import logger
+from tracim_backend.lib.utils.utils import get_rq_queue
+from tracim_backend.lib.utils.utils import get_redis_connection
+from tracim_backend.models import get_engine
+from tracim_backend.models import get_session_factory
+from rq.dummy import do_nothing
+from rq import Connection as RQConnection
+
+
+class PreviewGeneratorDaemon(FakeDaemon):
+    """
+    Daemon generating previews of new file revisions, see
+    preview.generation.processing_mode config.
+    """
+    # NOTE: use *args and **kwargs because parent __init__ use strange
+    # * parameter
+    def __init__(
+        self,
+        config: 'CFG',
+        burst=True,
+        settings: typing.Optional[dict] = None,
+        *args,
+        **kwargs
+    ):
+        """
+        :param config: tracim config
+        :param burst: if true, run one time, if false, run continously
+        :param settings: Tracim settings, database settings are required to
+        store page number and pdf availability of generated revisions
+        """
+        super().__init__(*args, **kwargs)
+        self.config = config
+        self.worker = None  # type: RQWorker
+        self.burst = burst
+        self.settings = settings
+
+    def append_thread_callback(self, callback: typing.Callable) -> None:
+        logger.warning(
+            self,
+            'PreviewGeneratorDaemon not implement append_thread_callback',
+        )
+        pass
+
+    def stop(self) -> None:
+        # When _stop_requested at False, RQWorker will raise StopRequested
+        # exception in worker thread after receive a job.
+        self.worker._stop_requested = True
+        redis_connection = get_redis_connection(self.config)
+        queue = get_rq_queue(redis_connection, PREVIEW_GENERATOR_QUEUE_NAME)
+        queue.enqueue(do_nothing)
+
+    def run(self) -> None:
+        if self.settings is not None:
+            # Jobs are run in forked worker process, they inherit it.
+            set_preview_infos_session_factory(
+                get_session_factory(get_engine(self.settings))
+            )
+        with RQConnection(get_redis_connection(self.config)):
+            self.worker = RQWorker([PREVIEW_GENERATOR_QUEUE_NAME])
+            self.worker.work(burst=self.burst)
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import os
+import typing
+
+import transaction
+from filelock import FileLock
+from preview_generator.exception import UnsupportedMimeType
+from preview_generator.manager import PreviewManager
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql.elements import and_
+
+from tracim_backend.lib.utils.logger import logger
+from tracim_backend.lib.utils.utils import get_rq_queue
+from tracim_backend.lib.utils.utils import get_redis_connection
+from tracim_backend.models.data import ContentRevisionRO
+
+PREVIEW_GENERATOR_QUEUE_NAME = 'preview_generator'
+PREVIEW_LOCKS_FOLDER_NAME = '.locks'
+# Office documents conversions of big files can be very long
+PREVIEW_GENERATION_JOB_TIMEOUT = 60 * 60
+
+# Session factory used by generate_previews() jobs to store preview
+# informations of revisions, set by preview generator daemon.
+_session_factory = None  # type: typing.Optional[sessionmaker]
+
+
+def set_preview_infos_session_factory(
+    session_factory: typing.Optional[sessionmaker],
+) -> None:
+    """
+    Set database session factory used by generate_previews() jobs run in
+    this process to store preview informations of generated revisions.
+    Without it, they are only computed on first access.
+    """
+    global _session_factory
+    _session_factory = session_factory
+
+
+def store_preview_infos(
+    session_factory: sessionmaker,
+    revision_id: int,
+    preview_available: bool,
+    page_nb: typing.Optional[int],
+    pdf_available: bool,
+) -> None:
+    """
+    Store preview informations of a revision, see
+    ContentApi.fill_revision_preview_infos(). Already known informations are
+    not overwritten.
+    """
+    revisions = ContentRevisionRO.__table__
+    session = session_factory()
+    try:
+        # Revisions are protected against modifications at ORM level, this
+        # only fills not yet computed columns.
+        session.execute(
+            revisions.update().where(and_(
+                revisions.c.revision_id == revision_id,
+                revisions.c.preview_available.is_(None),
+            )).values(
+                preview_available=preview_available,
+                preview_page_nb=page_nb,
+                preview_pdf_available=pdf_available,
+            )
+        )
+        session.commit()
+    finally:
+        session.close()
+
+
+def get_preview_lock(preview_cache_dir: str, file_path: str) -> FileLock:
+    """
+    Return lock dedicated to previews of given file. Lock is shared
+    between threads and process using same preview cache dir: hold it while
+    generating a preview so concurrent generations of the same file wait for
+    the first one, then use its cached result.
+    :param preview_cache_dir: preview manager cache dir
+    :param file_path: path of the original file
+    :return: non acquired lock
+    """
+    locks_dir = os.path.join(preview_cache_dir, PREVIEW_LOCKS_FOLDER_NAME)
+    os.makedirs(locks_dir, exist_ok=True)
+    lock_name = hashlib.sha1(file_path.encode('utf-8')).hexdigest()
+    return FileLock(os.path.join(locks_dir, '{}.lock'.format(lock_name)))
+
+
+def generate_previews(
+    preview_cache_dir: str,
+    file_path: str,
+    jpg_dims: typing.List[typing.Tuple[int, int]],
+    jpg_pages: int,
+    revision_id: typing.Optional[int] = None,
+) -> None:
+    """
+    Generate page number, pdf preview and jpg previews of given file in
+    preview cache. Lock of the file is taken for each generation step, so
+    requests waiting for a preview only wait for the current step.
+    Page number and pdf availability are stored in given revision if a
+    session factory has been set, see set_preview_infos_session_factory().
+    :param preview_cache_dir: preview manager cache dir
+    :param file_path: path of the original file
+    :param jpg_dims: (width, height) of jpg previews to generate
+    :param jpg_pages: number of pages to generate jpg previews for,
+    0 means all pages
+    :param revision_id: id of the revision of the file
+    """
+    if not os.path.exists(file_path):
+        # Revision creation has been rollbacked or file has been removed
+        # since job was enqueued.
+        logger.warning(
+            generate_previews,
+            'Preview generation skipped: file {} does not exist'.format(
+                file_path,
+            ),
+        )
+        return
+
+    preview_manager = PreviewManager(preview_cache_dir, create_folder=True)
+    preview_lock = get_preview_lock(preview_cache_dir, file_path)
+    try:
+        with preview_lock:
+            page_nb = preview_manager.get_page_nb(file_path)
+        with preview_lock:
+            has_pdf_preview = preview_manager.has_pdf_preview(file_path)
+    except UnsupportedMimeType:
+        logger.debug(
+            generate_previews,
+            'No preview available for file {}'.format(file_path),
+        )
+        _store_preview_infos(revision_id, False, None, False)
+        return
+    _store_preview_infos(revision_id, True, page_nb, has_pdf_preview)
+
+    try:
+        if has_pdf_preview:
+            with preview_lock:
+                preview_manager.get_pdf_preview(file_path)
+        if jpg_pages:
+            page_nb = min(page_nb, jpg_pages)
+        for page in range(page_nb):
+            for width, height in jpg_dims:
+                with preview_lock:
+                    preview_manager.get_jpeg_preview(
+                        file_path,
+                        page=page,
+                        width=width,
+                        height=height,
+                    )
+    except UnsupportedMimeType:
+        logger.debug(
+            generate_previews,
+            'No preview available for file {}'.format(file_path),
+        )
+        return
+    logger.info(
+        generate_previews,
+        'Previews of file {} generated'.format(file_path),
+    )
+
+
+def _store_preview_infos(
+    revision_id: typing.Optional[int],
+    preview_available: bool,
+    page_nb: typing.Optional[int],
+    pdf_available: bool,
+) -> None:
+    if revision_id is None or _session_factory is None:
+        return
+    try:
+        store_preview_infos(
+            _session_factory,
+            revision_id,
+            preview_available,
+            page_nb,
+            pdf_available,
+        )
+    except Exception as exc:
+        # They will be computed again on first access
+        logger.error(
+            generate_previews,
+            'Unable to store preview informations of revision {}: {}'.format(
+                revision_id,
+                str(exc),
+            ),
+        )
+
+
+def enqueue_previews_generation(
+    config: 'CFG',
+    revision: ContentRevisionRO,
+    transaction_manager: transaction.TransactionManager,
+) -> None:
+    """
+    Enqueue previews generation of given revision file, according to
+    preview generation processing mode. Job is enqueued only if current
+    transaction of given transaction manager is committed.
+    :param config: app config
+    :param revision: new revision, with its new depot file
+    :param transaction_manager: transaction manager of revision session,
+    see tracim_backend.models.get_session_transaction_manager()
+    """
+    if config.PREVIEW_GENERATION_PROCESSING_MODE != config.CST.ASYNC:
+        return
+    # Preview manager work with file path, as in
+    # ContentApi.get_one_revision_filepath()
+    file_path = getattr(revision.depot_file.file, '_file_path', None)
+    if not file_path:
+        return
+
+    jpg_dims = [
+        (dim.width, dim.height) for dim in config.PREVIEW_JPG_ALLOWED_DIMS
+    ]
+
+    def enqueue_hook(transaction_succeeded: bool) -> None:
+        if not transaction_succeeded:
+            return
+        try:
+            redis_connection = get_redis_connection(config)
+            queue = get_rq_queue(
+                redis_connection,
+                PREVIEW_GENERATOR_QUEUE_NAME,
+            )
+            queue.enqueue_call(
+                func=generate_previews,
+                args=(
+                    config.PREVIEW_CACHE_DIR,
+                    file_path,
+                    jpg_dims,
+                    config.PREVIEW_GENERATION_JPG_PAGES,
+                    # revision has been flushed with transaction
+                    revision.revision_id,
+                ),
+                timeout=PREVIEW_GENERATION_JOB_TIMEOUT,
+            )
+        except Exception as exc:
+            # Previews will be generated lazily on first access
+            logger.error(
+                enqueue_previews_generation,
+                'Unable to enqueue previews generation of {}: {}'.format(
+                    file_path,
+                    str(exc),
+                ),
+            )
+
+    transaction_manager.get().addAfterCommitHook(enqueue_hook)
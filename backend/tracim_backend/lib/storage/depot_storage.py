@@ -0,0 +1,484 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import typing
+import uuid
+from datetime import datetime
+from io import BytesIO
+
+from depot.io import utils
+from depot.io.interfaces import FileStorage
+from depot.io.interfaces import StoredFile
+from depot.io.local import LocalStoredFile
+from filelock import FileLock
+
+BLOB_CHUNK_SIZE = 64 * 1024
+# Uploads smaller than this are spooled in memory, bigger ones to disk
+SPOOL_MAX_MEMORY_SIZE = 1024 * 1024
+BLOBS_FOLDER_NAME = 'blobs'
+METADATA_FILE_NAME = 'metadata.json'
+# Content file name of depot LocalFileStorage
+LEGACY_FILE_NAME = 'file'
+DIGEST_METADATA_KEY = 'sha256'
+
+
+def compute_content_digest(content: typing.Union[bytes, typing.IO]) -> str:
+    """
+    Compute sha256 hex digest of given content.
+    :param content: bytes or readable file object. File object will be read
+    by chunks and rewind to its initial position if possible.
+    :return: sha256 hex digest
+    """
+    digest, _ = compute_content_digest_and_size(content)
+    return digest
+
+
+def compute_content_digest_and_size(
+    content: typing.Union[bytes, typing.IO]
+) -> typing.Tuple[str, int]:
+    """
+    Compute sha256 hex digest and size of given content in a single pass.
+    :param content: bytes or readable file object. File object will be read
+    by chunks and rewind to its initial position if possible.
+    :return: sha256 hex digest and size in bytes
+    """
+    sha256 = hashlib.sha256()
+    if not hasattr(content, 'read'):
+        sha256.update(content)
+        return sha256.hexdigest(), len(content)
+
+    content_length = 0
+    initial_position = None
+    if getattr(content, 'seekable', lambda: False)():
+        initial_position = content.tell()
+    for chunk in iter(lambda: content.read(BLOB_CHUNK_SIZE), b''):
+        sha256.update(chunk)
+        content_length += len(chunk)
+    if initial_position is not None:
+        content.seek(initial_position)
+    return sha256.hexdigest(), content_length
+
+
+class DigestedContent(object):
+    """
+    Readable file content whose sha256 digest and size are already known,
+    see spool_content(). DeduplicatedFileStorage doesn't hash it again and
+    doesn't read it at all if a blob with the same digest is already stored.
+    """
+    def __init__(
+        self,
+        fileobj: typing.IO,
+        digest: str,
+        content_length: int
+    ) -> None:
+        self._fileobj = fileobj
+        self.digest = digest
+        self.content_length = content_length
+
+    def read(self, n: int=-1) -> bytes:
+        return self._fileobj.read(n)
+
+    def close(self) -> None:
+        self._fileobj.close()
+
+
+def spool_content(
+    content: typing.Union[bytes, typing.IO]
+) -> DigestedContent:
+    """
+    Read content once by chunks, computing its sha256 digest and size while
+    copying it to a temporary file (kept in memory for small contents).
+    Returned content can then be stored even if given content was a non
+    seekable stream.
+    :param content: bytes or readable file object, file object is read until
+    its end
+    :return: spooled content, with digest and size
+    """
+    if not hasattr(content, 'read'):
+        digest, content_length = compute_content_digest_and_size(content)
+        return DigestedContent(BytesIO(content), digest, content_length)
+
+    sha256 = hashlib.sha256()
+    content_length = 0
+    spooled_file = tempfile.SpooledTemporaryFile(
+        max_size=SPOOL_MAX_MEMORY_SIZE,
+    )
+    for chunk in iter(lambda: content.read(BLOB_CHUNK_SIZE), b''):
+        sha256.update(chunk)
+        content_length += len(chunk)
+        spooled_file.write(chunk)
+    spooled_file.seek(0)
+    return DigestedContent(spooled_file, sha256.hexdigest(), content_length)
+
+
+def get_stored_file_info(
+    storage_path: str,
+    file_id: str,
+) -> typing.Tuple[typing.Optional[str], typing.Optional[int]]:
+    """
+    Return sha256 digest and size of a file stored in depot local storage
+    path by LocalFileStorage or DeduplicatedFileStorage, without depot
+    configuration (used by migrations). Digest is read from metadata if
+    known, legacy files are streamed to compute it.
+    :param storage_path: depot storage path
+    :param file_id: depot file id
+    :return: digest and size, None if file or metadata can't be read
+    """
+    local_path = os.path.join(storage_path, file_id)
+    metadata_path = os.path.join(local_path, METADATA_FILE_NAME)
+    try:
+        with open(metadata_path, 'r') as metadata_file:
+            metadata = json.loads(metadata_file.read())
+    except (OSError, ValueError):
+        return None, None
+    digest = metadata.get(DIGEST_METADATA_KEY)
+    content_length = metadata.get('content_length')
+    if digest is not None:
+        return digest, content_length
+    try:
+        with open(os.path.join(local_path, LEGACY_FILE_NAME), 'rb') as file_:
+            return compute_content_digest_and_size(file_)
+    except OSError:
+        return None, content_length
+
+
+def get_stored_file_digest(stored_file: StoredFile) -> typing.Optional[str]:
+    """
+    Return known sha256 digest of a depot stored file without reading it.
+    :param stored_file: depot stored file
+    :return: digest or None if storage doesn't know it (legacy file or other
+    storage backend)
+    """
+    return getattr(stored_file, 'digest', None)
+
+
+class DeduplicatedStoredFile(StoredFile):
+    """
+    Depot StoredFile who read its content from a content-addressed blob
+    shared with every other stored file with the same content.
+    """
+    def __init__(
+        self,
+        file_id: str,
+        metadata: dict,
+        blob_path: str
+    ) -> None:
+        self.digest = metadata[DIGEST_METADATA_KEY]
+        # Same attribute name as depot LocalStoredFile: file path is used
+        # for preview generation, see ContentApi.get_one_revision_filepath()
+        self._file_path = blob_path
+        self._file = None
+        self._closed = False
+        last_modified = metadata.get('last_modified')
+        if last_modified:
+            last_modified = datetime.strptime(
+                last_modified,
+                '%Y-%m-%d %H:%M:%S'
+            )
+        super().__init__(
+            file_id=file_id,
+            filename=metadata.get('filename', 'unnamed'),
+            content_type=metadata.get(
+                'content_type',
+                'application/octet-stream'
+            ),
+            last_modified=last_modified,
+            content_length=metadata.get('content_length'),
+        )
+
+    def read(self, n: int=-1) -> bytes:
+        if self._closed:
+            raise ValueError('I/O operation on closed file')
+        if self._file is None:
+            self._file = open(self._file_path, 'rb')
+        return self._file.read(n)
+
+    def close(self) -> None:
+        # Blob is only opened by first read, closing a not yet read file
+        # doesn't need to open it.
+        self._closed = True
+        if self._file is not None:
+            self._file.close()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+
+class DeduplicatedFileStorage(FileStorage):
+    """
+    Depot FileStorage who store file content once by sha256 digest.
+
+    Each stored file (depot file_id) is only a small metadata file
+    referencing a blob by its digest, blobs are reference counted: a blob is
+    removed from disk when the last stored file referencing it is deleted.
+
+    Files stored by depot LocalFileStorage (legacy layout) in the same
+    storage_path are still readable and deletable.
+
+    Storing a DeduplicatedStoredFile of this storage (for example a new
+    revision of a content created from its previous revision) only adds a
+    reference to its blob, file content is not read.
+
+    Layout:
+    - <storage_path>/<file_id>/metadata.json
+    - <storage_path>/blobs/<digest[:2]>/<digest>
+    - <storage_path>/blobs/<digest[:2]>/<digest>.refs
+    """
+
+    def __init__(self, storage_path: str) -> None:
+        self.storage_path = storage_path
+        self._blobs_path = os.path.join(storage_path, BLOBS_FOLDER_NAME)
+        os.makedirs(self._blobs_path, exist_ok=True)
+        # Lock shared by all process using this storage path, protect blobs
+        # creation and references counters.
+        self._lock = FileLock(os.path.join(self._blobs_path, '.lock'))
+
+    def get(self, file_or_id: typing.Union[str, StoredFile]) -> StoredFile:
+        file_id = self.fileid(file_or_id)
+        local_path = self._local_path(file_id)
+        metadata = self._read_metadata(file_id)
+        if DIGEST_METADATA_KEY not in metadata:
+            return LocalStoredFile(file_id, local_path)
+        return DeduplicatedStoredFile(
+            file_id,
+            metadata,
+            self._blob_path(metadata[DIGEST_METADATA_KEY]),
+        )
+
+    def create(
+        self,
+        content: typing.Any,
+        filename: str=None,
+        content_type: str=None
+    ) -> str:
+        new_file_id = str(uuid.uuid1())
+        content, filename, content_type = self.fileinfo(
+            content,
+            filename,
+            content_type,
+        )
+        self._save_file(new_file_id, content, filename, content_type)
+        return new_file_id
+
+    def replace(
+        self,
+        file_or_id: typing.Union[str, StoredFile],
+        content: typing.Any,
+        filename: str=None,
+        content_type: str=None
+    ) -> str:
+        file_id = self.fileid(file_or_id)
+        if not self.exists(file_id):
+            raise IOError('File {} not existing'.format(file_id))
+
+        content, filename, content_type = self.fileinfo(
+            content,
+            filename,
+            content_type,
+            lambda: self.get(file_id),
+        )
+        # Store new content before releasing old one, content may be the
+        # stored file itself.
+        digest, content_length = self._store_blob(content)
+        self.delete(file_id)
+        self._write_metadata(
+            file_id,
+            digest,
+            content_length,
+            filename,
+            content_type,
+        )
+        return file_id
+
+    def delete(self, file_or_id: typing.Union[str, StoredFile]) -> None:
+        file_id = self.fileid(file_or_id)
+        self._check_file_id(file_id)
+        try:
+            metadata = self._read_metadata(file_id)
+        except IOError:
+            return
+        if DIGEST_METADATA_KEY in metadata:
+            self._release_blob(metadata[DIGEST_METADATA_KEY])
+        shutil.rmtree(self._local_path(file_id), ignore_errors=True)
+
+    def exists(self, file_or_id: typing.Union[str, StoredFile]) -> bool:
+        file_id = self.fileid(file_or_id)
+        self._check_file_id(file_id)
+        return os.path.exists(self._local_path(file_id))
+
+    def list(self) -> typing.List[str]:
+        file_ids = []
+        for file_name in os.listdir(self.storage_path):
+            try:
+                self._check_file_id(file_name)
+            except ValueError:
+                continue
+            file_ids.append(file_name)
+        return file_ids
+
+    def get_blob_references_count(self, digest: str) -> int:
+        """
+        Return number of stored files sharing the blob of given digest.
+        """
+        refs_path = self._refs_path(digest)
+        if not os.path.exists(refs_path):
+            return 0
+        with open(refs_path, 'r') as refs_file:
+            return int(refs_file.read() or 0)
+
+    def _save_file(
+        self,
+        file_id: str,
+        content: typing.Any,
+        filename: str,
+        content_type: str
+    ) -> None:
+        digest, content_length = self._store_blob(content)
+        self._write_metadata(
+            file_id,
+            digest,
+            content_length,
+            filename,
+            content_type,
+        )
+
+    def _store_blob(self, content: typing.Any) -> typing.Tuple[str, int]:
+        """
+        Write content to a temporary file while hashing it, then move it as
+        blob if no blob with same digest already exist. Already stored blobs
+        are only referenced.
+        :return: digest and size of content
+        """
+        if isinstance(content, str):
+            raise TypeError('Only bytes can be stored, not unicode')
+
+        if self._is_stored_blob(content) \
+                and self._add_blob_reference(content.digest):
+            # Content is a file of this storage: its blob is shared
+            # without reading it.
+            return content.digest, content.content_length
+        known_digest = None
+        if isinstance(content, DigestedContent):
+            if self._add_blob_reference(content.digest):
+                # Same content is already stored, it's not read.
+                return content.digest, content.content_length
+            known_digest = content.digest
+
+        sha256 = hashlib.sha256()
+        content_length = 0
+        temp_fd, temp_path = tempfile.mkstemp(dir=self._blobs_path)
+        try:
+            with os.fdopen(temp_fd, 'wb') as temp_file:
+                if hasattr(content, 'read'):
+                    chunks = iter(
+                        lambda: content.read(BLOB_CHUNK_SIZE),
+                        b'',
+                    )
+                else:
+                    chunks = [content]
+                for chunk in chunks:
+                    if known_digest is None:
+                        sha256.update(chunk)
+                    content_length += len(chunk)
+                    temp_file.write(chunk)
+            digest = known_digest or sha256.hexdigest()
+            with self._lock:
+                blob_path = self._blob_path(digest)
+                if not os.path.exists(blob_path):
+                    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                    os.replace(temp_path, blob_path)
+                self._set_blob_references_count(
+                    digest,
+                    self.get_blob_references_count(digest) + 1,
+                )
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return digest, content_length
+
+    def _is_stored_blob(self, content: typing.Any) -> bool:
+        return isinstance(content, DeduplicatedStoredFile) \
+            and content.content_length is not None \
+            and content._file_path == self._blob_path(content.digest)
+
+    def _add_blob_reference(self, digest: str) -> bool:
+        """
+        Add a reference to an existing blob.
+        :return: False if blob doesn't exist (anymore)
+        """
+        with self._lock:
+            if not os.path.exists(self._blob_path(digest)):
+                return False
+            self._set_blob_references_count(
+                digest,
+                self.get_blob_references_count(digest) + 1,
+            )
+            return True
+
+    def _release_blob(self, digest: str) -> None:
+        with self._lock:
+            references_count = self.get_blob_references_count(digest) - 1
+            if references_count > 0:
+                self._set_blob_references_count(digest, references_count)
+                return
+            for path in (self._blob_path(digest), self._refs_path(digest)):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _set_blob_references_count(self, digest: str, count: int) -> None:
+        with open(self._refs_path(digest), 'w') as refs_file:
+            refs_file.write(str(count))
+
+    def _write_metadata(
+        self,
+        file_id: str,
+        digest: str,
+        content_length: int,
+        filename: str,
+        content_type: str,
+    ) -> None:
+        local_path = self._local_path(file_id)
+        os.makedirs(local_path, exist_ok=True)
+        metadata = {
+            'filename': filename,
+            'content_type': content_type,
+            'content_length': content_length,
+            'last_modified': utils.timestamp(),
+            DIGEST_METADATA_KEY: digest,
+        }
+        metadata_path = os.path.join(local_path, METADATA_FILE_NAME)
+        with open(metadata_path, 'w') as metadata_file:
+            metadata_file.write(json.dumps(metadata))
+
+    def _read_metadata(self, file_id: str) -> dict:
+        self._check_file_id(file_id)
+        metadata_path = os.path.join(
+            self._local_path(file_id),
+            METADATA_FILE_NAME,
+        )
+        try:
+            with open(metadata_path, 'r') as metadata_file:
+                return json.loads(metadata_file.read())
+        except (OSError, ValueError) as exc:
+            raise IOError('File {} not existing'.format(file_id)) from exc
+
+    def _local_path(self, file_id: str) -> str:
+        return os.path.join(self.storage_path, file_id)
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self._blobs_path, digest[:2], digest)
+
+    def _refs_path(self, digest: str) -> str:
+        return '{}.refs'.format(self._blob_path(digest))
+
+    @classmethod
+    def _check_file_id(cls, file_id: str) -> None:
+        # Same check as depot local storage, this also prevent unsafe paths.
+        try:
+            uuid.UUID('{%s}' % file_id)
+        except ValueError as exc:
+            raise ValueError('Invalid file id {}'.format(file_id)) from exc
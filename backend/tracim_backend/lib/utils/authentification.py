@@ -11,6 +11,10 @@ from zope.interface import implementer
 
 from tracim_backend.exceptions import UserDoesNotExist
 from tracim_backend.lib.core.user import UserApi
+from tracim_backend.lib.utils.password import VerifiedCredentialsCache
+from tracim_backend.lib.utils.session import get_session_user_summary
+from tracim_backend.lib.utils.session import get_user_session_version
+from tracim_backend.lib.utils.session import set_session_user_summary
 from tracim_backend.models import User
 
 BASIC_AUTH_WEBUI_REALM = "tracim"
@@ -43,8 +47,15 @@ def _get_auth_unsafe_user(
 @implementer(IAuthenticationPolicy)
 class TracimBasicAuthAuthenticationPolicy(BasicAuthAuthenticationPolicy):
 
-    def __init__(self, realm):
+    def __init__(
+        self,
+        realm: str,
+        credentials_cache: typing.Optional[VerifiedCredentialsCache] = None,
+    ):
         BasicAuthAuthenticationPolicy.__init__(self, check=None, realm=realm)
+        # Basic auth clients send password with each request, successfully
+        # checked credentials are cached to not hash password every time.
+        self.credentials_cache = credentials_cache or VerifiedCredentialsCache(ttl=0)  # nopep8
         # TODO - G.M - 2018-09-21 - Disable callback is needed to have BasicAuth
         # correctly working, if enabled, callback method will try check method
         # who is now disabled (uneeded because we use directly
@@ -63,10 +74,18 @@ class TracimBasicAuthAuthenticationPolicy(BasicAuthAuthenticationPolicy):
                 or not user.is_active \
                 or user.is_deleted \
                 or not credentials \
-                or not user.validate_password(credentials.password):
+                or not self._validate_password(user, credentials.password):
             return None
         return user.user_id
 
+    def _validate_password(self, user: User, password: str) -> bool:
+        if self.credentials_cache.check(user.email, password, user.password):
+            return True
+        if not user.validate_password(password):
+            return False
+        self.credentials_cache.add(user.email, password, user.password)
+        return True
+
 
 ###
 # Pyramid cookie auth policy
@@ -82,12 +101,18 @@ class CookieSessionAuthentificationPolicy(SessionAuthenticationPolicy):
         self.callback = None
 
     def authenticated_userid(self, request):
-        # check if user is correct
-        user = _get_auth_unsafe_user(request, user_id=request.unauthenticated_userid)  # nopep8
-        # do not allow invalid_user + ask for cleanup of session cookie
-        if not user or not user.is_active or user.is_deleted:
-            request.session.delete()
-            return None
+        user_id = request.unauthenticated_userid
+        # with redis session store, a summary of checked user is kept in
+        # session until user is modified, see invalidate_user_sessions()
+        version = get_user_session_version(user_id) if user_id else None
+        if not get_session_user_summary(request.session, user_id, version):
+            # check if user is correct
+            user = _get_auth_unsafe_user(request, user_id=user_id)
+            # do not allow invalid_user + ask for cleanup of session cookie
+            if not user or not user.is_active or user.is_deleted:
+                request.session.delete()
+                return None
+            set_session_user_summary(request.session, user, version)
         # recreate session if need renew
         if not request.session.new:
             now = datetime.datetime.now()
@@ -95,7 +120,7 @@ class CookieSessionAuthentificationPolicy(SessionAuthenticationPolicy):
             reissue_limit = last_access_datetime + datetime.timedelta(seconds=self._reissue_time)  # nopep8
             if now > reissue_limit:  # nopep8
                 request.session.regenerate_id()
-        return user.user_id
+        return user_id
 
     def forget(self, request):
         """ Remove the stored userid from the session."""
@@ -0,0 +1,417 @@
+# -*- coding: utf-8 -*-
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+import typing
+from collections import OrderedDict
+
+try:
+    import argon2
+except ImportError:
+    argon2 = None
+
+try:
+    import bcrypt
+except ImportError:
+    bcrypt = None
+
+PBKDF2_SHA256_SCHEME = 'pbkdf2_sha256'
+ARGON2_SCHEME = 'argon2'
+BCRYPT_SCHEME = 'bcrypt'
+PASSWORD_HASH_SCHEMES = (PBKDF2_SHA256_SCHEME, ARGON2_SCHEME, BCRYPT_SCHEME)
+
+PBKDF2_DEFAULT_ITERATIONS = 100000
+PBKDF2_SALT_SIZE = 16
+PBKDF2_PREFIX = '$pbkdf2-sha256$'
+BCRYPT_DEFAULT_ROUNDS = 12
+BCRYPT_PREFIXES = ('$2a$', '$2b$', '$2y$')
+ARGON2_PREFIX = '$argon2'
+# legacy hashes are a 64 chars hex salt followed by 64 chars hex
+# sha256(password + salt)
+LEGACY_SHA256_HASH_SIZE = 128
+
+CREDENTIALS_CACHE_DEFAULT_TTL = 60
+CREDENTIALS_CACHE_DEFAULT_MAX_SIZE = 1000
+
+
+def _b64encode(value: bytes) -> str:
+    return base64.urlsafe_b64encode(value).decode('ascii').rstrip('=')
+
+
+def _b64decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+
+
+class PasswordHasher(object):
+    """
+    Hash and check user passwords with a key derivation function:
+    - pbkdf2_sha256: always available (hashlib)
+    - argon2: needs argon2-cffi
+    - bcrypt: needs bcrypt
+
+    Hashes are stored in their usual "modular crypt" like format, so scheme
+    and cost of any stored hash can be found back. Legacy salted sha256
+    hashes are still checked, needs_rehash() report them (and hashes made
+    with another scheme or a lower cost) to allow rehash on login.
+    """
+
+    def __init__(
+        self,
+        scheme: str = PBKDF2_SHA256_SCHEME,
+        pbkdf2_iterations: int = PBKDF2_DEFAULT_ITERATIONS,
+        bcrypt_rounds: int = BCRYPT_DEFAULT_ROUNDS,
+    ) -> None:
+        if scheme not in PASSWORD_HASH_SCHEMES:
+            raise ValueError(
+                'Unknown password hash scheme "{}"'.format(scheme)
+            )
+        if scheme == ARGON2_SCHEME and not argon2:
+            raise ValueError(
+                'argon2 scheme needs argon2-cffi package '
+                '(argon2 extra of tracim_backend)'
+            )
+        if scheme == BCRYPT_SCHEME and not bcrypt:
+            raise ValueError(
+                'bcrypt scheme needs bcrypt package '
+                '(bcrypt extra of tracim_backend)'
+            )
+        self.scheme = scheme
+        self.pbkdf2_iterations = pbkdf2_iterations
+        self.bcrypt_rounds = bcrypt_rounds
+        self._argon2_hasher = argon2.PasswordHasher() if argon2 else None
+
+    def hash(self, cleartext_password: str) -> str:
+        if self.scheme == ARGON2_SCHEME:
+            return self._argon2_hasher.hash(cleartext_password)
+        if self.scheme == BCRYPT_SCHEME:
+            return bcrypt.hashpw(
+                self._bcrypt_input(cleartext_password),
+                bcrypt.gensalt(self.bcrypt_rounds),
+            ).decode('ascii')
+        return self._pbkdf2_hash(cleartext_password, self.pbkdf2_iterations)
+
+    def verify(self, hashed: str, cleartext_password: str) -> bool:
+        if not hashed:
+            return False
+        if hashed.startswith(PBKDF2_PREFIX):
+            return self._pbkdf2_verify(hashed, cleartext_password)
+        if hashed.startswith(ARGON2_PREFIX):
+            if not argon2:
+                raise ValueError('argon2 hash check needs argon2-cffi package')
+            try:
+                return self._argon2_hasher.verify(hashed, cleartext_password)
+            except argon2.exceptions.VerificationError:
+                return False
+            except argon2.exceptions.InvalidHash:
+                return False
+        if hashed.startswith(BCRYPT_PREFIXES):
+            if not bcrypt:
+                raise ValueError('bcrypt hash check needs bcrypt package')
+            return bcrypt.checkpw(
+                self._bcrypt_input(cleartext_password),
+                hashed.encode('ascii'),
+            )
+        if len(hashed) == LEGACY_SHA256_HASH_SIZE:
+            return self._legacy_sha256_verify(hashed, cleartext_password)
+        return False
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """
+        Check if hash was not made with current scheme and cost.
+        """
+        if not hashed:
+            return False
+        if self.scheme == PBKDF2_SHA256_SCHEME:
+            if not hashed.startswith(PBKDF2_PREFIX):
+                return True
+            iterations = int(hashed[len(PBKDF2_PREFIX):].split('$', 1)[0])
+            return iterations < self.pbkdf2_iterations
+        if self.scheme == ARGON2_SCHEME:
+            if not hashed.startswith(ARGON2_PREFIX):
+                return True
+            return self._argon2_hasher.check_needs_rehash(hashed)
+        if not hashed.startswith(BCRYPT_PREFIXES):
+            return True
+        # bcrypt hashes are $2b$<rounds>$<salt and hash>
+        return int(hashed[4:6]) < self.bcrypt_rounds
+
+    @classmethod
+    def _pbkdf2_hash(
+        cls,
+        cleartext_password: str,
+        iterations: int,
+        salt: typing.Optional[bytes] = None,
+    ) -> str:
+        salt = salt or os.urandom(PBKDF2_SALT_SIZE)
+        derived_key = hashlib.pbkdf2_hmac(
+            'sha256',
+            cleartext_password.encode('utf-8'),
+            salt,
+            iterations,
+        )
+        return '{}{}${}${}'.format(
+            PBKDF2_PREFIX,
+            iterations,
+            _b64encode(salt),
+            _b64encode(derived_key),
+        )
+
+    @classmethod
+    def _pbkdf2_verify(cls, hashed: str, cleartext_password: str) -> bool:
+        try:
+            iterations, salt, _ = hashed[len(PBKDF2_PREFIX):].split('$')
+            new_hash = cls._pbkdf2_hash(
+                cleartext_password,
+                int(iterations),
+                _b64decode(salt),
+            )
+        except ValueError:
+            return False
+        return hmac.compare_digest(hashed, new_hash)
+
+    @classmethod
+    def _bcrypt_input(cls, cleartext_password: str) -> bytes:
+        # bcrypt only use first 72 bytes of password, so long passwords
+        # are pre-hashed.
+        digest = hashlib.sha256(cleartext_password.encode('utf-8')).digest()
+        return base64.b64encode(digest)
+
+    @classmethod
+    def _legacy_sha256_verify(
+        cls,
+        hashed: str,
+        cleartext_password: str,
+    ) -> bool:
+        new_hash = hashlib.sha256()
+        new_hash.update((cleartext_password + hashed[:64]).encode('utf-8'))
+        return hmac.compare_digest(hashed[64:], new_hash.hexdigest())
+
+
+_password_hasher = PasswordHasher()
+
+
+def get_password_hasher() -> PasswordHasher:
+    return _password_hasher
+
+
+def set_password_hasher(password_hasher: PasswordHasher) -> None:
+    """
+    Set hasher used by User model, like DepotManager, be careful this is
+    a process wide setting.
+    """
+    global _password_hasher
+    _password_hasher = password_hasher
+
+
+class VerifiedCredentialsCache(object):
+    """
+    Remember for a short time credentials whose password was successfully
+    checked, to avoid running the (slow on purpose) password hash function
+    on each request of clients sending credentials every time (http basic
+    auth, webdav).
+
+    Neither login nor password are stored: entries are keyed with a hmac,
+    made with a random per process secret, of login, password and stored
+    password hash. Changing password or rehashing it makes previous
+    entries useless. Failed checks are never cached.
+    """
+
+    def __init__(
+        self,
+        ttl: int = CREDENTIALS_CACHE_DEFAULT_TTL,
+        max_size: int = CREDENTIALS_CACHE_DEFAULT_MAX_SIZE,
+    ) -> None:
+        """
+        :param ttl: seconds an entry stays valid, 0 disables cache
+        :param max_size: max number of entries, least recently used ones
+        are dropped first
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._secret = os.urandom(32)
+        # key: expiration timestamp
+        self._entries = OrderedDict()  # type: typing.Dict[bytes, float]
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    def _get_key(self, login: str, password: str, hashed: str) -> bytes:
+        message = '\0'.join((login, password, hashed or ''))
+        return hmac.new(
+            self._secret,
+            message.encode('utf-8'),
+            hashlib.sha256,
+        ).digest()
+
+    def check(self, login: str, password: str, hashed: str) -> bool:
+        """
+        :return: True if these credentials were verified less than ttl
+        seconds ago.
+        """
+        if not self.enabled:
+            return False
+        key = self._get_key(login, password, hashed)
+        with self._lock:
+            expiration = self._entries.get(key)
+            if expiration is None:
+                return False
+            if expiration < time.monotonic():
+                del self._entries[key]
+                return False
+            self._entries.move_to_end(key)
+            return True
+
+    def add(self, login: str, password: str, hashed: str) -> None:
+        """
+        Remember credentials, only call it after a successful password check.
+        """
+        if not self.enabled:
+            return
+        key = self._get_key(login, password, hashed)
+        with self._lock:
+            self._entries[key] = time.monotonic() + self.ttl
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class AuthenticatedUserCache(object):
+    """
+    Remember for a short time which user successfully authenticated with
+    given login and password, so clients sending credentials with every
+    request (webdav) are authenticated without database query nor password
+    hash. Instance is shared by all threads of the process.
+
+    Like VerifiedCredentialsCache, entries are keyed with a hmac of
+    credentials. UserApi invalidates entries of a user when their password,
+    email, active or deleted state change. Entries of other processes
+    expire with ttl, or are ignored as soon as user version (see
+    get_user_session_version) given to get() differs from the one given to
+    add() if versions are kept in redis.
+    """
+
+    def __init__(
+        self,
+        ttl: int = CREDENTIALS_CACHE_DEFAULT_TTL,
+        max_size: int = CREDENTIALS_CACHE_DEFAULT_MAX_SIZE,
+    ) -> None:
+        """
+        :param ttl: seconds an entry stays valid, 0 disables cache
+        :param max_size: max number of entries, least recently used ones
+        are dropped first
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._secret = os.urandom(32)
+        # key: (user_id, user version, expiration timestamp)
+        self._entries = OrderedDict()  # type: typing.Dict[bytes, typing.Tuple[int, typing.Optional[int], float]]  # nopep8
+        # user_id: keys of user entries
+        self._user_keys = {}  # type: typing.Dict[int, typing.Set[bytes]]
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    def _get_key(self, login: str, password: str) -> bytes:
+        message = '\0'.join((login, password))
+        return hmac.new(
+            self._secret,
+            message.encode('utf-8'),
+            hashlib.sha256,
+        ).digest()
+
+    def get(
+        self,
+        login: str,
+        password: str,
+        get_version: typing.Callable[[int], typing.Optional[int]] = lambda user_id: None,  # nopep8
+    ) -> typing.Optional[int]:
+        """
+        :param get_version: give current version of user
+        :return: id of user authenticated with these credentials less than
+        ttl seconds ago, or None
+        """
+        if not self.enabled:
+            return None
+        key = self._get_key(login, password)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user_id, version, expiration = entry
+            if expiration < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+        # version may come from redis, don't keep lock meanwhile
+        if get_version(user_id) != version:
+            self.invalidate_user(user_id)
+            return None
+        return user_id
+
+    def add(
+        self,
+        login: str,
+        password: str,
+        user_id: int,
+        version: typing.Optional[int] = None,
+    ) -> None:
+        """
+        Remember credentials, only call it after a successful authentication.
+        :param version: version of user got before authentication
+        """
+        if not self.enabled:
+            return
+        key = self._get_key(login, password)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (user_id, version, time.monotonic() + self.ttl)  # nopep8
+            self._user_keys.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: int) -> None:
+        """
+        Forget all authentications of user.
+        """
+        with self._lock:
+            for key in self._user_keys.pop(user_id, ()):
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+
+    def _remove(self, key: bytes) -> None:
+        user_id, _, _ = self._entries.pop(key)
+        user_keys = self._user_keys[user_id]
+        user_keys.discard(key)
+        if not user_keys:
+            del self._user_keys[user_id]
+
+
+_authenticated_user_cache = AuthenticatedUserCache(ttl=0)
+
+
+def get_authenticated_user_cache() -> AuthenticatedUserCache:
+    return _authenticated_user_cache
+
+
+def set_authenticated_user_cache(cache: AuthenticatedUserCache) -> None:
+    """
+    Set process wide authenticated user cache (disabled by default).
+    """
+    global _authenticated_user_cache
+    _authenticated_user_cache = cache
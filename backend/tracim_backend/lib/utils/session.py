@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+import pickle
+import typing
+
+from beaker.container import NamespaceManager
+from beaker.synchronization import null_synchronizer
+from redis import Redis
+
+from tracim_backend.lib.utils.utils import get_redis_connection
+
+if typing.TYPE_CHECKING:
+    from beaker.session import Session
+    from tracim_backend.config import CFG
+    from tracim_backend.models.auth import User
+
+REDIS_SESSION_TYPE = 'tracim_redis'
+REDIS_SESSION_KEY_PREFIX = 'tracim:session:'
+REDIS_USER_SESSION_VERSION_KEY = 'tracim:user_session_version:{}'
+USER_SUMMARY_SESSION_KEY = 'user_summary'
+
+_redis_connection = None  # type: typing.Optional[Redis]
+
+
+class RedisSessionNamespaceManager(NamespaceManager):
+    """
+    Beaker session backend storing sessions in redis configured for rq
+    (see get_redis_connection), enabled with session.type = tracim_redis.
+    All web nodes using same redis share sessions.
+    """
+    default_timeout = None  # type: typing.Optional[int]
+
+    def __init__(
+        self,
+        namespace: str,
+        timeout: typing.Optional[int] = None,
+        **kwargs
+    ) -> None:
+        super().__init__(namespace)
+        if _redis_connection is None:
+            raise Exception(
+                'Redis session store is not configured, '
+                'call configure_redis_session_store() first'
+            )
+        self.redis_connection = _redis_connection
+        self.timeout = int(timeout) if timeout else self.default_timeout
+
+    def _get_key(self, key: str) -> str:
+        return '{}{}:{}'.format(REDIS_SESSION_KEY_PREFIX, self.namespace, key)
+
+    def get_creation_lock(self, key: str):
+        # redis commands are atomic, like in file backend last session
+        # save wins.
+        return null_synchronizer()
+
+    def __getitem__(self, key: str) -> typing.Any:
+        value = self.redis_connection.get(self._get_key(key))
+        if value is None:
+            raise KeyError(key)
+        return pickle.loads(value)
+
+    def __contains__(self, key: str) -> bool:
+        return bool(self.redis_connection.exists(self._get_key(key)))
+
+    def has_key(self, key: str) -> bool:
+        return key in self
+
+    def set_value(
+        self,
+        key: str,
+        value: typing.Any,
+        expiretime: typing.Optional[int] = None,
+    ) -> None:
+        self.redis_connection.set(
+            self._get_key(key),
+            pickle.dumps(value),
+            ex=expiretime or self.timeout,
+        )
+
+    def __setitem__(self, key: str, value: typing.Any) -> None:
+        self.set_value(key, value)
+
+    def __delitem__(self, key: str) -> None:
+        self.redis_connection.delete(self._get_key(key))
+
+    def do_remove(self) -> None:
+        keys = [self._get_key(key) for key in self.keys()]
+        if keys:
+            self.redis_connection.delete(*keys)
+
+    def keys(self) -> typing.List[str]:
+        prefix = self._get_key('')
+        return [
+            key.decode('utf-8')[len(prefix):]
+            for key in self.redis_connection.scan_iter(prefix + '*')
+        ]
+
+
+def configure_redis_user_versions(config: 'CFG') -> None:
+    """
+    Keep versions of users in redis, so cached user data (session
+    summaries, webdav authentications) invalidated by a node are seen as
+    outdated by all nodes. Like DepotManager, this is process wide.
+    """
+    global _redis_connection
+    _redis_connection = get_redis_connection(config)
+
+
+def configure_redis_session_store(config: 'CFG') -> None:
+    """
+    Set redis connection used by sessions and register tracim_redis beaker
+    session type. Like DepotManager, this is process wide.
+    """
+    from beaker.cache import clsmap
+    configure_redis_user_versions(config)
+    RedisSessionNamespaceManager.default_timeout = config.SESSION_TIMEOUT
+    clsmap[REDIS_SESSION_TYPE] = RedisSessionNamespaceManager
+
+
+def get_user_session_version(user_id: int) -> typing.Optional[int]:
+    """
+    :return: current version of user summaries, None if user versions are
+    not kept in redis
+    """
+    if _redis_connection is None:
+        return None
+    version = _redis_connection.get(REDIS_USER_SESSION_VERSION_KEY.format(user_id))  # nopep8
+    return int(version or 0)
+
+
+def invalidate_user_sessions(user_id: int) -> None:
+    """
+    Make user summary cached in all sessions of user outdated, user will be
+    loaded again from database on their next request.
+    """
+    if _redis_connection is None:
+        return
+    _redis_connection.incr(REDIS_USER_SESSION_VERSION_KEY.format(user_id))
+
+
+def get_session_user_summary(
+    session: 'Session',
+    user_id: int,
+    version: typing.Optional[int],
+) -> typing.Optional[typing.Dict[str, typing.Any]]:
+    """
+    Get user summary cached in session if still valid. Summaries are only
+    cached with redis session store, because it's where they are
+    invalidated.
+    :param version: current version from get_user_session_version()
+    :return: user summary dict or None if missing or outdated
+    """
+    if version is None:
+        return None
+    summary = session.get(USER_SUMMARY_SESSION_KEY)
+    if not summary or summary['user_id'] != user_id:
+        return None
+    if summary['version'] != version:
+        return None
+    return summary
+
+
+def set_session_user_summary(
+    session: 'Session',
+    user: 'User',
+    version: typing.Optional[int],
+) -> None:
+    """
+    Cache summary of active user in session, see get_session_user_summary.
+    :param version: version got before loading user, so an invalidation
+    made meanwhile is not missed
+    """
+    if version is None:
+        return
+    session[USER_SUMMARY_SESSION_KEY] = {
+        'user_id': user.user_id,
+        'email': user.email,
+        'profile': user.profile.name,
+        'version': version,
+    }
@@ -1,6 +1,9 @@
 # coding: utf8
 from tracim_backend.exceptions import DigestAuthNotImplemented
+from tracim_backend.exceptions import UserDoesNotExist
 from tracim_backend.lib.core.user import UserApi
+from tracim_backend.lib.utils.password import get_authenticated_user_cache
+from tracim_backend.lib.utils.session import get_user_session_version
 
 DEFAULT_TRACIM_WEBDAV_REALM = '/'
 
@@ -44,6 +47,35 @@ class TracimDomainController(object):
         If you ever feel the need to send a request al-mano with a curl, this is the function that'll be called by
         http_authenticator to validate the password sent
         """
+        # webdav clients send credentials with each request, recent successful
+        # authentications are shared between threads to avoid database query
+        # and password hash on every request.
+        authenticated_user_cache = get_authenticated_user_cache()
+        if authenticated_user_cache.get(
+            username,
+            password,
+            get_version=get_user_session_version,
+        ) is not None:
+            return True
         api = UserApi(None, environ['tracim_dbsession'], self.app_config)
-        return self.isRealmUser(realmname, username, environ) and \
-             api.get_one_by_email(username).validate_password(password)
+        try:
+            user = api.get_one_by_email(username)
+        except UserDoesNotExist:
+            return False
+        if not user.is_active:
+            return False
+        version = get_user_session_version(user.user_id)
+        hashed_password = user.password
+        if not user.validate_password(password):
+            return False
+        if user.password != hashed_password:
+            # password was rehashed with current scheme
+            environ['tracim_tm'].commit()
+        authenticated_user_cache.add(
+            username,
+            password,
+            user.user_id,
+            version=version,
+        )
+        environ['tracim_user'] = user
+        return True
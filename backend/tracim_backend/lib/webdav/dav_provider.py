@@ -15,11 +15,13 @@ from wsgidav.lock_manager import LockManager
 
 
 from tracim_backend.lib.webdav.lock_storage import LockStorage
+from tracim_backend.lib.webdav.lock_storage import RedisLockManager
 from tracim_backend.lib.core.content import ContentApi
 from tracim_backend.lib.core.content import ContentRevisionRO
 from tracim_backend.lib.core.workspace import WorkspaceApi
 from tracim_backend.lib.webdav import resources
 from tracim_backend.lib.webdav.utils import normpath
+from tracim_backend.lib.utils.utils import get_redis_connection
 from tracim_backend.models.data import Content
 from tracim_backend.models.data import Workspace
 
@@ -41,7 +43,13 @@ class Provider(DAVProvider):
         super(Provider, self).__init__()
 
         if manage_locks:
-            self.lockManager = LockManager(LockStorage())
+            if app_config.MULTI_NODE_ENABLED:
+                # locks are shared between nodes
+                self.lockManager = RedisLockManager(
+                    get_redis_connection(app_config),
+                )
+            else:
+                self.lockManager = LockManager(LockStorage())
 
         self.app_config = app_config
         self._show_archive = show_archived
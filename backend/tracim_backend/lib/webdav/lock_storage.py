@@ -1,7 +1,11 @@
+import pickle
 import time
+import typing
 
+from redis import Redis
 from tracim_backend.lib.webdav.model import Lock, Url2Token
 from wsgidav import util
+from wsgidav.lock_manager import LockManager
 from wsgidav.lock_manager import normalizeLockRoot, lockString, generateLockToken, validateLock
 from wsgidav.rw_lock import ReadWriteLock
 
@@ -272,4 +276,204 @@ class LockStorage(object):
 
             return lockList
         finally:
-            self._lock.release()
\ No newline at end of file
+            self._lock.release()
+
+class RedisLockStorage(object):
+    """
+    Lock storage shared by webdav servers of all nodes using same redis,
+    used in multi node mode. Implements same interface as wsgidav
+    LockStorageDict:
+
+    - tracim:webdav:lock:<token> : pickled lock dict, expiring with lock
+    - tracim:webdav:url2token:<path> : set of tokens of path locks
+    - tracim:webdav:lock_paths : set of paths having locks
+    """
+    LOCK_TIME_OUT_DEFAULT = LockStorage.LOCK_TIME_OUT_DEFAULT
+    LOCK_TIME_OUT_MAX = LockStorage.LOCK_TIME_OUT_MAX
+    LOCK_KEY = 'tracim:webdav:lock:{}'
+    URL2TOKEN_KEY = 'tracim:webdav:url2token:{}'
+    LOCK_PATHS_KEY = 'tracim:webdav:lock_paths'
+
+    def __init__(self, redis_connection: Redis) -> None:
+        self._redis = redis_connection
+
+    def __repr__(self):
+        return 'RedisLockStorage'
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def cleanup(self):
+        """Purge references to expired locks."""
+        for path in self._get_lock_paths():
+            self._get_path_tokens(path)
+
+    def clear(self):
+        """Delete all entries."""
+        for path in self._get_lock_paths():
+            url2token_key = self.URL2TOKEN_KEY.format(path)
+            for token in self._redis.smembers(url2token_key):
+                self._redis.delete(self.LOCK_KEY.format(token.decode('utf-8')))  # nopep8
+            self._redis.delete(url2token_key)
+        self._redis.delete(self.LOCK_PATHS_KEY)
+
+    def _save(self, lock: dict) -> None:
+        self._redis.set(
+            self.LOCK_KEY.format(lock['token']),
+            pickle.dumps(lock),
+            ex=int(lock['timeout']) + 1,
+        )
+
+    def _get_lock_paths(self) -> typing.List[str]:
+        return [
+            path.decode('utf-8')
+            for path in self._redis.smembers(self.LOCK_PATHS_KEY)
+        ]
+
+    def _get_path_tokens(self, path: str) -> typing.List[str]:
+        """
+        Get tokens of path locks, references to expired locks are purged.
+        """
+        url2token_key = self.URL2TOKEN_KEY.format(path)
+        tokens = []
+        for token in self._redis.smembers(url2token_key):
+            token = token.decode('utf-8')
+            if self._redis.exists(self.LOCK_KEY.format(token)):
+                tokens.append(token)
+            else:
+                _logger.debug("Lock purged dangling: %s" % token)
+                self._redis.srem(url2token_key, token)
+        if not tokens:
+            self._redis.srem(self.LOCK_PATHS_KEY, path)
+        return tokens
+
+    def get(self, token):
+        """Return a lock dictionary for a token.
+
+        If the lock does not exist or is expired, None is returned.
+        """
+        value = self._redis.get(self.LOCK_KEY.format(token))
+        if value is None:
+            return None
+        lock = pickle.loads(value)
+        expire = float(lock['expire'])
+        if 0 <= expire < time.time():
+            _logger.debug("Lock timed-out(%s): %s" % (expire, lockString(lock)))  # nopep8
+            self.delete(token)
+            return None
+        return lock
+
+    def create(self, path, lock):
+        """Create a direct lock for a resource path.
+
+        See LockStorage.create().
+        """
+        assert lock.get("token") is None
+        assert lock.get("expire") is None, "Use timeout instead of expire"
+        assert path and "/" in path
+
+        path = normalizeLockRoot(path)
+        lock["root"] = path
+
+        timeout = lock.get("timeout")
+        if timeout is None:
+            timeout = self.LOCK_TIME_OUT_DEFAULT
+        timeout = float(timeout)
+        if timeout < 0 or timeout > self.LOCK_TIME_OUT_MAX:
+            timeout = self.LOCK_TIME_OUT_MAX
+
+        lock["timeout"] = timeout
+        lock["expire"] = time.time() + timeout
+
+        validateLock(lock)
+
+        token = generateLockToken()
+        lock["token"] = token
+
+        self._save(lock)
+        self._redis.sadd(self.URL2TOKEN_KEY.format(path), token)
+        self._redis.sadd(self.LOCK_PATHS_KEY, path)
+        _logger.debug("RedisLockStorage.set(%r): %s" % (path, lockString(lock)))  # nopep8
+        return lock
+
+    def refresh(self, token, timeout):
+        """Modify an existing lock's timeout.
+
+        See LockStorage.refresh().
+        """
+        lock = self.get(token)
+        assert lock is not None, "Lock must exist"
+        assert timeout == -1 or timeout > 0
+        if timeout < 0 or timeout > self.LOCK_TIME_OUT_MAX:
+            timeout = self.LOCK_TIME_OUT_MAX
+        lock['timeout'] = timeout
+        lock['expire'] = time.time() + timeout
+        self._save(lock)
+        return lock
+
+    def delete(self, token):
+        """Delete lock.
+
+        Returns True on success. False, if token does not exist, or is expired.
+        """
+        value = self._redis.get(self.LOCK_KEY.format(token))
+        if value is None:
+            return False
+        lock = pickle.loads(value)
+        _logger.debug("delete %s" % lockString(lock))
+        self._redis.delete(self.LOCK_KEY.format(token))
+        self._redis.srem(self.URL2TOKEN_KEY.format(lock['root']), token)
+        return True
+
+    def getLockList(self, path, includeRoot, includeChildren, tokenOnly):
+        """Return a list of direct locks for <path>.
+
+        See LockStorage.getLockList().
+        """
+        assert path and path.startswith("/")
+        assert includeRoot or includeChildren
+
+        path = normalizeLockRoot(path)
+        paths = []
+        if includeRoot:
+            paths.append(path)
+        if includeChildren:
+            paths.extend(
+                url for url in self._get_lock_paths()
+                if url != path and util.isChildUri(path, url)
+            )
+
+        lockList = []
+        for url in paths:
+            for token in self._get_path_tokens(url):
+                lock = self.get(token)
+                if lock is None:
+                    continue
+                if tokenOnly:
+                    lockList.append(lock['token'])
+                else:
+                    lockList.append(lock)
+        return lockList
+
+
+class RedisLockManager(LockManager):
+    """
+    wsgidav lock manager checking lock conflicts under a redis lock, so
+    nodes can't create conflicting locks at the same time.
+    """
+    MANAGER_LOCK_KEY = 'tracim:webdav:lock_manager'
+    MANAGER_LOCK_TIMEOUT = 10
+
+    def __init__(self, redis_connection: Redis) -> None:
+        super().__init__(RedisLockStorage(redis_connection))
+        self._redis = redis_connection
+
+    def acquire(self, *args, **kwargs):
+        with self._redis.lock(
+            self.MANAGER_LOCK_KEY,
+            timeout=self.MANAGER_LOCK_TIMEOUT,
+        ):
+            return super().acquire(*args, **kwargs)
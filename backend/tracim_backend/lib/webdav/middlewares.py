@@ -13,6 +13,7 @@ from wsgidav.middleware import BaseMiddleware
 
 from tracim_backend import CFG
 from tracim_backend.lib.core.user import UserApi
+from tracim_backend.lib.utils.session import configure_redis_user_versions
 from tracim_backend.models import get_engine, get_session_factory, get_tm_session
 
 
@@ -264,6 +265,10 @@ class TracimEnv(BaseMiddleware):
         self.session_factory = get_session_factory(self.engine)
         self.app_config = CFG(self.settings)
         self.app_config.configure_filedepot()
+        self.app_config.configure_password_hasher()
+        self.app_config.configure_authenticated_user_cache()
+        if self.app_config.MULTI_NODE_ENABLED:
+            configure_redis_user_versions(self.app_config)
 
     def __call__(self, environ, start_response):
         # TODO - G.M - 18-05-2018 - This code should not create trouble
@@ -287,9 +292,11 @@ class TracimUserSession(BaseMiddleware):
         self._config = config
 
     def __call__(self, environ, start_response):
-        environ['tracim_user'] = UserApi(
-            None,
-            session=environ['tracim_dbsession'],
-            config=environ['tracim_cfg'],
-        ).get_one_by_email(environ['http_authenticator.username'])
+        # user may already be loaded by authentication
+        if 'tracim_user' not in environ:
+            environ['tracim_user'] = UserApi(
+                None,
+                session=environ['tracim_dbsession'],
+                config=environ['tracim_cfg'],
+            ).get_one_by_email(environ['http_authenticator.username'])
         return self._application(environ, start_response)
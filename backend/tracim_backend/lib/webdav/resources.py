@@ -15,6 +15,7 @@ from sqlalchemy.orm import Session
 from tracim_backend.config import CFG
 from tracim_backend.lib.core.content import ContentApi
 from tracim_backend.lib.core.user import UserApi
+from tracim_backend.lib.core.revision_compaction import RevisionCompactor
 from tracim_backend.lib.webdav.utils import transform_to_display, HistoryType, \
     FakeFileStream
 from tracim_backend.lib.webdav.utils import transform_to_bdd
@@ -274,7 +275,11 @@ class WorkspaceResource(DAVCollection):
             workspace=self.workspace,
             content=content,
             parent=self.content,
-            path=self.path + '/' + file_name
+            path=self.path + '/' + file_name,
+            revision_compactor=RevisionCompactor.from_config(
+                self.session,
+                self.provider.app_config,
+            ),
         )
 
     def createCollection(self, label: str) -> 'FolderResource':
@@ -1158,6 +1163,10 @@ class FileResource(DAVNonCollection):
             workspace=self.content.workspace,
             path=self.path,
             session=self.session,
+            revision_compactor=RevisionCompactor.from_config(
+                self.session,
+                self.provider.app_config,
+            ),
         )
 
     def moveRecursive(self, destpath):
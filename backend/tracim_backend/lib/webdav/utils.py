@@ -9,6 +9,7 @@ from wsgidav import util
 from wsgidav import compat
 
 from tracim_backend.lib.core.content import ContentApi
+from tracim_backend.lib.core.revision_compaction import RevisionCompactor
 from tracim_backend.models.data import Workspace
 from tracim_backend.models.data import Content
 from tracim_backend.models.data import ActionDescription
@@ -107,7 +108,8 @@ class FakeFileStream(object):
             path: str,
             file_name: str='',
             content: Content=None,
-            parent: Content=None
+            parent: Content=None,
+            revision_compactor: RevisionCompactor=None,
     ):
         """
 
@@ -117,6 +119,8 @@ class FakeFileStream(object):
         :param file_name:
         :param content:
         :param parent:
+        :param revision_compactor: coalesce new revision with previous one
+        if given and enabled
         """
         self._file_stream = compat.BytesIO()
         self._session = session
@@ -126,6 +130,7 @@ class FakeFileStream(object):
         self._workspace = workspace
         self._parent = parent
         self._path = path
+        self._revision_compactor = revision_compactor
 
     def getRefUrl(self) -> str:
         """
@@ -211,4 +216,7 @@ class FakeFileStream(object):
                 self._file_stream.read()
             )
 
-            self._api.save(self._content, ActionDescription.REVISION)
\ No newline at end of file
+            self._api.save(self._content, ActionDescription.REVISION)
+
+        if self._revision_compactor:
+            self._revision_compactor.coalesce_last_revision(self._content)
\ No newline at end of file
@@ -0,0 +1,27 @@
+"""add preview infos to content revisions
+
+Revision ID: 3b4de8a9c7d1
+Revises: f3852e1349c4
+Create Date: 2018-10-23 10:41:07.208421
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3b4de8a9c7d1'
+down_revision = 'f3852e1349c4'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('content_revisions', sa.Column('preview_available', sa.Boolean(), nullable=True))  # nopep8
+    op.add_column('content_revisions', sa.Column('preview_page_nb', sa.Integer(), nullable=True))  # nopep8
+    op.add_column('content_revisions', sa.Column('preview_pdf_available', sa.Boolean(), nullable=True))  # nopep8
+
+
+def downgrade():
+    with op.batch_alter_table('content_revisions') as batch_op:
+        batch_op.drop_column('preview_pdf_available')
+        batch_op.drop_column('preview_page_nb')
+        batch_op.drop_column('preview_available')
@@ -0,0 +1,65 @@
+"""add content tree paths closure table
+
+Revision ID: 5a8c2f1d7e94
+Revises: 3b4de8a9c7d1
+Create Date: 2018-10-29 11:12:45.320184
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5a8c2f1d7e94'
+down_revision = '3b4de8a9c7d1'
+
+from alembic import op
+import sqlalchemy as sa
+
+content_revisions = sa.table(
+    'content_revisions',
+    sa.column('revision_id', sa.Integer),
+    sa.column('content_id', sa.Integer),
+    sa.column('parent_id', sa.Integer),
+)
+
+
+def upgrade():
+    content_tree_paths = op.create_table(
+        'content_tree_paths',
+        sa.Column('ancestor_id', sa.Integer(), nullable=False),
+        sa.Column('descendant_id', sa.Integer(), nullable=False),
+        sa.Column('depth', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['ancestor_id'], ['content.id'], name=op.f('fk_content_tree_paths_ancestor_id_content'), ondelete='CASCADE'),  # nopep8
+        sa.ForeignKeyConstraint(['descendant_id'], ['content.id'], name=op.f('fk_content_tree_paths_descendant_id_content'), ondelete='CASCADE'),  # nopep8
+        sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id', name=op.f('pk_content_tree_paths')),  # nopep8
+    )
+    op.create_index('idx__content_tree_paths__descendant_id', 'content_tree_paths', ['descendant_id', 'depth'], unique=False)  # nopep8
+
+    # Parent of current revision of each content
+    last_revisions = sa.select([
+        sa.func.max(content_revisions.c.revision_id),
+    ]).group_by(content_revisions.c.content_id)
+    parents = dict(op.get_bind().execute(
+        sa.select([content_revisions.c.content_id, content_revisions.c.parent_id])  # nopep8
+        .where(content_revisions.c.revision_id.in_(last_revisions))
+    ).fetchall())
+
+    rows = []
+    for content_id in parents:
+        ancestor_id = content_id
+        depth = 0
+        visited = set()
+        while ancestor_id is not None and ancestor_id not in visited:
+            visited.add(ancestor_id)
+            rows.append({
+                'ancestor_id': ancestor_id,
+                'descendant_id': content_id,
+                'depth': depth,
+            })
+            ancestor_id = parents.get(ancestor_id)
+            depth += 1
+    if rows:
+        op.bulk_insert(content_tree_paths, rows)
+
+
+def downgrade():
+    op.drop_index('idx__content_tree_paths__descendant_id', table_name='content_tree_paths')  # nopep8
+    op.drop_table('content_tree_paths')
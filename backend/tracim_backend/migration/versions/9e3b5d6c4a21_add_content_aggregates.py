@@ -0,0 +1,176 @@
+"""add content children counts and aggregates
+
+Revision ID: 9e3b5d6c4a21
+Revises: 5a8c2f1d7e94
+Create Date: 2018-10-30 09:47:13.581032
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '9e3b5d6c4a21'
+down_revision = '5a8c2f1d7e94'
+
+from collections import defaultdict
+import json
+import logging
+
+from alembic import context
+from alembic import op
+import sqlalchemy as sa
+
+from tracim_backend.lib.storage.depot_storage import get_stored_file_info
+
+logger = logging.getLogger('alembic')
+
+content_revisions = sa.table(
+    'content_revisions',
+    sa.column('revision_id', sa.Integer),
+    sa.column('content_id', sa.Integer),
+    sa.column('parent_id', sa.Integer),
+    sa.column('type', sa.Unicode),
+    sa.column('status', sa.Unicode),
+    sa.column('is_deleted', sa.Boolean),
+    sa.column('is_archived', sa.Boolean),
+    sa.column('depot_file', sa.Unicode),
+    sa.column('file_size', sa.BigInteger),
+    sa.column('updated', sa.DateTime),
+)
+
+
+def backfill_file_sizes(contents):
+    """
+    Read from depot storage (depot_storage_dir of config file) size of
+    current revisions having a file but no file_size yet, so their size is
+    counted in parents aggregates. Found sizes are also stored on revisions.
+    :param contents: current revision rows by content_id
+    :return: file sizes by content_id
+    """
+    file_sizes = {
+        content_id: content.file_size
+        for content_id, content in contents.items()
+    }
+    missing_sizes = [
+        content for content in contents.values()
+        if content.file_size is None and content.depot_file
+    ]
+    if not missing_sizes:
+        return file_sizes
+    storage_path = context.config.get_main_option('depot_storage_dir')
+    if not storage_path:
+        logger.warning(
+            'depot_storage_dir is not set, size of files without stored size '
+            'is not counted in content aggregates'
+        )
+        return file_sizes
+
+    connection = op.get_bind()
+    # Many revisions can share the same stored file
+    stored_sizes = {}
+    for content in missing_sizes:
+        try:
+            file_id = json.loads(content.depot_file)['file_id']
+        except (ValueError, TypeError, KeyError):
+            continue
+        if file_id not in stored_sizes:
+            _, stored_sizes[file_id] = get_stored_file_info(
+                storage_path,
+                file_id,
+            )
+        size = stored_sizes[file_id]
+        if size is None:
+            continue
+        file_sizes[content.content_id] = size
+        connection.execute(
+            content_revisions.update()
+            .where(content_revisions.c.revision_id == content.revision_id)
+            .values(file_size=size)
+        )
+    return file_sizes
+
+
+def upgrade():
+    content_children_counts = op.create_table(
+        'content_children_counts',
+        sa.Column('parent_id', sa.Integer(), nullable=False),
+        sa.Column('type', sa.Unicode(length=32), nullable=False),
+        sa.Column('status', sa.Unicode(length=32), nullable=False),
+        sa.Column('children_nb', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['parent_id'], ['content.id'], name=op.f('fk_content_children_counts_parent_id_content'), ondelete='CASCADE'),  # nopep8
+        sa.PrimaryKeyConstraint('parent_id', 'type', 'status', name=op.f('pk_content_children_counts')),  # nopep8
+    )
+    content_aggregates = op.create_table(
+        'content_aggregates',
+        sa.Column('content_id', sa.Integer(), nullable=False),
+        sa.Column('subtree_size', sa.BigInteger(), nullable=False),
+        sa.Column('last_activity', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['content_id'], ['content.id'], name=op.f('fk_content_aggregates_content_id_content'), ondelete='CASCADE'),  # nopep8
+        sa.PrimaryKeyConstraint('content_id', name=op.f('pk_content_aggregates')),  # nopep8
+    )
+
+    # Current revision of each content
+    last_revisions = sa.select([
+        sa.func.max(content_revisions.c.revision_id),
+    ]).group_by(content_revisions.c.content_id)
+    contents = {
+        row.content_id: row for row in op.get_bind().execute(
+            sa.select([content_revisions])
+            .where(content_revisions.c.revision_id.in_(last_revisions))
+        )
+    }
+
+    file_sizes = {}
+    if not context.is_offline_mode():
+        file_sizes = backfill_file_sizes(contents)
+
+    def get_depth(content_id):
+        depth = 0
+        parent_id = contents[content_id].parent_id
+        while parent_id in contents and depth <= len(contents):
+            depth += 1
+            parent_id = contents[parent_id].parent_id
+        return depth
+
+    children_counts = defaultdict(int)
+    sizes = defaultdict(int)
+    activities = {}
+    # Contents are processed from bottom to top, so subtree size and
+    # activity of a content is complete when it's added to its parent.
+    for content_id in sorted(contents, key=get_depth, reverse=True):
+        content = contents[content_id]
+        if content.parent_id not in contents:
+            continue
+        is_valid = not content.is_deleted and not content.is_archived
+        content_activities = [content.updated, activities.get(content.parent_id)]  # nopep8
+        if is_valid:
+            children_counts[(content.parent_id, content.type, content.status)] += 1  # nopep8
+            sizes[content.parent_id] += (file_sizes.get(content_id) or 0) + sizes[content_id]  # nopep8
+            content_activities.append(activities.get(content_id))
+        activities[content.parent_id] = max(
+            activity for activity in content_activities if activity
+        )
+
+    if children_counts:
+        op.bulk_insert(content_children_counts, [
+            {
+                'parent_id': parent_id,
+                'type': type_,
+                'status': status,
+                'children_nb': children_nb,
+            }
+            for (parent_id, type_, status), children_nb
+            in children_counts.items()
+        ])
+    if activities:
+        op.bulk_insert(content_aggregates, [
+            {
+                'content_id': content_id,
+                'subtree_size': sizes[content_id],
+                'last_activity': activity,
+            }
+            for content_id, activity in activities.items()
+        ])
+
+
+def downgrade():
+    op.drop_table('content_aggregates')
+    op.drop_table('content_children_counts')
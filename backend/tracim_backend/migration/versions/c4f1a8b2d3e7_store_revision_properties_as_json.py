@@ -0,0 +1,40 @@
+"""store content revision properties as json
+
+Revision ID: c4f1a8b2d3e7
+Revises: 9e3b5d6c4a21
+Create Date: 2018-11-02 14:12:38.904117
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c4f1a8b2d3e7'
+down_revision = '9e3b5d6c4a21'
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+def upgrade():
+    # empty properties were stored as empty strings, which are not json
+    op.execute(
+        "UPDATE content_revisions SET properties = '{}' "
+        "WHERE properties = ''"
+    )
+    if op.get_bind().dialect.name == 'postgresql':
+        op.alter_column(
+            'content_revisions',
+            'properties',
+            type_=postgresql.JSONB(),
+            postgresql_using='properties::jsonb',
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.alter_column(
+            'content_revisions',
+            'properties',
+            type_=sa.Text(),
+            postgresql_using='properties::text',
+        )
@@ -0,0 +1,81 @@
+"""add content properties index
+
+Revision ID: d7a2e9c15b38
+Revises: c4f1a8b2d3e7
+Create Date: 2018-11-05 11:03:52.417690
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'd7a2e9c15b38'
+down_revision = 'c4f1a8b2d3e7'
+
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+# see ContentProperty
+KEY_MAX_LENGTH = 255
+VALUE_MAX_LENGTH = 255
+
+content_revisions = sa.table(
+    'content_revisions',
+    sa.column('revision_id', sa.Integer),
+    sa.column('content_id', sa.Integer),
+    sa.column('properties', sa.Text),
+)
+
+
+def upgrade():
+    content_properties = op.create_table(
+        'content_properties',
+        sa.Column('content_id', sa.Integer(), nullable=False),
+        sa.Column('key', sa.Unicode(length=KEY_MAX_LENGTH), nullable=False),
+        sa.Column('value', sa.Unicode(length=VALUE_MAX_LENGTH), nullable=False),  # nopep8
+        sa.ForeignKeyConstraint(['content_id'], ['content.id'], name=op.f('fk_content_properties_content_id_content'), ondelete='CASCADE'),  # nopep8
+        sa.PrimaryKeyConstraint('content_id', 'key', name=op.f('pk_content_properties')),  # nopep8
+    )
+    op.create_index('idx__content_properties__key__value', 'content_properties', ['key', 'value'], unique=False)  # nopep8
+
+    if op.get_bind().dialect.name == 'postgresql':
+        # JSONB properties are filtered with this index, content_properties
+        # stays empty.
+        op.execute(
+            'CREATE INDEX idx__content_revisions__properties '
+            'ON content_revisions USING gin (properties jsonb_path_ops)'
+        )
+        return
+
+    # Properties of current revision of each content
+    last_revisions = sa.select([
+        sa.func.max(content_revisions.c.revision_id),
+    ]).group_by(content_revisions.c.content_id)
+    current_properties = op.get_bind().execute(
+        sa.select([content_revisions.c.content_id, content_revisions.c.properties])  # nopep8
+        .where(content_revisions.c.revision_id.in_(last_revisions))
+    ).fetchall()
+
+    rows = []
+    for content_id, properties in current_properties:
+        for key, value in json.loads(properties or '{}').items():
+            if not isinstance(value, (str, int, float, bool)):
+                continue
+            encoded_value = json.dumps(value)
+            if len(key) > KEY_MAX_LENGTH \
+                    or len(encoded_value) > VALUE_MAX_LENGTH:
+                continue
+            rows.append({
+                'content_id': content_id,
+                'key': key,
+                'value': encoded_value,
+            })
+    if rows:
+        op.bulk_insert(content_properties, rows)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP INDEX idx__content_revisions__properties')
+    op.drop_index('idx__content_properties__key__value', table_name='content_properties')  # nopep8
+    op.drop_table('content_properties')
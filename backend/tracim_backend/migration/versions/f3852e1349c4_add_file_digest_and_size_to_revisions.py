@@ -0,0 +1,84 @@
+"""add file digest and size to content revisions
+
+Revision ID: f3852e1349c4
+Revises: 8957d4adbc77
+Create Date: 2018-10-22 14:05:31.517207
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'f3852e1349c4'
+down_revision = '8957d4adbc77'
+
+import json
+import logging
+
+from alembic import context
+from alembic import op
+import sqlalchemy as sa
+
+from tracim_backend.lib.storage.depot_storage import get_stored_file_info
+
+logger = logging.getLogger('alembic')
+
+content_revisions = sa.table(
+    'content_revisions',
+    sa.column('revision_id', sa.Integer),
+    sa.column('depot_file', sa.Unicode),
+    sa.column('file_sha256', sa.Unicode),
+    sa.column('file_size', sa.BigInteger),
+)
+
+
+def upgrade():
+    op.add_column('content_revisions', sa.Column('file_sha256', sa.Unicode(length=64), nullable=True))  # nopep8
+    op.add_column('content_revisions', sa.Column('file_size', sa.BigInteger(), nullable=True))  # nopep8
+    if not context.is_offline_mode():
+        backfill_file_digests_and_sizes()
+
+
+def backfill_file_digests_and_sizes():
+    """
+    Set digest and size of existing file revisions from depot storage
+    (depot_storage_dir of config file). Revisions whose file can't be read
+    keep NULL values: digest is then computed on next file update and size
+    read from depot when needed.
+    """
+    storage_path = context.config.get_main_option('depot_storage_dir')
+    if not storage_path:
+        logger.warning(
+            'depot_storage_dir is not set, file digests and sizes of '
+            'existing revisions are not filled'
+        )
+        return
+
+    connection = op.get_bind()
+    revisions = connection.execute(
+        sa.select([
+            content_revisions.c.revision_id,
+            content_revisions.c.depot_file,
+        ]).where(content_revisions.c.depot_file.isnot(None))
+    ).fetchall()
+    # Many revisions can share the same stored file
+    file_infos = {}
+    for revision_id, depot_file in revisions:
+        try:
+            file_id = json.loads(depot_file)['file_id']
+        except (ValueError, TypeError, KeyError):
+            continue
+        if file_id not in file_infos:
+            file_infos[file_id] = get_stored_file_info(storage_path, file_id)
+        digest, size = file_infos[file_id]
+        if digest is None and size is None:
+            continue
+        connection.execute(
+            content_revisions.update()
+            .where(content_revisions.c.revision_id == revision_id)
+            .values(file_sha256=digest, file_size=size)
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('content_revisions') as batch_op:
+        batch_op.drop_column('file_size')
+        batch_op.drop_column('file_sha256')
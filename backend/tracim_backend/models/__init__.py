@@ -1,11 +1,17 @@
 # -*- coding: utf-8 -*-
+import transaction
 from sqlalchemy import engine_from_config
 from sqlalchemy.event import listen
+from sqlalchemy.orm import Session
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm import configure_mappers
 import zope.sqlalchemy
 from .meta import DeclarativeBase
 from tracim_backend.models.revision_protection import prevent_content_revision_delete
+from tracim_backend.models.content_tree import expire_content_children
+from tracim_backend.models.content_tree import update_content_aggregates
+from tracim_backend.models.content_tree import update_content_properties
+from tracim_backend.models.content_tree import update_content_tree_paths
 # import or define all models here to ensure they are attached to the
 # Base.metadata prior to any initialization routines
 from tracim_backend.models.auth import User, Group, Permission
@@ -15,6 +21,8 @@ from tracim_backend.models.data import Content, ContentRevisionRO
 # all relationships can be setup
 configure_mappers()
 
+TRANSACTION_MANAGER_INFO_KEY = 'tracim_transaction_manager'
+
 
 def get_engine(settings, prefix='sqlalchemy.'):
     return engine_from_config(settings, prefix)
@@ -63,10 +71,32 @@ def get_tm_session(session_factory, transaction_manager):
         transaction_manager=transaction_manager,
         keep_session=True,
     )
+    dbsession.info[TRANSACTION_MANAGER_INFO_KEY] = transaction_manager
     listen(dbsession, 'before_flush', prevent_content_revision_delete)
+    listen(dbsession, 'after_flush', update_content_tree_paths)
+    # needs content tree paths of flushed revisions, listeners are run in
+    # registration order.
+    listen(dbsession, 'after_flush', update_content_aggregates)
+    listen(dbsession, 'after_flush', update_content_properties)
+    listen(dbsession, 'after_flush_postexec', expire_content_children)
     return dbsession
 
 
+def get_session_transaction_manager(
+    dbsession: Session,
+) -> transaction.TransactionManager:
+    """
+    Return transaction manager the session has been joined to by
+    get_tm_session(): request transaction manager of pyramid_tm with web
+    requests, which is not the thread local transaction.manager. After
+    commit hooks must be registered on its current transaction.
+    """
+    return dbsession.info.get(
+        TRANSACTION_MANAGER_INFO_KEY,
+        transaction.manager,
+    )
+
+
 def includeme(config):
     """
     Initialize the model for a Pyramid app.
@@ -31,6 +31,7 @@ from sqlalchemy.types import Integer
 from sqlalchemy.types import Unicode
 from tracim_backend.exceptions import ExpiredResetPasswordToken
 from tracim_backend.exceptions import UnvalidResetPasswordToken
+from tracim_backend.lib.utils.password import get_password_hasher
 
 from tracim_backend.models.meta import DeclarativeBase
 from tracim_backend.models.meta import metadata
@@ -202,10 +203,10 @@ class User(DeclarativeBase):
         """
         Set ciphertext password from cleartext password.
 
-        Hash cleartext password on the fly,
+        Hash cleartext password on the fly with configured password hasher,
         Store its ciphertext version,
         """
-        self._password = self._hash(cleartext_password)
+        self._password = get_password_hasher().hash(cleartext_password)
 
     def _get_password(self) -> str:
         """Return the hashed version of the password."""
@@ -216,7 +217,10 @@ class User(DeclarativeBase):
 
     def validate_password(self, cleartext_password: str) -> bool:
         """
-        Check the password against existing credentials.
+        Check the password against existing credentials. If password is
+        valid but its hash is outdated (legacy hash, other scheme or lower
+        cost than configured ones), password is rehashed: change has to be
+        committed by caller.
 
         :param cleartext_password: the password that was provided by the user
             to try and authenticate. This is the clear text version that we
@@ -226,7 +230,12 @@ class User(DeclarativeBase):
         :rtype: bool
 
         """
-        return self._validate_hash(self.password, cleartext_password)
+        password_hasher = get_password_hasher()
+        if not password_hasher.verify(self.password, cleartext_password):
+            return False
+        if password_hasher.needs_rehash(self.password):
+            self.password = cleartext_password
+        return True
 
     def get_display_name(self, remove_email_part: bool=False) -> str:
         """
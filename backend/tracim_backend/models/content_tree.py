@@ -0,0 +1,567 @@
+# -*- coding: utf-8 -*-
+import typing
+from collections import defaultdict
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import Table
+from sqlalchemy import and_
+from sqlalchemy import case
+from sqlalchemy import func
+from sqlalchemy import or_
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.unitofwork import UOWTransaction
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.sql.expression import Update
+
+from tracim_backend.models.data import Content
+from tracim_backend.models.data import ContentAggregate
+from tracim_backend.models.data import ContentChildrenCount
+from tracim_backend.models.data import ContentProperty
+from tracim_backend.models.data import ContentRevisionRO
+from tracim_backend.models.data import ContentTreePath
+
+# Max number of ids given to a single IN clause
+IN_CLAUSE_MAX_SIZE = 500
+CHANGED_PARENTS_INFO_KEY = 'tracim_content_tree_changed_parents'
+
+# list of (ancestor_id, depth) of a content, content itself included
+Ancestors = typing.List[typing.Tuple[int, int]]
+
+# What a content brings to aggregates of its parent
+Contribution = namedtuple('Contribution', [
+    'parent_id',
+    'type',
+    'status',
+    'is_valid',
+    'file_size',
+])
+
+
+def update_content_tree_paths(
+        session: Session,
+        flush_context: UOWTransaction,
+) -> None:
+    """
+    Keep ContentTreePath rows up to date with flushed revisions: add rows
+    of new contents and move rows of contents whose parent changed.
+    """
+    current_parents = {}  # type: typing.Dict[int, typing.Optional[int]]
+    new_revisions = _get_new_revisions(session)
+    # Last revision of a content gives its current parent
+    for revision in new_revisions:
+        current_parents[revision.content_id] = revision.parent_id
+    if not current_parents:
+        return
+
+    connection = session.connection()
+    known_parents = _get_known_parents(connection, list(current_parents))
+    new_contents = {
+        content_id: parent_id
+        for content_id, parent_id in current_parents.items()
+        if content_id not in known_parents
+    }
+    moved_contents = [
+        (content_id, parent_id)
+        for content_id, parent_id in current_parents.items()
+        if content_id in known_parents
+        and known_parents[content_id] != parent_id
+    ]
+
+    # Parents whose children changed, see expire_content_children
+    changed_parent_ids = session.info.setdefault(CHANGED_PARENTS_INFO_KEY, set())  # nopep8
+    changed_parent_ids.update(new_contents.values())
+    for content_id, parent_id in moved_contents:
+        changed_parent_ids.update((known_parents[content_id], parent_id))
+
+    if new_contents:
+        _add_contents(connection, new_contents)
+    # Moves are done after additions: new contents may be moved contents
+    # destination, and new contents added under a moved content are moved
+    # with it.
+    for content_id, parent_id in moved_contents:
+        _move_content(connection, content_id, parent_id)
+
+
+def expire_content_children(
+        session: Session,
+        flush_context: UOWTransaction,
+) -> None:
+    """
+    Expire children of contents loaded in session whose children changed in
+    flush, they will be loaded again from content tree paths.
+    """
+    for parent_id in session.info.pop(CHANGED_PARENTS_INFO_KEY, ()):
+        if parent_id is None:
+            continue
+        parent = session.identity_map.get(identity_key(Content, parent_id))
+        if parent is not None:
+            session.expire(parent, ['child_contents'])
+
+
+def update_content_aggregates(
+        session: Session,
+        flush_context: UOWTransaction,
+) -> None:
+    """
+    Keep ContentChildrenCount and ContentAggregate rows up to date with
+    flushed revisions: each changed content removes what it brought to its
+    previous parent and adds it to its current parent. Size and activity
+    changes go up through ancestors until a deleted or archived one.
+    Must be run after update_content_tree_paths.
+    """
+    new_revisions = _get_new_revisions(session)
+    if not new_revisions:
+        return
+    current_revisions = {
+        revision.content_id: revision for revision in new_revisions
+    }
+    content_ids = list(current_revisions)
+    connection = session.connection()
+    previous_contributions = _get_previous_contributions(
+        connection,
+        content_ids,
+        new_revisions[0].revision_id,
+    )
+    depths = _get_depths(connection, content_ids)
+    subtree_sizes = _get_subtree_sizes(connection, content_ids)
+    parent_ids = set(
+        contribution.parent_id for contribution
+        in previous_contributions.values()
+    )
+    parent_ids.update(
+        revision.parent_id for revision in current_revisions.values()
+    )
+    parent_ids.discard(None)
+    chains = _get_valid_chains(connection, list(parent_ids))
+
+    def walk_up(parent_id: int) -> typing.Iterator[int]:
+        for ancestor_id, is_valid in chains.get(parent_id, [(parent_id, True)]):  # nopep8
+            yield ancestor_id
+            if not is_valid:
+                return
+
+    children_counts = defaultdict(int)
+    sizes = defaultdict(int)
+    activities = {}
+    # Contents are processed from top to bottom: changes of a content
+    # subtree size made in this flush come from its descendants, they must
+    # not be included in what it removes from its previous parent.
+    for content_id in sorted(content_ids, key=lambda id_: depths.get(id_, 0)):  # nopep8
+        revision = current_revisions[content_id]
+        previous = previous_contributions.get(content_id)
+        current = Contribution(
+            parent_id=revision.parent_id,
+            type=revision.type,
+            status=revision.status,
+            is_valid=not revision.is_deleted and not revision.is_archived,
+            file_size=revision.file_size or 0,
+        )
+        if previous != current:
+            subtree_size = subtree_sizes.get(content_id, 0)
+            for contribution, sign in ((previous, -1), (current, 1)):
+                if not contribution or not contribution.is_valid \
+                        or contribution.parent_id is None:
+                    continue
+                children_counts[(
+                    contribution.parent_id,
+                    contribution.type,
+                    contribution.status,
+                )] += sign
+                for ancestor_id in walk_up(contribution.parent_id):
+                    sizes[ancestor_id] += sign * (
+                        contribution.file_size + subtree_size
+                    )
+        if current.parent_id is not None:
+            for ancestor_id in walk_up(current.parent_id):
+                activities[ancestor_id] = max(
+                    activities.get(ancestor_id, revision.updated),
+                    revision.updated,
+                )
+
+    _update_children_counts(connection, children_counts)
+    _update_aggregates(connection, sizes, activities)
+
+
+def update_content_properties(
+        session: Session,
+        flush_context: UOWTransaction,
+) -> None:
+    """
+    Keep ContentProperty rows up to date with properties of flushed current
+    revisions. Nothing to do with PostgreSQL, see ContentProperty.
+    """
+    connection = session.connection()
+    if connection.dialect.name == 'postgresql':
+        return
+    current_properties = {}  # type: typing.Dict[int, dict]
+    # Last revision of a content gives its current properties
+    for revision in _get_new_revisions(session):
+        current_properties[revision.content_id] = revision.properties or {}
+    if not current_properties:
+        return
+
+    table = ContentProperty.__table__
+    for content_ids in _chunks(list(current_properties)):
+        connection.execute(
+            table.delete().where(table.c.content_id.in_(content_ids))
+        )
+    rows = [
+        {'content_id': content_id, 'key': key, 'value': value}
+        for content_id, properties in current_properties.items()
+        for key, value in ContentProperty.get_indexed_properties(properties)
+    ]
+    if rows:
+        connection.execute(table.insert(), rows)
+
+
+def _get_new_revisions(session: Session) -> typing.List[ContentRevisionRO]:
+    return sorted(
+        (
+            instance for instance in session.new
+            if isinstance(instance, ContentRevisionRO)
+        ),
+        key=lambda revision: revision.revision_id,
+    )
+
+
+def _chunks(ids: typing.List[int]) -> typing.Iterator[typing.List[int]]:
+    for index in range(0, len(ids), IN_CLAUSE_MAX_SIZE):
+        yield ids[index:index + IN_CLAUSE_MAX_SIZE]
+
+
+def _get_known_parents(
+        connection: Connection,
+        content_ids: typing.List[int],
+) -> typing.Dict[int, typing.Optional[int]]:
+    """
+    :return: parent id (or None) of given contents already in tree
+    """
+    table = ContentTreePath.__table__
+    known_parents = {}
+    for ids in _chunks(content_ids):
+        rows = connection.execute(
+            select([table.c.descendant_id, table.c.ancestor_id, table.c.depth])
+            .where(and_(table.c.descendant_id.in_(ids), table.c.depth <= 1))
+        )
+        for descendant_id, ancestor_id, depth in rows:
+            if depth == 1:
+                known_parents[descendant_id] = ancestor_id
+            else:
+                known_parents.setdefault(descendant_id, None)
+    return known_parents
+
+
+def _get_ancestors(
+        connection: Connection,
+        content_ids: typing.List[int],
+) -> typing.Dict[int, Ancestors]:
+    table = ContentTreePath.__table__
+    ancestors = {}  # type: typing.Dict[int, Ancestors]
+    for ids in _chunks(content_ids):
+        rows = connection.execute(
+            select([table.c.descendant_id, table.c.ancestor_id, table.c.depth])
+            .where(table.c.descendant_id.in_(ids))
+        )
+        for descendant_id, ancestor_id, depth in rows:
+            ancestors.setdefault(descendant_id, []).append((ancestor_id, depth))
+    return ancestors
+
+
+def _add_contents(
+        connection: Connection,
+        new_contents: typing.Dict[int, typing.Optional[int]],
+) -> None:
+    """
+    Add tree rows of new contents, their parent may be new too.
+    :param new_contents: parent id (or None) of new contents
+    """
+    existing_parent_ids = list(set(
+        parent_id for parent_id in new_contents.values()
+        if parent_id is not None and parent_id not in new_contents
+    ))
+    ancestors = _get_ancestors(connection, existing_parent_ids)
+
+    def get_ancestors(content_id: int) -> Ancestors:
+        if content_id not in ancestors:
+            parent_id = new_contents.get(content_id)
+            # Root content, or parent missing from tree
+            if parent_id is None:
+                ancestors[content_id] = [(content_id, 0)]
+            else:
+                ancestors[content_id] = [(content_id, 0)] + [
+                    (ancestor_id, depth + 1)
+                    for ancestor_id, depth in get_ancestors(parent_id)
+                ]
+        return ancestors[content_id]
+
+    rows = []
+    for content_id in new_contents:
+        rows.extend(
+            {
+                'ancestor_id': ancestor_id,
+                'descendant_id': content_id,
+                'depth': depth,
+            }
+            for ancestor_id, depth in get_ancestors(content_id)
+        )
+    connection.execute(ContentTreePath.__table__.insert(), rows)
+
+
+def _move_content(
+        connection: Connection,
+        content_id: int,
+        parent_id: typing.Optional[int],
+) -> None:
+    """
+    Replace ancestors of content and all its descendants by ancestors of
+    its new parent.
+    """
+    table = ContentTreePath.__table__
+    subtree = list(connection.execute(
+        select([table.c.descendant_id, table.c.depth])
+        .where(table.c.ancestor_id == content_id)
+    ))
+    old_ancestor_ids = [
+        ancestor_id for ancestor_id, depth
+        in _get_ancestors(connection, [content_id]).get(content_id, [])
+        if depth > 0
+    ]
+    subtree_ids = [descendant_id for descendant_id, _ in subtree]
+    for ancestor_ids in _chunks(old_ancestor_ids):
+        for descendant_ids in _chunks(subtree_ids):
+            connection.execute(table.delete().where(and_(
+                table.c.ancestor_id.in_(ancestor_ids),
+                table.c.descendant_id.in_(descendant_ids),
+            )))
+
+    if parent_id is None or not subtree:
+        return
+    new_ancestors = _get_ancestors(connection, [parent_id]).get(
+        parent_id,
+        [(parent_id, 0)],
+    )
+    connection.execute(table.insert(), [
+        {
+            'ancestor_id': ancestor_id,
+            'descendant_id': descendant_id,
+            'depth': ancestor_depth + descendant_depth + 1,
+        }
+        for ancestor_id, ancestor_depth in new_ancestors
+        for descendant_id, descendant_depth in subtree
+    ])
+
+
+def _get_previous_contributions(
+        connection: Connection,
+        content_ids: typing.List[int],
+        first_new_revision_id: int,
+) -> typing.Dict[int, Contribution]:
+    """
+    :return: contributions of given contents before flushed revisions
+    """
+    revisions = ContentRevisionRO.__table__
+    last_revisions = revisions.alias()
+    contributions = {}
+    for ids in _chunks(content_ids):
+        rows = connection.execute(
+            select([
+                revisions.c.content_id,
+                revisions.c.parent_id,
+                revisions.c.type,
+                revisions.c.status,
+                revisions.c.is_deleted,
+                revisions.c.is_archived,
+                revisions.c.file_size,
+            ]).where(revisions.c.revision_id.in_(
+                select([func.max(last_revisions.c.revision_id)])
+                .where(and_(
+                    last_revisions.c.content_id.in_(ids),
+                    last_revisions.c.revision_id < first_new_revision_id,
+                ))
+                .group_by(last_revisions.c.content_id)
+            ))
+        )
+        for row in rows:
+            contributions[row.content_id] = Contribution(
+                parent_id=row.parent_id,
+                type=row.type,
+                status=row.status,
+                is_valid=not row.is_deleted and not row.is_archived,
+                file_size=row.file_size or 0,
+            )
+    return contributions
+
+
+def _get_depths(
+        connection: Connection,
+        content_ids: typing.List[int],
+) -> typing.Dict[int, int]:
+    table = ContentTreePath.__table__
+    depths = {}
+    for ids in _chunks(content_ids):
+        depths.update(connection.execute(
+            select([table.c.descendant_id, func.max(table.c.depth)])
+            .where(table.c.descendant_id.in_(ids))
+            .group_by(table.c.descendant_id)
+        ).fetchall())
+    return depths
+
+
+def _get_subtree_sizes(
+        connection: Connection,
+        content_ids: typing.List[int],
+) -> typing.Dict[int, int]:
+    table = ContentAggregate.__table__
+    subtree_sizes = {}
+    for ids in _chunks(content_ids):
+        subtree_sizes.update(connection.execute(
+            select([table.c.content_id, table.c.subtree_size])
+            .where(table.c.content_id.in_(ids))
+        ).fetchall())
+    return subtree_sizes
+
+
+def _get_valid_chains(
+        connection: Connection,
+        content_ids: typing.List[int],
+) -> typing.Dict[int, typing.List[typing.Tuple[int, bool]]]:
+    """
+    :return: (ancestor_id, is_valid) of given contents and their ancestors,
+    from content itself to root
+    """
+    paths = ContentTreePath.__table__
+    revisions = ContentRevisionRO.__table__
+    last_revisions = revisions.alias()
+    chains = {}
+    for ids in _chunks(content_ids):
+        rows = connection.execute(
+            select([
+                paths.c.descendant_id,
+                paths.c.ancestor_id,
+                revisions.c.is_deleted,
+                revisions.c.is_archived,
+            ])
+            .select_from(paths.join(
+                revisions,
+                revisions.c.content_id == paths.c.ancestor_id,
+            ))
+            .where(and_(
+                paths.c.descendant_id.in_(ids),
+                revisions.c.revision_id == select([
+                    func.max(last_revisions.c.revision_id),
+                ]).where(
+                    last_revisions.c.content_id == paths.c.ancestor_id,
+                ).as_scalar(),
+            ))
+            .order_by(paths.c.descendant_id, paths.c.depth)
+        )
+        for descendant_id, ancestor_id, is_deleted, is_archived in rows:
+            chains.setdefault(descendant_id, []).append(
+                (ancestor_id, not is_deleted and not is_archived),
+            )
+    return chains
+
+
+def _insert_missing_row(
+        connection: Connection,
+        table: Table,
+        values: typing.Dict[str, typing.Any],
+) -> bool:
+    """
+    Insert a row, unless a row with same primary key already exists: it may
+    have been inserted by a concurrent transaction since it was looked for.
+    :return: True if row has been inserted
+    """
+    dialect_name = connection.dialect.name
+    if dialect_name == 'postgresql':
+        statement = postgresql.insert(table).on_conflict_do_nothing()
+    elif dialect_name == 'sqlite':
+        statement = table.insert().prefix_with('OR IGNORE')
+    elif dialect_name == 'mysql':
+        statement = table.insert().prefix_with('IGNORE')
+    else:
+        statement = table.insert()
+    return bool(connection.execute(statement.values(**values)).rowcount)
+
+
+def _upsert(
+        connection: Connection,
+        table: Table,
+        update: Update,
+        insert_values: typing.Dict[str, typing.Any],
+) -> None:
+    """
+    Run update, insert row with given values if it doesn't exist yet. If a
+    concurrent transaction inserted the row meanwhile, update is run again
+    so both changes are kept.
+    """
+    if connection.execute(update).rowcount:
+        return
+    if not _insert_missing_row(connection, table, insert_values):
+        connection.execute(update)
+
+
+def _update_children_counts(
+        connection: Connection,
+        children_counts: typing.Dict[typing.Tuple[int, str, str], int],
+) -> None:
+    table = ContentChildrenCount.__table__
+    for (parent_id, type_, status), delta in children_counts.items():
+        if not delta:
+            continue
+        _upsert(
+            connection,
+            table,
+            table.update()
+            .where(and_(
+                table.c.parent_id == parent_id,
+                table.c.type == type_,
+                table.c.status == status,
+            ))
+            .values(children_nb=table.c.children_nb + delta),
+            {
+                'parent_id': parent_id,
+                'type': type_,
+                'status': status,
+                'children_nb': delta,
+            },
+        )
+
+
+def _update_aggregates(
+        connection: Connection,
+        sizes: typing.Dict[int, int],
+        activities: typing.Dict[int, datetime],
+) -> None:
+    table = ContentAggregate.__table__
+    for content_id in set(sizes) | set(activities):
+        size = sizes.get(content_id, 0)
+        activity = activities.get(content_id)
+        values = {'subtree_size': table.c.subtree_size + size}
+        if activity:
+            values['last_activity'] = case(
+                [(
+                    or_(
+                        table.c.last_activity == None,
+                        table.c.last_activity < activity,
+                    ),
+                    activity,
+                )],
+                else_=table.c.last_activity,
+            )
+        _upsert(
+            connection,
+            table,
+            table.update()
+            .where(table.c.content_id == content_id)
+            .values(**values),
+            {
+                'content_id': content_id,
+                'subtree_size': size,
+                'last_activity': activity,
+            },
+        )
@@ -17,6 +17,8 @@ from tracim_backend.models import User
 from tracim_backend.models.auth import Profile
 from tracim_backend.models.auth import Group
 from tracim_backend.models.data import Content
+from tracim_backend.models.data import ContentAggregate
+from tracim_backend.models.data import ContentChildrenCount
 from tracim_backend.models.data import ContentRevisionRO
 from tracim_backend.models.data import Workspace
 from tracim_backend.models.data import UserRoleInWorkspace
@@ -329,6 +331,28 @@ class ActiveContentFilter(object):
         self.before_content_id = before_content_id
 
 
+class RevisionsFilter(object):
+    def __init__(
+            self,
+            limit: int = 0,
+            after_revision_id: int = 0,
+            preview_infos: int = 0,
+    ):
+        self.limit = limit
+        self.after_revision_id = after_revision_id
+        self.preview_infos = preview_infos
+
+
+class CommentsFilter(object):
+    def __init__(
+            self,
+            limit: int = 0,
+            offset: int = 0,
+    ):
+        self.limit = limit
+        self.offset = offset
+
+
 class ContentIdsQuery(object):
     def __init__(
             self,
@@ -804,6 +828,49 @@ class ContentInContext(object):
         )
         return root_frontend_url + content_frontend_url
 
+    # folder specific
+    @property
+    def children_counts(self) -> typing.List[typing.Tuple[str, str, int]]:
+        """
+        :return: (type, status, children_nb) of valid children
+        """
+        return self.dbsession.query(
+            ContentChildrenCount.type,
+            ContentChildrenCount.status,
+            ContentChildrenCount.children_nb,
+        ).filter(
+            ContentChildrenCount.parent_id == self.content_id,
+            ContentChildrenCount.children_nb > 0,
+        ).all()
+
+    @property
+    def children_nb(self) -> int:
+        return sum(
+            children_count.children_nb
+            for children_count in self.children_counts
+        )
+
+    def _get_aggregate(self) -> typing.Tuple[int, typing.Optional[datetime]]:
+        # Aggregates are updated without orm: columns are queried to not get
+        # an outdated ContentAggregate from identity map.
+        aggregate = self.dbsession.query(
+            ContentAggregate.subtree_size,
+            ContentAggregate.last_activity,
+        ).filter(ContentAggregate.content_id == self.content_id).first()
+        return aggregate or (0, None)
+
+    @property
+    def sub_contents_size(self) -> int:
+        subtree_size, _ = self._get_aggregate()
+        return subtree_size
+
+    @property
+    def last_activity(self) -> datetime:
+        _, last_activity = self._get_aggregate()
+        if not last_activity:
+            return self.updated
+        return max(self.updated, last_activity)
+
     # file specific
     @property
     def page_nb(self) -> typing.Optional[int]:
@@ -811,13 +878,16 @@ class ContentInContext(object):
         :return: page_nb of content if available, None if unavailable
         """
         if self.content.depot_file:
-            from tracim_backend.lib.core.content import ContentApi
-            content_api = ContentApi(
-                current_user=self._user,
-                session=self.dbsession,
-                config=self.config
-            )
-            return content_api.get_preview_page_nb(self.content.revision_id)
+            revision = self.content.revision
+            if revision.preview_available is None:
+                from tracim_backend.lib.core.content import ContentApi
+                content_api = ContentApi(
+                    current_user=self._user,
+                    session=self.dbsession,
+                    config=self.config
+                )
+                content_api.fill_revision_preview_infos(revision)
+            return revision.preview_page_nb
         else:
             return None
 
@@ -833,6 +903,8 @@ class ContentInContext(object):
         """
         :return: size of content if available, None if unavailable
         """
+        if self.content.file_size is not None:
+            return self.content.file_size
         if self.content.depot_file:
             return self.content.depot_file.file.content_length
         else:
@@ -844,13 +916,16 @@ class ContentInContext(object):
         :return: bool about if pdf version of content is available
         """
         if self.content.depot_file:
-            from tracim_backend.lib.core.content import ContentApi
-            content_api = ContentApi(
-                current_user=self._user,
-                session=self.dbsession,
-                config=self.config
-            )
-            return content_api.has_pdf_preview(self.content.revision_id)
+            revision = self.content.revision
+            if revision.preview_available is None:
+                from tracim_backend.lib.core.content import ContentApi
+                content_api = ContentApi(
+                    current_user=self._user,
+                    session=self.dbsession,
+                    config=self.config
+                )
+                content_api.fill_revision_preview_infos(revision)
+            return bool(revision.preview_pdf_available)
         else:
             return False
 
@@ -860,12 +935,28 @@ class RevisionInContext(object):
     Interface to get Content data and Content data related to context.
     """
 
-    def __init__(self, content_revision: ContentRevisionRO, dbsession: Session, config: CFG,  user: User=None) -> None:  # nopep8
+    def __init__(
+            self,
+            content_revision: ContentRevisionRO,
+            dbsession: Session,
+            config: CFG,
+            user: User=None,
+            comment_ids: typing.Optional[typing.List[int]]=None,
+            compute_preview_infos: bool=True,
+    ) -> None:
+        """
+        :param comment_ids: comment ids of revision if already computed, see
+        ContentApi.get_revisions_in_context()
+        :param compute_preview_infos: if False, page_nb and pdf_available are
+        only given when already known, previews are not computed.
+        """
         assert content_revision is not None
         self.revision = content_revision
         self.dbsession = dbsession
         self.config = config
         self._user = user
+        self._comment_ids = comment_ids
+        self._compute_preview_infos = compute_preview_infos
 
     # Default
     @property
@@ -971,6 +1062,8 @@ class RevisionInContext(object):
         Get list of ids of all current revision related comments
         :return: list of comments ids
         """
+        if self._comment_ids is not None:
+            return self._comment_ids
         comments = self.revision.node.get_comments()
         # INFO - G.M - 2018-06-177 - Get comments more recent than revision.
         revision_comments = [
@@ -985,14 +1078,8 @@ class RevisionInContext(object):
                 comment for comment in revision_comments
                 if comment.created < self.next_revision.updated
             ]
-        sorted_revision_comments = sorted(
-            revision_comments,
-            key=lambda revision: revision.created
-        )
-        comment_ids = []
-        for comment in sorted_revision_comments:
-            comment_ids.append(comment.content_id)
-        return comment_ids
+        # comments are already sorted by creation date
+        return [comment.content_id for comment in revision_comments]
 
     # Context-related
     @property
@@ -1012,17 +1099,22 @@ class RevisionInContext(object):
     @property
     def page_nb(self) -> typing.Optional[int]:
         """
-        :return: page_nb of content if available, None if unavailable
+        :return: page_nb of content if available, None if unavailable or
+        not computed yet and not asked to compute it
         """
         if self.revision.depot_file:
-            # TODO - G.M - 2018-09-05 - Fix circular import better
-            from tracim_backend.lib.core.content import ContentApi
-            content_api = ContentApi(
-                current_user=self._user,
-                session=self.dbsession,
-                config=self.config
-            )
-            return content_api.get_preview_page_nb(self.revision.revision_id)
+            if self.revision.preview_available is None:
+                if not self._compute_preview_infos:
+                    return None
+                # TODO - G.M - 2018-09-05 - Fix circular import better
+                from tracim_backend.lib.core.content import ContentApi
+                content_api = ContentApi(
+                    current_user=self._user,
+                    session=self.dbsession,
+                    config=self.config
+                )
+                content_api.fill_revision_preview_infos(self.revision)
+            return self.revision.preview_page_nb
         else:
             return None
 
@@ -1038,23 +1130,30 @@ class RevisionInContext(object):
         """
         :return: size of content if available, None if unavailable
         """
+        if self.revision.file_size is not None:
+            return self.revision.file_size
         if self.revision.depot_file:
             return self.revision.depot_file.file.content_length
         else:
             return None
 
     @property
-    def pdf_available(self) -> bool:
+    def pdf_available(self) -> typing.Optional[bool]:
         """
-        :return: bool about if pdf version of content is available
+        :return: bool about if pdf version of content is available, None if
+        not computed yet and not asked to compute it
         """
         if self.revision.depot_file:
-            from tracim_backend.lib.core.content import ContentApi
-            content_api = ContentApi(
-                current_user=self._user,
-                session=self.dbsession,
-                config=self.config
-            )
-            return content_api.has_pdf_preview(self.revision.revision_id)
+            if self.revision.preview_available is None:
+                if not self._compute_preview_infos:
+                    return None
+                from tracim_backend.lib.core.content import ContentApi
+                content_api = ContentApi(
+                    current_user=self._user,
+                    session=self.dbsession,
+                    config=self.config
+                )
+                content_api.fill_revision_preview_infos(self.revision)
+            return bool(self.revision.preview_pdf_available)
         else:
             return False
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import typing
+import copy
 import datetime as datetime_root
 import json
 import os
@@ -8,18 +9,30 @@ from datetime import datetime
 from babel.dates import format_timedelta
 from bs4 import BeautifulSoup
 from sqlalchemy import Column, inspect, Index
+from sqlalchemy import DDL
 from sqlalchemy import ForeignKey
 from sqlalchemy import Sequence
+from sqlalchemy import and_
+from sqlalchemy import event
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine.interfaces import Dialect
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import Query
+from sqlalchemy.orm import Session
 from sqlalchemy.orm import backref
 from sqlalchemy.orm import relationship
+from sqlalchemy.orm import selectinload
 from sqlalchemy.orm.attributes import InstrumentedAttribute
 from sqlalchemy.orm.collections import attribute_mapped_collection
+from sqlalchemy.types import BigInteger
 from sqlalchemy.types import Boolean
 from sqlalchemy.types import DateTime
 from sqlalchemy.types import Integer
 from sqlalchemy.types import Text
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.types import TypeEngine
 from sqlalchemy.types import Unicode
 from depot.fields.sqlalchemy import UploadedFileField
 from depot.fields.upload import UploadedFile
@@ -558,6 +571,41 @@ class ContentChecker(object):
             return True
 
 
+class JSONDict(TypeDecorator):
+    """
+    Dict stored as JSON: in a native JSONB column with PostgreSQL, as text
+    with other databases. It's decoded once when row is loaded; as values
+    are not tracked for in place changes, assign a new dict to modify it.
+    """
+    impl = Text
+
+    def load_dialect_impl(self, dialect: Dialect) -> TypeEngine:
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(JSONB())
+        return dialect.type_descriptor(Text())
+
+    def process_bind_param(
+            self,
+            value: typing.Optional[dict],
+            dialect: Dialect,
+    ) -> typing.Optional[typing.Union[dict, str]]:
+        if value is None:
+            value = {}
+        if dialect.name == 'postgresql':
+            return value
+        return json.dumps(value)
+
+    def process_result_value(
+            self,
+            value: typing.Optional[typing.Union[dict, str]],
+            dialect: Dialect,
+    ) -> dict:
+        if dialect.name == 'postgresql':
+            return value or {}
+        # properties of old revisions may be empty strings
+        return json.loads(value) if value else {}
+
+
 class ContentRevisionRO(DeclarativeBase):
     """
     Revision of Content. It's immutable, update or delete an existing ContentRevisionRO will throw
@@ -584,7 +632,18 @@ class ContentRevisionRO(DeclarativeBase):
     # http://depot.readthedocs.io/en/latest/#attaching-files-to-models
     # http://depot.readthedocs.io/en/latest/api.html#module-depot.fields
     depot_file = Column(UploadedFileField, unique=False, nullable=True)
-    properties = Column('properties', Text(), unique=False, nullable=False, default='')
+    # sha256 digest and size of depot_file, computed when file is uploaded.
+    # They are NULL for revisions created before they were introduced.
+    file_sha256 = Column(Unicode(64), unique=False, nullable=True, default=None)
+    file_size = Column(BigInteger, unique=False, nullable=True, default=None)
+    # Preview informations of depot_file, computed once by ContentApi.
+    # preview_available is NULL if not computed yet, False if file mimetype
+    # is not supported by preview generator. These columns are not cloned
+    # columns: they can be filled after revision creation.
+    preview_available = Column(Boolean, unique=False, nullable=True, default=None)  # nopep8
+    preview_page_nb = Column(Integer, unique=False, nullable=True, default=None)  # nopep8
+    preview_pdf_available = Column(Boolean, unique=False, nullable=True, default=None)  # nopep8
+    properties = Column('properties', JSONDict(), unique=False, nullable=False, default=dict)  # nopep8
 
     type = Column(Unicode(32), unique=False, nullable=False)
     status = Column(Unicode(32), unique=False, nullable=False, default=str(CONTENT_STATUS.get_default_status().slug))
@@ -612,6 +671,8 @@ class ContentRevisionRO(DeclarativeBase):
         'description',
         'file_mimetype',
         'file_extension',
+        'file_sha256',
+        'file_size',
         'is_archived',
         'is_deleted',
         'label',
@@ -646,6 +707,15 @@ class ContentRevisionRO(DeclarativeBase):
             self.file_extension,
         )
 
+    def copy_preview_infos(self, revision: 'ContentRevisionRO') -> None:
+        """
+        Copy preview informations of given revision, both revisions must
+        have the same file content.
+        """
+        self.preview_available = revision.preview_available
+        self.preview_page_nb = revision.preview_page_nb
+        self.preview_pdf_available = revision.preview_pdf_available
+
     @classmethod
     def new_from(cls, revision: 'ContentRevisionRO') -> 'ContentRevisionRO':
         """
@@ -666,11 +736,15 @@ class ContentRevisionRO(DeclarativeBase):
 
         new_rev.updated = datetime.utcnow()
         if revision.depot_file:
+            # Stored file is given instead of its content: deduplicated
+            # storage only references its blob, other storages copy it by
+            # chunks.
             new_rev.depot_file = FileIntent(
-                revision.depot_file.file.read(),
+                revision.depot_file.file,
                 revision.file_name,
                 revision.file_mimetype,
             )
+            new_rev.copy_preview_infos(revision)
 
         return new_rev
 
@@ -697,10 +771,11 @@ class ContentRevisionRO(DeclarativeBase):
         # copy attached_file
         if revision.depot_file:
             copy_rev.depot_file = FileIntent(
-                revision.depot_file.file.read(),
+                revision.depot_file.file,
                 revision.file_name,
                 revision.file_mimetype,
             )
+            copy_rev.copy_preview_infos(revision)
         return copy_rev
 
     def __setattr__(self, key: str, value: 'mixed'):
@@ -814,6 +889,19 @@ class Content(DeclarativeBase):
     children_revisions = relationship("ContentRevisionRO",
                                       foreign_keys=[ContentRevisionRO.parent_id],
                                       back_populates="parent")
+    # Children according to current revisions, from content tree paths.
+    # It can be eager loaded (see also ContentApi.load_children), it's
+    # expired when children are added or moved, see
+    # tracim_backend.models.content_tree.
+    child_contents = relationship(
+        "Content",
+        secondary='content_tree_paths',
+        primaryjoin='and_(Content.id == ContentTreePath.ancestor_id, '
+                    'ContentTreePath.depth == 1)',
+        secondaryjoin='Content.id == ContentTreePath.descendant_id',
+        order_by='Content.id',
+        viewonly=True,
+    )
 
     @hybrid_property
     def content_id(self) -> int:
@@ -919,11 +1007,35 @@ class Content(DeclarativeBase):
         return ContentRevisionRO.file_mimetype
 
     @hybrid_property
-    def _properties(self) -> str:
+    def file_sha256(self) -> str:
+        return self.revision.file_sha256
+
+    @file_sha256.setter
+    def file_sha256(self, value: str) -> None:
+        self.revision.file_sha256 = value
+
+    @file_sha256.expression
+    def file_sha256(cls) -> InstrumentedAttribute:
+        return ContentRevisionRO.file_sha256
+
+    @hybrid_property
+    def file_size(self) -> int:
+        return self.revision.file_size
+
+    @file_size.setter
+    def file_size(self, value: int) -> None:
+        self.revision.file_size = value
+
+    @file_size.expression
+    def file_size(cls) -> InstrumentedAttribute:
+        return ContentRevisionRO.file_size
+
+    @hybrid_property
+    def _properties(self) -> dict:
         return self.revision.properties
 
     @_properties.setter
-    def _properties(self, value: str) -> None:
+    def _properties(self, value: dict) -> None:
         self.revision.properties = value
 
     @_properties.expression
@@ -1106,8 +1218,7 @@ class Content(DeclarativeBase):
         :return: list of children Content
         :rtype Content
         """
-        # Return a list of unique revisions parent content
-        return list(set([revision.node for revision in self.children_revisions]))
+        return list(self.child_contents)
 
     @property
     def revision(self) -> ContentRevisionRO:
@@ -1172,21 +1283,20 @@ class Content(DeclarativeBase):
 
     @hybrid_property
     def properties(self) -> dict:
-        """ return a structure decoded from json content of _properties """
-
-        if not self._properties:
-            properties = {}
-        else:
-            properties = json.loads(self._properties)
-        if CONTENT_TYPES.get_one_by_slug(self.type) != CONTENT_TYPES.Event:
+        """
+        Return a copy of properties of current revision (decoded once per
+        revision), with default allowed content if not set.
+        """
+        properties = copy.deepcopy(self._properties or {})
+        if self.type != CONTENT_TYPES.Event.slug:
             if not 'allowed_content' in properties:
                 properties['allowed_content'] = CONTENT_TYPES.default_allowed_content_properties(self.type)  # nopep8
         return properties
 
     @properties.setter
     def properties(self, properties_struct: dict) -> None:
-        """ encode a given structure into json and store it in _properties attribute"""
-        self._properties = json.dumps(properties_struct)
+        """ store a copy of given structure in _properties attribute"""
+        self._properties = copy.deepcopy(properties_struct)
         ContentChecker.check_properties(self)
 
     def created_as_delta(self, delta_from_datetime:datetime=None):
@@ -1204,14 +1314,18 @@ class Content(DeclarativeBase):
                                 locale=get_locale())
 
     def get_child_nb(self, content_type: str, content_status = ''):
-        child_nb = 0
-        for child in self.get_valid_children():
-            if child.type == content_type or content_type.slug == CONTENT_TYPES.Any_SLUG:
-                if not content_status:
-                    child_nb = child_nb+1
-                elif content_status==child.status:
-                    child_nb = child_nb+1
-        return child_nb
+        """
+        Count valid children of given type (or any type) and status, from
+        children counters of content.
+        """
+        query = inspect(self).session.query(
+            func.coalesce(func.sum(ContentChildrenCount.children_nb), 0)
+        ).filter(ContentChildrenCount.parent_id == self.id)
+        if content_type != CONTENT_TYPES.Any_SLUG:
+            query = query.filter(ContentChildrenCount.type == content_type)
+        if content_status:
+            query = query.filter(ContentChildrenCount.status == content_status)
+        return query.scalar()
 
     def get_label(self):
         return self.label or self.file_name or ''
@@ -1278,12 +1392,43 @@ class Content(DeclarativeBase):
 
         return False
 
-    def get_comments(self):
-        children = []
-        for child in self.children:
-            if CONTENT_TYPES.Comment.slug == child.type and not child.is_deleted and not child.is_archived:
-                children.append(child.node)
-        return children
+    @classmethod
+    def get_comments_query(
+        cls,
+        session: Session,
+        parent_ids: typing.List[int],
+    ) -> Query:
+        """
+        Query valid comments (from their current revision) of given contents,
+        oldest first. Revisions of comments are loaded with them.
+        """
+        current_revision_id = session.query(
+            func.max(ContentRevisionRO.revision_id)
+        ).filter(ContentRevisionRO.content_id == cls.id)\
+            .correlate(cls)\
+            .as_scalar()
+        return session.query(cls)\
+            .join(ContentRevisionRO, and_(
+                ContentRevisionRO.content_id == cls.id,
+                ContentRevisionRO.revision_id == current_revision_id,
+            ))\
+            .filter(
+                ContentRevisionRO.parent_id.in_(parent_ids),
+                ContentRevisionRO.type == CONTENT_TYPES.Comment.slug,
+                ContentRevisionRO.is_deleted == False,
+                ContentRevisionRO.is_archived == False,
+            )\
+            .order_by(ContentRevisionRO.created, cls.id)\
+            .options(selectinload(cls.revisions))
+
+    def get_comments(self) -> typing.List['Content']:
+        """
+        :return: valid comments of content, oldest first
+        """
+        session = inspect(self).session
+        if session is None or self.id is None:
+            return []
+        return self.get_comments_query(session, [self.id]).all()
 
     def get_last_comment_from(self, user: User) -> 'Content':
         # TODO - Make this more efficient
@@ -1374,6 +1519,126 @@ class Content(DeclarativeBase):
         return cpy_content
 
 
+class ContentTreePath(DeclarativeBase):
+    """
+    Closure table of contents tree: one row for each content and each of its
+    ancestors, content itself included with depth 0. It allows to get all
+    descendants or ancestors of a content with a single query.
+
+    Rows follow parent of current revision of contents, they are updated
+    when revisions are flushed, see
+    tracim_backend.models.content_tree.update_content_tree_paths.
+    """
+
+    __tablename__ = 'content_tree_paths'
+
+    ancestor_id = Column(Integer, ForeignKey('content.id', ondelete='CASCADE'), primary_key=True)  # nopep8
+    descendant_id = Column(Integer, ForeignKey('content.id', ondelete='CASCADE'), primary_key=True)  # nopep8
+    depth = Column(Integer, unique=False, nullable=False)
+
+Index(
+    'idx__content_tree_paths__descendant_id',
+    ContentTreePath.descendant_id,
+    ContentTreePath.depth,
+)
+
+
+class ContentChildrenCount(DeclarativeBase):
+    """
+    Number of valid (not deleted nor archived) direct children of a content
+    by type and status. Updated when revisions are flushed, see
+    tracim_backend.models.content_tree.update_content_aggregates.
+    """
+
+    __tablename__ = 'content_children_counts'
+
+    parent_id = Column(Integer, ForeignKey('content.id', ondelete='CASCADE'), primary_key=True)  # nopep8
+    type = Column(Unicode(32), primary_key=True)
+    status = Column(Unicode(32), primary_key=True)
+    children_nb = Column(Integer, unique=False, nullable=False, default=0)
+
+
+class ContentAggregate(DeclarativeBase):
+    """
+    Aggregates of valid descendants of a content: size of their files and
+    date of their last revision. Descendants under a deleted or archived
+    content are not included. Updated when revisions are flushed, see
+    tracim_backend.models.content_tree.update_content_aggregates.
+    """
+
+    __tablename__ = 'content_aggregates'
+
+    content_id = Column(Integer, ForeignKey('content.id', ondelete='CASCADE'), primary_key=True)  # nopep8
+    subtree_size = Column(BigInteger, unique=False, nullable=False, default=0)
+    last_activity = Column(DateTime, unique=False, nullable=True)
+
+
+class ContentProperty(DeclarativeBase):
+    """
+    Indexable top level properties of current revision of contents, with
+    JSON encoded values, to filter contents by properties (see
+    ContentApi.get_all_by_properties) without JSON support in database.
+    Updated when revisions are flushed, see
+    tracim_backend.models.content_tree.update_content_properties.
+
+    With PostgreSQL, rows are not maintained: filters use a GIN index on
+    JSONB properties of revisions.
+    """
+
+    __tablename__ = 'content_properties'
+
+    KEY_MAX_LENGTH = 255
+    VALUE_MAX_LENGTH = 255
+
+    content_id = Column(Integer, ForeignKey('content.id', ondelete='CASCADE'), primary_key=True)  # nopep8
+    key = Column(Unicode(KEY_MAX_LENGTH), primary_key=True)
+    value = Column(Unicode(VALUE_MAX_LENGTH), unique=False, nullable=False)
+
+    @classmethod
+    def encode_value(cls, value: typing.Any) -> typing.Optional[str]:
+        """
+        :return: JSON encoded value, None if value can't be indexed: only
+        strings, numbers and booleans shorter than VALUE_MAX_LENGTH once
+        encoded are.
+        """
+        if not isinstance(value, (str, int, float, bool)):
+            return None
+        encoded_value = json.dumps(value)
+        if len(encoded_value) > cls.VALUE_MAX_LENGTH:
+            return None
+        return encoded_value
+
+    @classmethod
+    def get_indexed_properties(
+        cls,
+        properties: dict,
+    ) -> typing.List[typing.Tuple[str, str]]:
+        """
+        :return: (key, encoded value) of indexable properties
+        """
+        indexed_properties = []
+        for key, value in properties.items():
+            encoded_value = cls.encode_value(value)
+            if encoded_value is not None and len(key) <= cls.KEY_MAX_LENGTH:
+                indexed_properties.append((key, encoded_value))
+        return indexed_properties
+
+Index(
+    'idx__content_properties__key__value',
+    ContentProperty.key,
+    ContentProperty.value,
+)
+# JSONB containment index used by property filters with PostgreSQL
+event.listen(
+    ContentRevisionRO.__table__,
+    'after_create',
+    DDL(
+        'CREATE INDEX idx__content_revisions__properties '
+        'ON content_revisions USING gin (properties jsonb_path_ops)'
+    ).execute_if(dialect='postgresql'),
+)
+
+
 class RevisionReadStatus(DeclarativeBase):
 
     __tablename__ = 'revision_read_status'
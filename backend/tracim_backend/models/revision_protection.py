@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+import typing
+
 from sqlalchemy.orm import Session
 from sqlalchemy import inspect
 from sqlalchemy.orm.unitofwork import UOWTransaction
@@ -33,33 +35,68 @@ def prevent_content_revision_delete(
 
 class RevisionsIntegrity(object):
     """
-    Simple static used class to manage a list with list of ContentRevisionRO
-    who are allowed to be updated.
+    Manage ContentRevisionRO who are allowed to be updated.
 
     When modify an already existing (understood have an identity in databse)
-    ContentRevisionRO, if it's not in RevisionsIntegrity._updatable_revisions
-    list, a ContentRevisionUpdateError thrown.
+    ContentRevisionRO, if it's not registered as updatable in its session,
+    a ContentRevisionUpdateError thrown.
+
+    Updatable revisions are kept in a set stored in session info: each
+    session (so each thread/request) have its own registry and membership
+    check doesn't depend on the number of revisions being updated.
 
     This class is used by tracim.model.new_revision context manager.
     """
-    _updatable_revisions = []
+    SESSION_INFO_KEY = 'tracim_updatable_revisions'
+
+    @classmethod
+    def _get_updatable_revisions(
+            cls,
+            session: typing.Optional[Session],
+            create: bool=False,
+    ) -> typing.Optional[typing.Set['ContentRevisionRO']]:
+        if session is None:
+            return None
+        if create:
+            return session.info.setdefault(cls.SESSION_INFO_KEY, set())
+        return session.info.get(cls.SESSION_INFO_KEY)
 
     @classmethod
-    def add_to_updatable(cls, revision: 'ContentRevisionRO') -> None:
+    def add_to_updatable(
+            cls,
+            revision: 'ContentRevisionRO',
+            session: Session=None,
+    ) -> None:
+        """
+        :param session: session where revision will be updated, default to
+        session of revision
+        """
         if inspect(revision).has_identity:
             raise ContentRevisionUpdateError("ContentRevision is not updatable. %s already have identity." % revision)  # nopep8
 
-        if revision not in cls._updatable_revisions:
-            cls._updatable_revisions.append(revision)
+        session = session or inspect(revision).session
+        if session is None:
+            raise ContentRevisionUpdateError("ContentRevision is not updatable. %s is not attached to a session." % revision)  # nopep8
+        cls._get_updatable_revisions(session, create=True).add(revision)
 
     @classmethod
-    def remove_from_updatable(cls, revision: 'ContentRevisionRO') -> None:
-        if revision in cls._updatable_revisions:
-            cls._updatable_revisions.remove(revision)
+    def remove_from_updatable(
+            cls,
+            revision: 'ContentRevisionRO',
+            session: Session=None,
+    ) -> None:
+        updatable_revisions = cls._get_updatable_revisions(
+            session or inspect(revision).session,
+        )
+        if updatable_revisions:
+            updatable_revisions.discard(revision)
 
     @classmethod
     def is_updatable(cls, revision: 'ContentRevisionRO') -> bool:
-        return revision in cls._updatable_revisions
+        updatable_revisions = cls._get_updatable_revisions(
+            inspect(revision).session,
+        )
+        return bool(updatable_revisions) and revision in updatable_revisions
 
 
 @contextmanager
@@ -79,12 +116,14 @@ def new_revision(
     be forced.
     :return:
     """
+    revision = None
     with session.no_autoflush:
         try:
             if force_create_new_revision \
                     or inspect(content.revision).has_identity:
                 content.new_revision()
-            RevisionsIntegrity.add_to_updatable(content.revision)
+            revision = content.revision
+            RevisionsIntegrity.add_to_updatable(revision, session)
             yield content
         except SameValueError or ValueError as e:
             # INFO - 20-03-2018 - renew transaction when error happened
@@ -94,4 +133,5 @@ def new_revision(
             tm.begin()
             raise e
         finally:
-            RevisionsIntegrity.remove_from_updatable(content.revision)
+            if revision is not None:
+                RevisionsIntegrity.remove_from_updatable(revision, session)
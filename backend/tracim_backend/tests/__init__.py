@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import fnmatch
 import logging
 import unittest
 
@@ -66,6 +67,54 @@ def create_1000px_png_test_image():
     return file
 
 
+class FakeRedis(object):
+    """
+    In memory implementation of the few redis commands used by tracim
+    sessions and multi node mode.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.expirations = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value if isinstance(value, bytes) else str(value).encode()  # nopep8
+        self.expirations[key] = ex
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def incr(self, key):
+        self.set(key, int(self.data.get(key, 0)) + 1)
+
+    def scan_iter(self, pattern):
+        return [
+            key.encode() for key in list(self.data)
+            if fnmatch.fnmatchcase(key, pattern)
+        ]
+
+    def sadd(self, key, *values):
+        self.data.setdefault(key, set()).update(
+            value.encode() for value in values
+        )
+
+    def srem(self, key, *values):
+        members = self.data.get(key, set())
+        members.difference_update(value.encode() for value in values)
+        if not members:
+            self.data.pop(key, None)
+
+    def smembers(self, key):
+        return set(self.data.get(key, set()))
+
+
 class FunctionalTest(unittest.TestCase):
 
     fixtures = [BaseFixture]
@@ -96,6 +145,7 @@ class FunctionalTest(unittest.TestCase):
         self.session_factory = get_session_factory(self.engine)
         self.app_config = CFG(self.settings)
         self.app_config.configure_filedepot()
+        self.app_config.configure_password_hasher()
         self.init_database(self.settings)
         DepotManager._clear()
         self.run_app()
@@ -181,6 +231,7 @@ class BaseTest(unittest.TestCase):
         )
         settings = self.config.get_settings()
         self.app_config = CFG(settings)
+        self.app_config.configure_password_hasher()
         from tracim_backend.models import (
             get_engine,
             get_session_factory,
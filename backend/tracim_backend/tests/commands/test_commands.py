@@ -40,6 +40,9 @@ class TestCommands(CommandFunctionalTest):
         assert output.find('db init') > 0
         assert output.find('db delete') > 0
         assert output.find('webdav start') > 0
+        assert output.find('preview cache report') > 0
+        assert output.find('preview cache prune') > 0
+        assert output.find('revision compact') > 0
 
     def test_func__user_create_command__ok__nominal_case(self) -> None:
         """
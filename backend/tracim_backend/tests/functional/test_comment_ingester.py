@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from mock import Mock
+
+from tracim_backend.fixtures.content import Content as ContentFixtures
+from tracim_backend.fixtures.users_and_groups import Base as BaseFixture
+from tracim_backend.lib.mail_fetcher.comment_ingester import CommentIngester
+from tracim_backend.tests import FunctionalTest
+
+
+def create_mail(content_id: str, from_address: str, body: str) -> Mock:
+    mail = Mock()
+    mail.get_key.return_value = content_id
+    mail.get_from_address.return_value = from_address
+    mail.get_body.return_value = body
+    return mail
+
+
+class TestCommentIngester(FunctionalTest):
+    fixtures = [BaseFixture, ContentFixtures]
+
+    def test_func__ingest__ok__comments_created(self):
+        ingester = CommentIngester(
+            config=self.app_config,
+            session_factory=self.session_factory,
+            use_html_parsing=True,
+            use_txt_parsing=True,
+            batch_size=2,
+        )
+        mails = [
+            create_mail('7', 'admin@admin.admin', '<p>first</p>'),
+            create_mail('7', 'bob@fsf.local', '<p>second</p>'),
+            create_mail('7', 'admin@admin.admin', '<p>third</p>'),
+        ]
+        ingested_mails, unusable_mails = ingester.ingest(mails)
+        assert ingested_mails == mails
+        assert unusable_mails == []
+
+        self.testapp.authorization = (
+            'Basic',
+            (
+                'admin@admin.admin',
+                'admin@admin.admin'
+            )
+        )
+        res = self.testapp.get('/api/v2/workspaces/2/contents/7/comments', status=200)  # nopep8
+        raw_contents = [comment['raw_content'] for comment in res.json_body]
+        assert raw_contents[-3:] == [
+            '<p>first</p>',
+            '<p>second</p>',
+            '<p>third</p>',
+        ]
+
+    def test_func__ingest__ok__invalid_mails_skipped(self):
+        ingester = CommentIngester(
+            config=self.app_config,
+            session_factory=self.session_factory,
+            use_html_parsing=True,
+            use_txt_parsing=True,
+        )
+        valid_mail = create_mail('7', 'bob@fsf.local', '<p>valid</p>')
+        keyless_mail = create_mail(None, 'bob@fsf.local', '<p>nope</p>')
+        mails = [
+            # reader can't comment
+            create_mail('7', 'john-the-reader@reader.local', '<p>nope</p>'),
+            create_mail('7', 'unknown@unknown.local', '<p>nope</p>'),
+            create_mail('7', 'bob@fsf.local', ''),
+            keyless_mail,
+            valid_mail,
+        ]
+        ingested_mails, unusable_mails = ingester.ingest(mails)
+        assert ingested_mails == [valid_mail]
+        # they will never be usable
+        assert unusable_mails == mails[:4]
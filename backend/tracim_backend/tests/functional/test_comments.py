@@ -59,6 +59,30 @@ class TestCommentsEndpoint(FunctionalTest):
         # TODO - G.M - 2018-06-179 - better check for datetime
         assert comment['created']
 
+    def test_api__get_contents_comments__ok_200__limit_and_offset(self) -> None:  # nopep8
+        """
+        Get a page of comments of a content
+        """
+        self.testapp.authorization = (
+            'Basic',
+            (
+                'admin@admin.admin',
+                'admin@admin.admin'
+            )
+        )
+        res = self.testapp.get(
+            '/api/v2/workspaces/2/contents/7/comments',
+            params={'limit': 2},
+            status=200,
+        )
+        assert [comment['content_id'] for comment in res.json_body] == [18, 19]
+        res = self.testapp.get(
+            '/api/v2/workspaces/2/contents/7/comments',
+            params={'limit': 2, 'offset': 2},
+            status=200,
+        )
+        assert [comment['content_id'] for comment in res.json_body] == [20]
+
     def test_api__post_content_comment__ok_200__nominal_case(self) -> None:
         """
         Get alls comments of a content
@@ -102,6 +102,10 @@ class TestFolder(FunctionalTest):
         assert content['last_modifier']['public_name'] == 'Global manager'
         assert content['last_modifier']['avatar_url'] is None
         assert content['raw_content'] == ''
+        assert content['children_nb'] == 0
+        assert content['children_counts'] == []
+        assert content['sub_contents_size'] == 0
+        assert content['last_activity']
 
     def test_api__get_folder__err_400__wrong_content_type(self) -> None:
         """
@@ -1256,6 +1260,35 @@ class TestHtmlDocuments(FunctionalTest):
         assert revision['author']['avatar_url'] is None
         assert revision['author']['public_name'] == 'Bob i.'
 
+    def test_api__get_html_document_revisions__ok_200__paginated(
+            self
+    ) -> None:
+        """
+        Get html document revisions page by page
+        """
+        self.testapp.authorization = (
+            'Basic',
+            (
+                'admin@admin.admin',
+                'admin@admin.admin'
+            )
+        )
+        res = self.testapp.get(
+            '/api/v2/workspaces/2/html-documents/6/revisions',
+            params={'limit': 2},
+            status=200
+        )
+        revisions = res.json_body
+        assert [revision['revision_id'] for revision in revisions] == [6, 7]
+        res = self.testapp.get(
+            '/api/v2/workspaces/2/html-documents/6/revisions',
+            params={'limit': 2, 'after_revision_id': 7},
+            status=200
+        )
+        revisions = res.json_body
+        assert [revision['revision_id'] for revision in revisions] == [27]
+        assert revisions[0]['comment_ids'] == []
+
     def test_api__set_html_document_status__ok_200__nominal_case(self) -> None:
         """
         Get one html document of a content
@@ -1949,6 +1982,7 @@ class TestFiles(FunctionalTest):
         )
         res = self.testapp.get(
             '/api/v2/workspaces/1/files/{}/revisions'.format(test_file.content_id),  # nopep8
+            params={'preview_infos': 1},
             status=200
         )
         revisions = res.json_body
@@ -1979,6 +2013,75 @@ class TestFiles(FunctionalTest):
         assert revision['page_nb'] == 1
         assert revision['pdf_available'] is True
 
+    def test_api__get_file_revisions__ok_200__preview_infos_not_computed_by_default(  # nopep8
+            self
+    ) -> None:
+        """
+        Get file revisions without asking preview infos: only already
+        known preview infos are given
+        """
+        dbsession = get_tm_session(self.session_factory, transaction.manager)
+        admin = dbsession.query(models.User) \
+            .filter(models.User.email == 'admin@admin.admin') \
+            .one()
+        workspace_api = WorkspaceApi(
+            current_user=admin,
+            session=dbsession,
+            config=self.app_config
+        )
+        content_api = ContentApi(
+            current_user=admin,
+            session=dbsession,
+            config=self.app_config
+        )
+        business_workspace = workspace_api.get_one(1)
+        tool_folder = content_api.get_one(1, content_type=CONTENT_TYPES.Any_SLUG)
+        test_file = content_api.create(
+            content_type_slug=CONTENT_TYPES.File.slug,
+            workspace=business_workspace,
+            parent=tool_folder,
+            label='Test file',
+            do_save=False,
+            do_notify=False,
+        )
+        content_api.update_file_data(
+            test_file,
+            'Test_file.txt',
+            new_mimetype='plain/text',
+            new_content=b'Test file',
+        )
+        dbsession.flush()
+        content_id = test_file.content_id
+        transaction.commit()
+
+        self.testapp.authorization = (
+            'Basic',
+            (
+                'admin@admin.admin',
+                'admin@admin.admin'
+            )
+        )
+        res = self.testapp.get(
+            '/api/v2/workspaces/1/files/{}/revisions'.format(content_id),
+            status=200
+        )
+        revisions = res.json_body
+        assert len(revisions) == 1
+        revision = revisions[0]
+        dbsession = get_tm_session(self.session_factory, transaction.manager)
+        stored_revision = dbsession.query(models.ContentRevisionRO) \
+            .filter(
+                models.ContentRevisionRO.revision_id == revision['revision_id']  # nopep8
+            ).one()
+        assert revision['page_nb'] == stored_revision.preview_page_nb
+        if stored_revision.preview_available is None:
+            # unknown, not unavailable
+            assert revision['pdf_available'] is None
+        else:
+            assert revision['pdf_available'] is bool(
+                stored_revision.preview_pdf_available
+            )
+
     def test_api__set_file_status__ok_200__nominal_case(self) -> None:
         """
         set file status
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of html mail body processing over test_email_body_parser corpus.
+
+Run it with:
+
+    python -m tracim_backend.tests.library.benchmark_email_body_parser
+
+Compare single parse pipeline (ParsedHTMLMail.get_sanitized_body) with
+parsing html again to sanitize parsed mail. Corpus mails are also
+concatenated to simulate large html mails.
+"""
+import inspect
+import timeit
+import typing
+
+from tracim_backend.lib.mail_fetcher.email_processing import parser
+from tracim_backend.lib.mail_fetcher.email_processing.parser import ParsedHTMLMail  # nopep8
+from tracim_backend.lib.mail_fetcher.email_processing.sanitizer import HtmlSanitizer  # nopep8
+from tracim_backend.tests.library import test_email_body_parser
+
+LARGE_MAIL_CORPUS_REPEAT = 20
+
+
+def get_corpus() -> typing.List[str]:
+    """
+    Get html mails parsed by test_email_body_parser tests.
+    """
+    corpus = []
+
+    class RecordingParsedHTMLMail(ParsedHTMLMail):
+        def __init__(self, html_body: str):
+            corpus.append(html_body)
+            super().__init__(html_body)
+
+    test_email_body_parser.ParsedHTMLMail = RecordingParsedHTMLMail
+    try:
+        for _, test_class in inspect.getmembers(
+                test_email_body_parser,
+                inspect.isclass,
+        ):
+            if not test_class.__name__.startswith('Test'):
+                continue
+            for name, test in inspect.getmembers(
+                    test_class,
+                    inspect.isfunction,
+            ):
+                if name.startswith('test_'):
+                    test(test_class())
+    finally:
+        test_email_body_parser.ParsedHTMLMail = ParsedHTMLMail
+    return corpus
+
+
+def process_with_single_parse(html_body: str) -> typing.Optional[str]:
+    return ParsedHTMLMail(html_body).get_sanitized_body()
+
+
+def process_with_double_parse(html_body: str) -> typing.Optional[str]:
+    return HtmlSanitizer.sanitize(str(ParsedHTMLMail(html_body)))
+
+
+def bench(
+        name: str,
+        process: typing.Callable[[str], typing.Optional[str]],
+        corpus: typing.List[str],
+        number: int,
+) -> None:
+    duration = timeit.timeit(
+        lambda: [process(html_body) for html_body in corpus],
+        number=number,
+    )
+    print('{:<40} {:>8.2f} ms/mail'.format(
+        name,
+        duration * 1000 / (number * len(corpus)),
+    ))
+
+
+def main() -> None:
+    corpus = get_corpus()
+    large_mail = ''.join(corpus) * LARGE_MAIL_CORPUS_REPEAT
+    print('html parser: {}, corpus: {} mails, large mail: {} bytes'.format(
+        parser.HTML_PARSER,
+        len(corpus),
+        len(large_mail),
+    ))
+    bench('corpus, single parse', process_with_single_parse, corpus, 20)
+    bench('corpus, double parse', process_with_double_parse, corpus, 20)
+    bench('large mail, single parse', process_with_single_parse, [large_mail], 5)  # nopep8
+    bench('large mail, double parse', process_with_double_parse, [large_mail], 5)  # nopep8
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of password check, as done for each http basic auth/webdav request.
+
+Run it with:
+
+    python -m tracim_backend.tests.library.benchmark_password
+
+Compare legacy salted sha256 hash, available key derivation functions and
+verified credentials cache hit.
+"""
+import timeit
+import typing
+
+from tracim_backend.lib.utils.password import PASSWORD_HASH_SCHEMES
+from tracim_backend.lib.utils.password import PasswordHasher
+from tracim_backend.lib.utils.password import VerifiedCredentialsCache
+from tracim_backend.models import User
+
+PASSWORD = 'correct horse battery staple'
+LOGIN = 'bob@fsf.local'
+
+
+def bench(name: str, check: typing.Callable[[], bool], number: int) -> None:
+    assert check()
+    duration = timeit.timeit(check, number=number)
+    print('{:<40} {:>10.3f} ms/check'.format(
+        name,
+        duration * 1000 / number,
+    ))
+
+
+def main() -> None:
+    legacy_hash = User._hash(PASSWORD)
+    hasher = PasswordHasher()
+    bench('legacy sha256', lambda: hasher.verify(legacy_hash, PASSWORD), 1000)  # nopep8
+
+    for scheme in PASSWORD_HASH_SCHEMES:
+        try:
+            hasher = PasswordHasher(scheme=scheme)
+        except ValueError as exc:
+            print('{:<40} {}'.format(scheme, str(exc)))
+            continue
+        hashed = hasher.hash(PASSWORD)
+        bench(scheme, lambda: hasher.verify(hashed, PASSWORD), 10)
+
+    cache = VerifiedCredentialsCache()
+    cache.add(LOGIN, PASSWORD, hashed)
+    bench(
+        'verified credentials cache hit',
+        lambda: cache.check(LOGIN, PASSWORD, hashed),
+        10000,
+    )
+
+
+if __name__ == '__main__':
+    main()
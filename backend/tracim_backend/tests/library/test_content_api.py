@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
+import hashlib
+from io import BytesIO
+
 import pytest
 import transaction
+from mock import patch
 
 from tracim_backend.app_models.contents import CONTENT_TYPES
 from tracim_backend.exceptions import ContentLabelAlreadyUsedHere
@@ -17,11 +21,16 @@ from tracim_backend.lib.core.user import UserApi
 # TODO - G.M - 28-03-2018 - [RoleApi] Re-enable RoleApi
 from tracim_backend.lib.core.workspace import RoleApi
 from tracim_backend.lib.core.workspace import WorkspaceApi
+from tracim_backend.models import content_tree
+from tracim_backend.models import get_session_factory
+from tracim_backend.models import get_tm_session
 from tracim_backend.models.auth import Group
 from tracim_backend.models.auth import User
 from tracim_backend.models.data import ActionDescription
 from tracim_backend.models.data import Content
+from tracim_backend.models.data import ContentAggregate
 from tracim_backend.models.data import ContentRevisionRO
+from tracim_backend.models.data import ContentTreePath
 from tracim_backend.models.data import UserRoleInWorkspace
 from tracim_backend.models.data import Workspace
 from tracim_backend.models.revision_protection import new_revision
@@ -621,6 +630,71 @@ class TestContentApi(DefaultTest):
         assert 'allowed_content' in folder.properties
         assert folder.properties['allowed_content'] == CONTENT_TYPES.default_allowed_content_properties(folder.type)  # nopep8
 
+    def test_unit__get_all_by_properties__ok__nominal_case(self):
+        admin = self.session.query(User)\
+            .filter(User.email == 'admin@admin.admin').one()
+        workspace = self._create_workspace_and_test('workspace_1', admin)
+        api = ContentApi(
+            current_user=admin,
+            session=self.session,
+            config=self.app_config,
+        )
+        contents = []
+        for label, properties in (
+            ('page_a', {'origin': 'email', 'rank': 1}),
+            ('page_b', {'origin': 'email', 'rank': 2}),
+            ('page_c', {'origin': 'web', 'rank': 1}),
+        ):
+            page = api.create(
+                content_type_slug=CONTENT_TYPES.Page.slug,
+                workspace=workspace,
+                parent=None,
+                label=label,
+                do_save=True,
+            )
+            with new_revision(
+                session=self.session,
+                tm=transaction.manager,
+                content=page,
+            ):
+                page.properties = properties
+                api.save(page)
+            contents.append(page)
+        transaction.commit()
+        page_a, page_b, page_c = contents
+
+        found = api.get_all_by_properties({'origin': 'email'})
+        assert sorted(c.content_id for c in found) == sorted([
+            page_a.content_id,
+            page_b.content_id,
+        ])
+        found = api.get_all_by_properties(
+            {'origin': 'email', 'rank': 1},
+            workspace=workspace,
+        )
+        assert [c.content_id for c in found] == [page_a.content_id]
+        assert api.find_one_by_unique_property('origin', 'web').content_id \
+            == page_c.content_id
+
+        # only current revision properties are used
+        with new_revision(
+            session=self.session,
+            tm=transaction.manager,
+            content=page_c,
+        ):
+            page_c.properties = {'origin': 'email', 'rank': 3}
+            api.save(page_c)
+        transaction.commit()
+        assert api.get_all_by_properties({'origin': 'web'}) == []
+        assert len(api.get_all_by_properties({'origin': 'email'})) == 3
+
+        with pytest.raises(ValueError) as exc_info:
+            api.get_all_by_properties({'origin': {'type': 'email'}})
+        assert 'origin value' in str(exc_info.value)
+        with pytest.raises(ValueError) as exc_info:
+            api.get_all_by_properties({'o' * 256: 'email'})
+        assert 'only keys shorter than 255 characters' in str(exc_info.value)
+
     def test_delete(self):
         uapi = UserApi(
             session=self.session,
@@ -1571,6 +1645,480 @@ class TestContentApi(DefaultTest):
         # file has no changed
         assert new_already_exist.content_id == already_exist.content_id
 
+    def test_unit__move_recursively__ok__other_workspace(self):
+        admin = self.session.query(User)\
+            .filter(User.email == 'admin@admin.admin').one()
+        workspace = self._create_workspace_and_test('workspace_1', admin)
+        workspace2 = self._create_workspace_and_test('workspace_2', admin)
+        api = ContentApi(
+            current_user=admin,
+            session=self.session,
+            config=self.app_config,
+        )
+        folder = api.create(
+            CONTENT_TYPES.Folder.slug, workspace, None, 'folder', '', True
+        )
+        subfolder = api.create(
+            CONTENT_TYPES.Folder.slug, workspace, folder, 'subfolder', '', True
+        )
+        page = api.create(
+            CONTENT_TYPES.Page.slug, workspace, subfolder, 'page', '', True
+        )
+        transaction.commit()
+        folder = api.get_one_by_label_and_parent('folder')
+        page_revisions_count = len(page.revisions)
+
+        with new_revision(
+            session=self.session,
+            tm=transaction.manager,
+            content=folder,
+        ):
+            api.move_recursively(folder, None, workspace2)
+        transaction.commit()
+
+        subfolder = api.get_one_by_label_and_parent('subfolder', folder)
+        page = api.get_one_by_label_and_parent('page', subfolder)
+        for content in (folder, subfolder, page):
+            assert content.workspace_id == workspace2.workspace_id
+            assert content.revision_type == ActionDescription.MOVE
+            assert not content.has_new_information_for(admin)
+        assert subfolder.parent_id == folder.content_id
+        assert page.parent_id == subfolder.content_id
+        assert len(page.revisions) == page_revisions_count + 1
+
+    def test_unit__copy_children__ok__recursive(self):
+        admin = self.session.query(User)\
+            .filter(User.email == 'admin@admin.admin').one()
+        workspace = self._create_workspace_and_test('workspace_1', admin)
+        workspace2 = self._create_workspace_and_test('workspace_2', admin)
+        api = ContentApi(
+            current_user=admin,
+            session=self.session,
+            config=self.app_config,
+        )
+        folder = api.create(
+            CONTENT_TYPES.Folder.slug, workspace, None, 'folder', '', True
+        )
+        subfolder = api.create(
+            CONTENT_TYPES.Folder.slug, workspace, folder, 'subfolder', '', True
+        )
+        with self.session.no_autoflush:
+            text_file = api.create(
+                content_type_slug=CONTENT_TYPES.File.slug,
+                workspace=workspace,
+                parent=subfolder,
+                label='test_file',
+                do_save=False,
+            )
+            api.update_file_data(
+                text_file,
+                'test_file',
+                'text/plain',
+                b'test_content'
+            )
+        api.save(text_file, ActionDescription.CREATION)
+        folder_copy = api.copy(
+            item=folder,
+            new_parent=api.create(
+                CONTENT_TYPES.Folder.slug, workspace2, None, 'copies', '', True
+            ),
+        )
+        api.copy_children(folder, folder_copy)
+        transaction.commit()
+
+        subfolder_copy = api.get_one_by_label_and_parent(
+            'subfolder',
+            folder_copy,
+        )
+        text_file_copy = api.get_one_by_label_and_parent(
+            'test_file',
+            subfolder_copy,
+        )
+        assert subfolder_copy.content_id != subfolder.content_id
+        assert text_file_copy.content_id != text_file.content_id
+        assert text_file_copy.workspace_id == workspace2.workspace_id
+        assert text_file_copy.revision_type == ActionDescription.COPY
+        assert text_file_copy.depot_file.file.read() == b'test_content'
+        assert not text_file_copy.has_new_information_for(admin)
+        # origin is not modified
+        text_file = api.get_one_by_label_and_parent('test_file', subfolder)
+        assert text_file.workspace_id == workspace.workspace_id
+        assert text_file.revision_type == ActionDescription.CREATION
+
+    def test_unit__content_tree_paths__ok__create_and_move(self):
+        admin = self.session.query(User)\
+            .filter(User.email == 'admin@admin.admin').one()
+        workspace = self._create_workspace_and_test('workspace_1', admin)
+        api = ContentApi(
+            current_user=admin,
+            session=self.session,
+            config=self.app_config,
+        )
+        folder_a = api.create(
+            CONTENT_TYPES.Folder.slug, workspace, None, 'folder a', '', True
+        )
+        folder_b = api.create(
+            CONTENT_TYPES.Folder.slug, workspace, None, 'folder b', '', True
+        )
+        subfolder = api.create(
+            CONTENT_TYPES.Folder.slug, workspace, folder_a, 'sub', '', True
+        )
+        page = api.create(
+            CONTENT_TYPES.Page.slug, workspace, subfolder, 'page', '', True
+        )
+
+        def get_ancestors(content):
+            return set(
+                self.session.query(
+                    ContentTreePath.ancestor_id,
+                    ContentTreePath.depth,
+                ).filter(ContentTreePath.descendant_id == content.content_id)
+            )
+
+        assert get_ancestors(page) == {
+            (page.content_id, 0),
+            (subfolder.content_id, 1),
+            (folder_a.content_id, 2),
+        }
+
+        with new_revision(
+            session=self.session,
+            tm=transaction.manager,
+            content=subfolder,
+        ):
+            api.move(subfolder, folder_b)
+        api.save(subfolder)
+        transaction.commit()
+
+        assert get_ancestors(page) == {
+            (page.content_id, 0),
+            (subfolder.content_id, 1),
+            (folder_b.content_id, 2),
+        }
+        assert get_ancestors(subfolder) == {
+            (subfolder.content_id, 0),
+            (folder_b.content_id, 1),
+        }
+
+    def test_unit__children__ok__current_revisions_only(self):
+        admin = self.session.query(User)\
+            .filter(User.email == 'admin@admin.admin').one()
+        workspace = self._create_workspace_and_test('workspace_1', admin)
+        api = ContentApi(
+            current_user=admin,
+            session=self.session,
+            config=self.app_config,
+        )
+        folder_a = api.create(
+            CONTENT_TYPES.Folder.slug, workspace, None, 'folder a', '', True
+        )
+        folder_b = api.create(
+            CONTENT_TYPES.Folder.slug, workspace, None, 'folder b', '', True
+        )
+        page = api.create(
+            CONTENT_TYPES.Page.slug, workspace, folder_a, 'page', '', True
+        )
+        with new_revision(
+            session=self.session,
+            tm=transaction.manager,
+            content=page,
+        ):
+            api.update_content(page, 'page', 'new text')
+        api.save(page)
+        transaction.commit()
+
+        # page has two revisions in folder a, but it's only one child
+        assert folder_a.children == [page]
+        assert folder_b.children == []
+
+        with new_revision(
+            session=self.session,
+            tm=transaction.manager,
+            content=page,
+        ):
+            api.move(page, folder_b)
+        api.save(page)
+        transaction.commit()
+
+        assert folder_a.children == []
+        assert folder_b.children == [page]
+
+        folder_ids = [folder_a.id, folder_b.id]
+        page_id = page.id
+        self.session.expunge_all()
+        folders = self.session.query(Content)\
+            .filter(Content.id.in_(folder_ids))\
+            .order_by(Content.id)\
+            .all()
+        api.load_children(folders)
+        assert [folder.children for folder in folders] == [
+            [],
+            [self.session.query(Content).get(page_id)],
+        ]
+
+    def test_unit__get_comments__ok__paginated_and_by_parent(self):
+        admin = self.session.query(User)\
+            .filter(User.email == 'admin@admin.admin').one()
+        workspace = self._create_workspace_and_test('workspace_1', admin)
+        api = ContentApi(
+            current_user=admin,
+            session=self.session,
+            config=self.app_config,
+        )
+        thread_a = api.create(
+            CONTENT_TYPES.Thread.slug, workspace, None, 'thread a', '', True
+        )
+        thread_b = api.create(
+            CONTENT_TYPES.Thread.slug, workspace, None, 'thread b', '', True
+        )
+        comments = [
+            api.create_comment(workspace, thread_a, 'comment {}'.format(i), True)  # nopep8
+            for i in range(3)
+        ]
+        deleted_comment = api.create_comment(
+            workspace, thread_b, 'deleted', True
+        )
+        with new_revision(
+            session=self.session,
+            tm=transaction.manager,
+            content=deleted_comment,
+        ):
+            api.delete(deleted_comment)
+        api.save(deleted_comment)
+        transaction.commit()
+
+        assert thread_a.get_comments() == comments
+        assert api.get_comments(thread_a, limit=2) == comments[:2]
+        assert api.get_comments(thread_a, limit=2, offset=2) == comments[2:]
+        assert api.get_comments_by_parent([thread_a, thread_b]) == {
+            thread_a.content_id: comments,
+            thread_b.content_id: [],
+        }
+
+    def test_unit__get_revisions_in_context__ok__comment_ids(self):
+        admin = self.session.query(User)\
+            .filter(User.email == 'admin@admin.admin').one()
+        workspace = self._create_workspace_and_test('workspace_1', admin)
+        api = ContentApi(
+            current_user=admin,
+            session=self.session,
+            config=self.app_config,
+        )
+        thread = api.create(
+            CONTENT_TYPES.Thread.slug, workspace, None, 'thread', '', True
+        )
+        first_comment = api.create_comment(workspace, thread, 'first', True)
+        with new_revision(
+            session=self.session,
+            tm=transaction.manager,
+            content=thread,
+        ):
+            api.update_content(thread, 'thread', 'new text')
+        api.save(thread)
+        second_comment = api.create_comment(workspace, thread, 'second', True)
+        transaction.commit()
+
+        revisions = api.get_revisions(thread)
+        assert len(revisions) == 2
+        assert api.get_revisions(thread, limit=1) == revisions[:1]
+        assert api.get_revisions(
+            thread,
+            after_revision_id=revisions[0].revision_id,
+        ) == revisions[1:]
+
+        revisions_in_context = api.get_revisions_in_context(thread, revisions)
+        assert [
+            revision.comment_ids for revision in revisions_in_context
+        ] == [[first_comment.content_id], [second_comment.content_id]]
+        # same as computed by revisions themselves
+        assert [
+            api.get_revision_in_context(revision).comment_ids
+            for revision in revisions
+        ] == [[first_comment.content_id], [second_comment.content_id]]
+        # page with first revision only
+        revisions_in_context = api.get_revisions_in_context(
+            thread,
+            revisions[:1],
+        )
+        assert revisions_in_context[0].comment_ids == [
+            first_comment.content_id
+        ]
+
+    def test_unit__content_under_deleted__ok__deleted_grand_parent(self):
+        admin = self.session.query(User)\
+            .filter(User.email == 'admin@admin.admin').one()
+        workspace = self._create_workspace_and_test('workspace_1', admin)
+        api = ContentApi(
+            current_user=admin,
+            session=self.session,
+            config=self.app_config,
+        )
+        folder = api.create(
+            CONTENT_TYPES.Folder.slug, workspace, None, 'folder', '', True
+        )
+        subfolder = api.create(
+            CONTENT_TYPES.Folder.slug, workspace, folder, 'sub', '', True
+        )
+        page = api.create(
+            CONTENT_TYPES.Page.slug, workspace, subfolder, 'page', '', True
+        )
+        assert not api.content_under_deleted(page)
+
+        with new_revision(
+            session=self.session,
+            tm=transaction.manager,
+            content=folder,
+        ):
+            api.delete(folder)
+        api.save(folder)
+
+        assert api.content_under_deleted(page)
+        assert api.content_under_deleted(subfolder)
+        assert not api.content_under_deleted(folder)
+        assert not api.content_under_archived(page)
+
+    def test_unit__content_aggregates__ok__create_delete_and_move(self):
+        admin = self.session.query(User)\
+            .filter(User.email == 'admin@admin.admin').one()
+        workspace = self._create_workspace_and_test('workspace_1', admin)
+        api = ContentApi(
+            current_user=admin,
+            session=self.session,
+            config=self.app_config,
+        )
+        folder = api.create(
+            CONTENT_TYPES.Folder.slug, workspace, None, 'folder', '', True
+        )
+        other_folder = api.create(
+            CONTENT_TYPES.Folder.slug, workspace, None, 'other', '', True
+        )
+        subfolder = api.create(
+            CONTENT_TYPES.Folder.slug, workspace, folder, 'sub', '', True
+        )
+        api.create(
+            CONTENT_TYPES.Page.slug, workspace, folder, 'page', '', True
+        )
+        with self.session.no_autoflush:
+            text_file = api.create(
+                content_type_slug=CONTENT_TYPES.File.slug,
+                workspace=workspace,
+                parent=subfolder,
+                label='test_file',
+                do_save=False,
+            )
+            api.update_file_data(
+                text_file,
+                'test_file',
+                'text/plain',
+                b'test_content'
+            )
+        api.save(text_file, ActionDescription.CREATION)
+
+        def get_size(content):
+            # aggregates are updated without orm, columns are queried to
+            # not get them from identity map
+            return self.session.query(ContentAggregate.subtree_size)\
+                .filter(ContentAggregate.content_id == content.content_id)\
+                .scalar() or 0
+
+        assert folder.get_child_nb(CONTENT_TYPES.Any_SLUG) == 2
+        assert folder.get_child_nb(CONTENT_TYPES.Page.slug, 'open') == 1
+        assert subfolder.get_child_nb(CONTENT_TYPES.File.slug) == 1
+        assert get_size(subfolder) == len(b'test_content')
+        assert get_size(folder) == len(b'test_content')
+        last_activity = self.session.query(ContentAggregate.last_activity)\
+            .filter(ContentAggregate.content_id == folder.content_id)\
+            .scalar()
+        assert last_activity >= text_file.updated
+
+        with new_revision(
+            session=self.session,
+            tm=transaction.manager,
+            content=subfolder,
+        ):
+            api.move(subfolder, other_folder)
+        api.save(subfolder)
+        assert folder.get_child_nb(CONTENT_TYPES.Any_SLUG) == 1
+        assert other_folder.get_child_nb(CONTENT_TYPES.Folder.slug) == 1
+        assert get_size(folder) == 0
+        assert get_size(other_folder) == len(b'test_content')
+
+        with new_revision(
+            session=self.session,
+            tm=transaction.manager,
+            content=subfolder,
+        ):
+            api.delete(subfolder)
+        api.save(subfolder)
+        assert other_folder.get_child_nb(CONTENT_TYPES.Any_SLUG) == 0
+        assert get_size(other_folder) == 0
+        # deleted folder keeps its own aggregates
+        assert get_size(subfolder) == len(b'test_content')
+
+    def test_unit__content_aggregates__ok__concurrent_first_children(self):
+        admin = self.session.query(User)\
+            .filter(User.email == 'admin@admin.admin').one()
+        workspace = self._create_workspace_and_test('workspace_1', admin)
+        api = ContentApi(
+            current_user=admin,
+            session=self.session,
+            config=self.app_config,
+        )
+        folder = api.create(
+            CONTENT_TYPES.Folder.slug, workspace, None, 'folder', '', True
+        )
+        folder_id = folder.content_id
+        workspace_id = workspace.workspace_id
+        admin_id = admin.user_id
+        transaction.commit()
+
+        def add_page(session, label):
+            session_api = ContentApi(
+                current_user=session.query(User).get(admin_id),
+                session=session,
+                config=self.app_config,
+            )
+            with session.no_autoflush:
+                page = session_api.create(
+                    CONTENT_TYPES.Page.slug,
+                    session.query(Workspace).get(workspace_id),
+                    session.query(Content).get(folder_id),
+                    label,
+                    '',
+                    do_save=False,
+                )
+            return session_api, page
+
+        other_session = get_tm_session(
+            get_session_factory(self.engine),
+            transaction.manager,
+        )
+        api, page = add_page(self.session, 'page')
+        other_api, other_page = add_page(other_session, 'other_page')
+        insert_missing_row = content_tree._insert_missing_row
+
+        def concurrent_insert_missing_row(*args, **kwargs):
+            # other session writes first rows of folder once this session
+            # found none
+            if other_page.content_id is None:
+                other_api.save(other_page, ActionDescription.CREATION)
+            return insert_missing_row(*args, **kwargs)
+
+        with patch.object(
+            content_tree,
+            '_insert_missing_row',
+            side_effect=concurrent_insert_missing_row,
+        ):
+            api.save(page, ActionDescription.CREATION)
+        transaction.commit()
+
+        folder = self.session.query(Content).get(folder_id)
+        assert folder.get_child_nb(CONTENT_TYPES.Page.slug, 'open') == 2
+        last_activity = self.session.query(ContentAggregate.last_activity)\
+            .filter(ContentAggregate.content_id == folder_id)\
+            .scalar()
+        assert last_activity is not None
+
     def test_mark_read__workspace(self):
         uapi = UserApi(
             session=self.session,
@@ -2520,6 +3068,195 @@ class TestContentApi(DefaultTest):
         api2.save(content2)
         transaction.commit()
 
+    def test_update_file_data__ok__digest_and_size_stored(self):
+        uapi = UserApi(
+            session=self.session,
+            config=self.app_config,
+            current_user=None,
+        )
+        group_api = GroupApi(
+            current_user=None,
+            session=self.session,
+            config=self.app_config,
+        )
+        groups = [group_api.get_one(Group.TIM_USER),
+                  group_api.get_one(Group.TIM_MANAGER),
+                  group_api.get_one(Group.TIM_ADMIN)]
+
+        user1 = uapi.create_minimal_user(
+            email='this.is@user',
+            groups=groups,
+            save_now=True,
+        )
+        workspace = WorkspaceApi(
+            current_user=user1,
+            session=self.session,
+            config=self.app_config,
+        ).create_workspace(
+            'test workspace',
+            save_now=True
+        )
+        api = ContentApi(
+            current_user=user1,
+            session=self.session,
+            config=self.app_config,
+        )
+        with self.session.no_autoflush:
+            file = api.create(
+                content_type_slug=CONTENT_TYPES.File.slug,
+                workspace=workspace,
+                label='report',
+                do_save=False
+            )
+            api.update_file_data(
+                file,
+                'report.txt',
+                'text/plain',
+                BytesIO(b'first version'),
+            )
+        api.save(file, ActionDescription.CREATION, do_notify=False)
+        transaction.commit()
+
+        file = api.get_one(file.content_id, CONTENT_TYPES.Any_SLUG, workspace)
+        eq_(hashlib.sha256(b'first version').hexdigest(), file.file_sha256)
+        eq_(13, file.file_size)
+        eq_(b'first version', file.depot_file.file.read())
+
+        with new_revision(
+            session=self.session,
+            tm=transaction.manager,
+            content=file,
+        ):
+            with pytest.raises(SameValueError):
+                api.update_file_data(
+                    file,
+                    'report.txt',
+                    'text/plain',
+                    BytesIO(b'first version'),
+                )
+        transaction.abort()
+
+        file = api.get_one(file.content_id, CONTENT_TYPES.Any_SLUG, workspace)
+        with new_revision(
+            session=self.session,
+            tm=transaction.manager,
+            content=file,
+        ):
+            api.update_file_data(
+                file,
+                'report.txt',
+                'text/plain',
+                BytesIO(b'second version'),
+            )
+        api.save(file)
+        transaction.commit()
+
+        file = api.get_one(file.content_id, CONTENT_TYPES.Any_SLUG, workspace)
+        eq_(hashlib.sha256(b'second version').hexdigest(), file.file_sha256)
+        eq_(14, file.file_size)
+        eq_(b'second version', file.depot_file.file.read())
+
+        class NonSeekableStream(object):
+            def __init__(self, content):
+                self._content = BytesIO(content)
+
+            def read(self, n=-1):
+                return self._content.read(n)
+
+        with new_revision(
+            session=self.session,
+            tm=transaction.manager,
+            content=file,
+        ):
+            api.update_file_data(
+                file,
+                'report.txt',
+                'text/plain',
+                NonSeekableStream(b'third version'),
+            )
+        api.save(file)
+        transaction.commit()
+
+        file = api.get_one(file.content_id, CONTENT_TYPES.Any_SLUG, workspace)
+        eq_(hashlib.sha256(b'third version').hexdigest(), file.file_sha256)
+        eq_(13, file.file_size)
+        eq_(b'third version', file.depot_file.file.read())
+
+    def test_fill_revision_preview_infos__ok__computed_once(self):
+        uapi = UserApi(
+            session=self.session,
+            config=self.app_config,
+            current_user=None,
+        )
+        group_api = GroupApi(
+            current_user=None,
+            session=self.session,
+            config=self.app_config,
+        )
+        groups = [group_api.get_one(Group.TIM_USER),
+                  group_api.get_one(Group.TIM_MANAGER),
+                  group_api.get_one(Group.TIM_ADMIN)]
+
+        user1 = uapi.create_minimal_user(
+            email='this.is@user',
+            groups=groups,
+            save_now=True,
+        )
+        workspace = WorkspaceApi(
+            current_user=user1,
+            session=self.session,
+            config=self.app_config,
+        ).create_workspace(
+            'test workspace',
+            save_now=True
+        )
+        api = ContentApi(
+            current_user=user1,
+            session=self.session,
+            config=self.app_config,
+        )
+        with self.session.no_autoflush:
+            file = api.create(
+                content_type_slug=CONTENT_TYPES.File.slug,
+                workspace=workspace,
+                label='report',
+                do_save=False
+            )
+            api.update_file_data(
+                file,
+                'report.pdf',
+                'application/pdf',
+                b'%PDF-1.4',
+            )
+        api.save(file, ActionDescription.CREATION, do_notify=False)
+        transaction.commit()
+
+        class FakePreviewManager(object):
+            calls = 0
+
+            def get_page_nb(self, file_path):
+                FakePreviewManager.calls += 1
+                return 3
+
+            def has_pdf_preview(self, file_path):
+                return True
+
+        api.preview_manager = FakePreviewManager()
+        file = api.get_one(file.content_id, CONTENT_TYPES.Any_SLUG, workspace)
+        assert file.revision.preview_available is None
+        api.fill_revision_preview_infos(file.revision, '/fake/path')
+        api.fill_revision_preview_infos(file.revision, '/fake/path')
+        transaction.commit()
+
+        file = api.get_one(file.content_id, CONTENT_TYPES.Any_SLUG, workspace)
+        eq_(1, FakePreviewManager.calls)
+        eq_(True, file.revision.preview_available)
+        eq_(3, file.revision.preview_page_nb)
+        eq_(True, file.revision.preview_pdf_available)
+        eq_(3, api.get_preview_page_nb(file.revision_id))
+        eq_(True, api.has_pdf_preview(file.revision_id))
+        eq_(1, FakePreviewManager.calls)
+
     def test_archive_unarchive(self):
         uapi = UserApi(
             session=self.session,
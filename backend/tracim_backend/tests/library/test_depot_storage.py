@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import os
+from io import BytesIO
+
+import pytest
+from depot.io.local import LocalFileStorage
+from depot.io.utils import FileIntent
+
+from tracim_backend.lib.storage.depot_storage import DeduplicatedFileStorage
+from tracim_backend.lib.storage.depot_storage import DeduplicatedStoredFile
+from tracim_backend.lib.storage.depot_storage import compute_content_digest
+from tracim_backend.lib.storage.depot_storage import compute_content_digest_and_size  # nopep8
+from tracim_backend.lib.storage.depot_storage import get_stored_file_digest
+from tracim_backend.lib.storage.depot_storage import get_stored_file_info
+from tracim_backend.lib.storage.depot_storage import spool_content
+
+
+class TestComputeContentDigest(object):
+
+    def test_unit__compute_content_digest__ok__bytes(self):
+        digest = compute_content_digest(b'some content')
+        assert digest == hashlib.sha256(b'some content').hexdigest()
+
+    def test_unit__compute_content_digest__ok__file_rewind(self):
+        content = BytesIO(b'some content')
+        digest = compute_content_digest(content)
+        assert digest == hashlib.sha256(b'some content').hexdigest()
+        assert content.read() == b'some content'
+
+    def test_unit__compute_content_digest_and_size__ok__file(self):
+        content = BytesIO(b'some content')
+        content.seek(5)
+        digest, size = compute_content_digest_and_size(content)
+        assert digest == hashlib.sha256(b'content').hexdigest()
+        assert size == 7
+        assert content.tell() == 5
+
+    def test_unit__spool_content__ok__non_seekable_stream(self):
+        class Stream(object):
+            def __init__(self, content):
+                self._content = BytesIO(content)
+
+            def read(self, n=-1):
+                return self._content.read(n)
+
+        spooled = spool_content(Stream(b'some content'))
+        assert spooled.digest == hashlib.sha256(b'some content').hexdigest()
+        assert spooled.content_length == 12
+        assert spooled.read() == b'some content'
+
+    def test_unit__get_stored_file_info__ok__both_layouts(self, tmpdir):
+        legacy_id = LocalFileStorage(str(tmpdir)).create(b'legacy', 'a.txt')
+        storage = DeduplicatedFileStorage(str(tmpdir))
+        file_id = storage.create(b'deduplicated', 'b.txt')
+
+        assert get_stored_file_info(str(tmpdir), legacy_id) == (
+            hashlib.sha256(b'legacy').hexdigest(),
+            6,
+        )
+        assert get_stored_file_info(str(tmpdir), file_id) == (
+            hashlib.sha256(b'deduplicated').hexdigest(),
+            12,
+        )
+        assert get_stored_file_info(
+            str(tmpdir),
+            'c7d3ed7e-d3a1-11e8-8c84-0242ac110002',
+        ) == (None, None)
+
+
+class TestDeduplicatedFileStorage(object):
+
+    def test_unit__create__ok__same_content_share_blob(self, tmpdir):
+        storage = DeduplicatedFileStorage(str(tmpdir))
+        first_id = storage.create(b'same content', 'first.txt', 'text/plain')
+        second_id = storage.create(
+            FileIntent(BytesIO(b'same content'), 'second.txt', 'text/plain')
+        )
+        assert first_id != second_id
+
+        first_file = storage.get(first_id)
+        second_file = storage.get(second_id)
+        assert isinstance(first_file, DeduplicatedStoredFile)
+        assert first_file.filename == 'first.txt'
+        assert second_file.filename == 'second.txt'
+        assert first_file.read() == second_file.read() == b'same content'
+        assert first_file.content_length == 12
+        digest = hashlib.sha256(b'same content').hexdigest()
+        assert get_stored_file_digest(first_file) == digest
+        assert first_file._file_path == second_file._file_path
+        assert storage.get_blob_references_count(digest) == 2
+
+    def test_unit__close__ok__not_read(self, tmpdir):
+        storage = DeduplicatedFileStorage(str(tmpdir))
+        stored_file = storage.get(storage.create(b'content', 'file.txt'))
+        stored_file.close()
+        assert stored_file._file is None
+        assert stored_file.closed
+        with pytest.raises(ValueError):
+            stored_file.read()
+
+    def test_unit__create__ok__from_stored_file(self, tmpdir):
+        storage = DeduplicatedFileStorage(str(tmpdir))
+        first_id = storage.create(b'same content', 'first.txt', 'text/plain')
+        first_file = storage.get(first_id)
+        second_id = storage.create(
+            FileIntent(first_file, 'second.txt', 'text/plain')
+        )
+        # blob is only referenced, not read
+        assert first_file._file is None
+        digest = hashlib.sha256(b'same content').hexdigest()
+        assert storage.get_blob_references_count(digest) == 2
+
+        second_file = storage.get(second_id)
+        assert second_file.filename == 'second.txt'
+        assert second_file.content_length == 12
+        assert second_file.read() == b'same content'
+        storage.delete(first_id)
+        assert storage.get(second_id).read() == b'same content'
+
+    def test_unit__create__ok__spooled_content_not_read_again(self, tmpdir):
+        storage = DeduplicatedFileStorage(str(tmpdir))
+        storage.create(b'same content', 'first.txt')
+        spooled = spool_content(BytesIO(b'same content'))
+        second_id = storage.create(
+            FileIntent(spooled, 'second.txt', 'text/plain')
+        )
+        # blob already exists: spooled content is only referenced
+        assert spooled.read() == b'same content'
+        digest = hashlib.sha256(b'same content').hexdigest()
+        assert storage.get_blob_references_count(digest) == 2
+        assert storage.get(second_id).read() == b'same content'
+
+    def test_unit__create__ok__from_other_storage_file(self, tmpdir):
+        storage = DeduplicatedFileStorage(str(tmpdir))
+        first_id = storage.create(b'some content', 'first.txt')
+        other_storage = DeduplicatedFileStorage(str(tmpdir.mkdir('other')))
+        other_id = other_storage.create(
+            FileIntent(storage.get(first_id), 'other.txt', 'text/plain')
+        )
+        digest = hashlib.sha256(b'some content').hexdigest()
+        # file of another storage is copied
+        assert storage.get_blob_references_count(digest) == 1
+        assert other_storage.get_blob_references_count(digest) == 1
+        assert other_storage.get(other_id).read() == b'some content'
+
+    def test_unit__delete__ok__blob_removed_with_last_reference(self, tmpdir):
+        storage = DeduplicatedFileStorage(str(tmpdir))
+        first_id = storage.create(b'same content', 'first.txt')
+        second_id = storage.create(b'same content', 'second.txt')
+        digest = hashlib.sha256(b'same content').hexdigest()
+        blob_path = storage.get(first_id)._file_path
+
+        storage.delete(first_id)
+        assert not storage.exists(first_id)
+        assert storage.get_blob_references_count(digest) == 1
+        assert storage.get(second_id).read() == b'same content'
+
+        storage.delete(second_id)
+        assert storage.get_blob_references_count(digest) == 0
+        assert not os.path.exists(blob_path)
+        assert storage.list() == []
+
+    def test_unit__replace__ok__nominal_case(self, tmpdir):
+        storage = DeduplicatedFileStorage(str(tmpdir))
+        file_id = storage.create(b'old content', 'file.txt', 'text/plain')
+        old_digest = hashlib.sha256(b'old content').hexdigest()
+        assert storage.replace(file_id, b'new content') == file_id
+
+        stored_file = storage.get(file_id)
+        assert stored_file.read() == b'new content'
+        assert stored_file.filename == 'file.txt'
+        assert storage.get_blob_references_count(old_digest) == 0
+
+    def test_unit__get__ok__legacy_local_file(self, tmpdir):
+        legacy_storage = LocalFileStorage(str(tmpdir))
+        file_id = legacy_storage.create(b'legacy content', 'legacy.txt')
+        storage = DeduplicatedFileStorage(str(tmpdir))
+
+        stored_file = storage.get(file_id)
+        assert stored_file.read() == b'legacy content'
+        assert get_stored_file_digest(stored_file) is None
+        assert storage.list() == [file_id]
+        storage.delete(file_id)
+        assert not storage.exists(file_id)
+
+    def test_unit__get__err__unknown_file(self, tmpdir):
+        storage = DeduplicatedFileStorage(str(tmpdir))
+        with pytest.raises(IOError):
+            storage.get('c7d3ed7e-d3a1-11e8-8c84-0242ac110002')
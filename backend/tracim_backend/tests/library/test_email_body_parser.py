@@ -7,6 +7,7 @@ from tracim_backend.lib.mail_fetcher.email_processing.parser import ParsedHTMLMa
 from tracim_backend.lib.mail_fetcher.email_processing.models import BodyMailPartType
 from tracim_backend.lib.mail_fetcher.email_processing.models import BodyMailPart
 from tracim_backend.lib.mail_fetcher.email_processing.models import BodyMailParts
+from tracim_backend.lib.mail_fetcher.email_processing.sanitizer import HtmlSanitizer
 
 
 class TestHtmlMailQuoteChecker(object):
@@ -756,3 +757,30 @@ class TestParsedMail(object):
         assert elements[0].part_type == BodyMailPartType.Main
         assert elements[1].part_type == BodyMailPartType.Signature
         assert elements[2].part_type == BodyMailPartType.Quote
+
+
+class TestParsedHTMLMailSanitizedBody(object):
+
+    def test_unit__get_sanitized_body__ok__main_part_only(self):
+        html = '<div>' \
+               '<p class="c" style="color: red">Hello <b>you</b>' \
+               '<script>alert("x")</script></p>' \
+               '<span><a href="http://a.b/" id="l">link</a></span>' \
+               '<img src="https://a.b/img.png" alt="img"><br>' \
+               '<blockquote>quoted</blockquote>' \
+               '</div>'
+        body = ParsedHTMLMail(html).get_sanitized_body()
+        assert body == '<p>Hello <b>you</b></p>link<img/><br/>'
+        assert body == HtmlSanitizer.sanitize(str(ParsedHTMLMail(html)))
+
+    def test_unit__get_sanitized_body__ok__no_content(self):
+        html = '<div><p><style>p {}</style>\n </p></div>'
+        assert ParsedHTMLMail(html).get_sanitized_body() is None
+        assert HtmlSanitizer.sanitize(html) is None
+
+    def test_unit__sanitize__ok__text_escaped(self):
+        html = '<p>1 &lt; 2 &amp; <b>&lt;script&gt;</b></p>' \
+               '<textarea>&lt;img src=x onerror=alert(1)&gt;</textarea>'
+        assert HtmlSanitizer.sanitize(html) == \
+            '<p>1 &lt; 2 &amp; <b>&lt;script&gt;</b></p>' \
+            '&lt;img src=x onerror=alert(1)&gt;'
@@ -1,8 +1,12 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import filelock
 import pytest
 from mock import Mock, MagicMock
 from tracim_backend.exceptions import BadStatusCode
 from tracim_backend.lib.mail_fetcher.email_fetcher import DecodedMail, \
-    MailFetcher
+    MailFetcher, MailboxUidWatermark, RedisMailboxLock
+from tracim_backend.lib.mail_fetcher.email_fetcher import IMAP_CHECKED_FLAG
 import responses
 import requests
 
@@ -348,3 +352,235 @@ class TestMailFetcher(object):
             'method': 'POST',
         }
         assert mf._send_request.call_count == 2
+
+    def test_unit__notify_tracim__ok__content_info_asked_once(self):
+        mf = MailFetcher(
+            host='host_imap',
+            port='993',
+            use_ssl=True,
+            password='imap_password',
+            folder='INBOX',
+            use_idle=True,
+            use_html_parsing=True,
+            use_txt_parsing=True,
+            lockfile_path='email_fetcher.lock',
+            api_base_url='http://127.0.0.1:6543/api/',
+            burst=True,
+            api_key='apikey',
+            connection_max_lifetime=60,
+            heartbeat=60,
+            user='imap_user',
+            workers=2,
+        )
+        imapc_mock = MagicMock()
+        mails = []
+        for body in ('CONTENT', 'CONTENT2'):
+            mail = Mock()
+            mail.get_body.return_value = body
+            mail.get_key.return_value = '1'
+            mail.get_from_address.return_value = 'useremailaddress@mydomain.com'  # nopep8
+            mails.append(mail)
+        mf._send_request = Mock()
+        mf._get_content_info = Mock()
+        mf._get_content_info.return_value = {
+            'content_id': 1,
+            'workspace_id': 4,
+        }
+        mf._notify_tracim(mails=mails, imapc=imapc_mock)
+        assert mf._send_request.call_count == 2
+        assert mf._get_content_info.call_count == 1
+
+    def test_unit__notify_tracim__ok__comment_ingester(self):
+        comment_ingester = Mock()
+        mf = MailFetcher(
+            host='host_imap',
+            port='993',
+            use_ssl=True,
+            password='imap_password',
+            folder='INBOX',
+            use_idle=True,
+            use_html_parsing=True,
+            use_txt_parsing=True,
+            lockfile_path='email_fetcher.lock',
+            api_base_url='http://127.0.0.1:6543/api/',
+            burst=True,
+            api_key='apikey',
+            connection_max_lifetime=60,
+            heartbeat=60,
+            user='imap_user',
+            comment_ingester=comment_ingester,
+        )
+        imapc_mock = MagicMock()
+        mail = Mock()
+        mail2 = Mock()
+        comment_ingester.ingest.return_value = ([mail2], [])
+        mf._send_request = Mock()
+        mf._notify_tracim(mails=[mail, mail2], imapc=imapc_mock)
+        assert mf._send_request.call_count == 0
+        comment_ingester.ingest.assert_called_once_with([mail, mail2])
+        assert imapc_mock.add_flags.call_count == 2
+
+    def test_unit__notify_tracim__ok__comment_ingester_unusable_mails(self):
+        comment_ingester = Mock()
+        mf = MailFetcher(
+            host='host_imap',
+            port='993',
+            use_ssl=True,
+            password='imap_password',
+            folder='INBOX',
+            use_idle=True,
+            use_html_parsing=True,
+            use_txt_parsing=True,
+            lockfile_path='email_fetcher.lock',
+            api_base_url='http://127.0.0.1:6543/api/',
+            burst=True,
+            api_key='apikey',
+            connection_max_lifetime=60,
+            heartbeat=60,
+            user='imap_user',
+            comment_ingester=comment_ingester,
+        )
+        imapc_mock = MagicMock()
+        keyless_mail = Mock()
+        keyless_mail.uid = 1
+        mail = Mock()
+        mail.uid = 2
+        failed_mail = Mock()
+        failed_mail.uid = 3
+        comment_ingester.ingest.return_value = ([mail], [keyless_mail])
+        mf._notify_tracim(
+            mails=[keyless_mail, mail, failed_mail],
+            imapc=imapc_mock,
+        )
+        # unusable mail is not flagged, but it will not be fetched again
+        imapc_mock.add_flags.assert_any_call((2,), IMAP_CHECKED_FLAG)
+        assert imapc_mock.add_flags.call_count == 2
+        assert mf._handled_uids == {1, 2}
+
+    def test_unit__check_mail__ok__chunked_fetch_and_uid_watermark(self):
+        mf = MailFetcher(
+            host='host_imap',
+            port='993',
+            use_ssl=True,
+            password='imap_password',
+            folder='INBOX',
+            use_idle=True,
+            use_html_parsing=True,
+            use_txt_parsing=True,
+            lockfile_path='email_fetcher.lock',
+            api_base_url='http://127.0.0.1:6543/api/',
+            burst=True,
+            api_key='apikey',
+            connection_max_lifetime=60,
+            heartbeat=60,
+            user='imap_user',
+            fetch_chunk_size=2,
+        )
+        mf._uidvalidity = 42
+        mf.lock = MagicMock()
+        imapc_mock = MagicMock()
+        imapc_mock.search.return_value = [5, 3, 4, 2]
+        imapc_mock.fetch.side_effect = lambda uids, data: {
+            uid: {b'BODY[]': b'Subject: test'} for uid in uids
+        }
+
+        def notify_tracim(mails, imapc):
+            for mail in mails:
+                if mail.uid != 4:
+                    mf._flag_mail(imapc, mail)
+        mf._notify_tracim = Mock(side_effect=notify_tracim)
+
+        mf._check_mail(imapc_mock)
+        assert imapc_mock.search.call_args[0][0] == ['UNFLAGGED']
+        assert [call[0][0] for call in imapc_mock.fetch.call_args_list] == [
+            [2, 3],
+            [4, 5],
+        ]
+        # mail 4 was not handled, it will be searched again
+        assert mf.uid_watermark.get(42) == 3
+
+        imapc_mock.search.return_value = [4]
+        mf._check_mail(imapc_mock)
+        assert imapc_mock.search.call_args[0][0] == ['UNFLAGGED', 'UID', '4:*']  # nopep8
+        assert mf.uid_watermark.get(42) == 3
+
+
+    def test_unit__notify_tracim__ok__shared_executor(self):
+        executor = ThreadPoolExecutor(max_workers=2)
+        session = requests.Session()
+        fetchers = [
+            MailFetcher(
+                host='host_imap',
+                port='993',
+                use_ssl=True,
+                password='imap_password',
+                folder=folder,
+                use_idle=True,
+                use_html_parsing=True,
+                use_txt_parsing=True,
+                lockfile_path='email_fetcher.lock',
+                api_base_url='http://127.0.0.1:6543/api/',
+                burst=True,
+                api_key='apikey',
+                connection_max_lifetime=60,
+                heartbeat=60,
+                user='imap_user',
+                executor=executor,
+                session=session,
+            )
+            for folder in ('INBOX', 'Replies')
+        ]
+        for fetcher in fetchers:
+            assert fetcher._session is session
+            mail = Mock()
+            mail.get_key.return_value = '1'
+            fetcher._create_comment_request = Mock(return_value=(
+                'POST',
+                'http://127.0.0.1:6543/api/workspaces/4/contents/1/comments',
+                {'raw_content': 'CONTENT'},
+            ))
+            fetcher._send_request = Mock()
+            fetcher._notify_tracim(mails=[mail], imapc=MagicMock())
+            assert fetcher._send_request.call_count == 1
+        # executor is not closed by fetchers
+        assert executor.submit(lambda: 1).result() == 1
+        executor.shutdown()
+
+
+class TestMailboxUidWatermark(object):
+
+    def test_unit__set__ok__persisted(self, tmpdir):
+        state_path = str(tmpdir.join('uids.json'))
+        watermark = MailboxUidWatermark('user@host:993/INBOX', state_path)
+        assert watermark.get(42) == 0
+        watermark.set(42, 10)
+        MailboxUidWatermark('other@host:993/INBOX', state_path).set(1, 3)
+
+        watermark = MailboxUidWatermark('user@host:993/INBOX', state_path)
+        assert watermark.get(42) == 10
+        # uids are not valid anymore
+        assert watermark.get(43) == 0
+        assert MailboxUidWatermark('other@host:993/INBOX', state_path).get(1) == 3  # nopep8
+
+
+class TestRedisMailboxLock(object):
+
+    def test_unit__acquire__ok__released(self):
+        redis_connection = Mock()
+        redis_lock = redis_connection.lock.return_value
+        redis_lock.acquire.return_value = True
+        lock = RedisMailboxLock(redis_connection, 'tracim:mail_fetcher:test')
+        with lock.acquire(timeout=10):
+            redis_lock.acquire.assert_called_once_with(blocking_timeout=10)
+            assert not redis_lock.release.called
+            lock.refresh()
+        assert redis_lock.release.called
+        redis_lock.extend.assert_called_once_with(lock.ttl)
+
+    def test_unit__acquire__err__timeout(self):
+        redis_connection = Mock()
+        redis_connection.lock.return_value.acquire.return_value = False
+        lock = RedisMailboxLock(redis_connection, 'tracim:mail_fetcher:test')
+        with pytest.raises(filelock.Timeout):
+            with lock.acquire(timeout=0):
+                pass
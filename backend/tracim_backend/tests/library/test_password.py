@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+import time
+from hashlib import sha256
+
+import pytest
+
+from tracim_backend.lib.utils.password import ARGON2_SCHEME
+from tracim_backend.lib.utils.password import AuthenticatedUserCache
+from tracim_backend.lib.utils.password import BCRYPT_SCHEME
+from tracim_backend.lib.utils.password import PasswordHasher
+from tracim_backend.lib.utils.password import VerifiedCredentialsCache
+
+LEGACY_SALT = '0123456789abcdef' * 4
+
+
+class TestPasswordHasher(object):
+
+    def test_unit__hash__ok__pbkdf2(self):
+        hasher = PasswordHasher(pbkdf2_iterations=1000)
+        hashed = hasher.hash('foobar')
+        assert hashed.startswith('$pbkdf2-sha256$1000$')
+        assert len(hashed) <= 128
+        assert hashed != hasher.hash('foobar')
+        assert hasher.verify(hashed, 'foobar')
+        assert not hasher.verify(hashed, 'foobaz')
+        assert not hasher.needs_rehash(hashed)
+
+    def test_unit__needs_rehash__ok__lower_cost(self):
+        hashed = PasswordHasher(pbkdf2_iterations=1000).hash('foobar')
+        hasher = PasswordHasher(pbkdf2_iterations=2000)
+        assert hasher.verify(hashed, 'foobar')
+        assert hasher.needs_rehash(hashed)
+
+    def test_unit__verify__ok__legacy_hash(self):
+        # legacy hashes are salt + sha256(password + salt)
+        legacy_hash = LEGACY_SALT + sha256(
+            ('foobar' + LEGACY_SALT).encode('utf-8')
+        ).hexdigest()
+        hasher = PasswordHasher(pbkdf2_iterations=1000)
+        assert hasher.verify(legacy_hash, 'foobar')
+        assert not hasher.verify(legacy_hash, 'foobaz')
+        assert hasher.needs_rehash(legacy_hash)
+
+    def test_unit__verify__ok__empty_or_invalid_hash(self):
+        hasher = PasswordHasher(pbkdf2_iterations=1000)
+        assert not hasher.verify(None, 'foobar')
+        assert not hasher.verify('', 'foobar')
+        assert not hasher.verify('$pbkdf2-sha256$nope', 'foobar')
+        assert not hasher.verify('nope', 'foobar')
+
+    def test_unit__init__err__unknown_scheme(self):
+        with pytest.raises(ValueError):
+            PasswordHasher(scheme='md5')
+
+    def test_unit__hash__ok__argon2(self):
+        pytest.importorskip('argon2')
+        hasher = PasswordHasher(scheme=ARGON2_SCHEME)
+        hashed = hasher.hash('foobar')
+        assert hashed.startswith('$argon2')
+        assert len(hashed) <= 128
+        assert hasher.verify(hashed, 'foobar')
+        assert not hasher.verify(hashed, 'foobaz')
+        assert not hasher.needs_rehash(hashed)
+        # other schemes can still check it, but ask for rehash
+        pbkdf2_hasher = PasswordHasher(pbkdf2_iterations=1000)
+        assert pbkdf2_hasher.verify(hashed, 'foobar')
+        assert pbkdf2_hasher.needs_rehash(hashed)
+        assert hasher.needs_rehash(pbkdf2_hasher.hash('foobar'))
+
+    def test_unit__hash__ok__bcrypt(self):
+        pytest.importorskip('bcrypt')
+        hasher = PasswordHasher(scheme=BCRYPT_SCHEME, bcrypt_rounds=4)
+        hashed = hasher.hash('foobar' * 20)
+        assert len(hashed) <= 128
+        assert hasher.verify(hashed, 'foobar' * 20)
+        assert not hasher.verify(hashed, 'foobar' * 19)
+        assert not hasher.needs_rehash(hashed)
+        assert PasswordHasher(
+            scheme=BCRYPT_SCHEME,
+            bcrypt_rounds=5,
+        ).needs_rehash(hashed)
+
+
+class TestVerifiedCredentialsCache(object):
+
+    def test_unit__check__ok__nominal_case(self):
+        cache = VerifiedCredentialsCache(ttl=60)
+        assert not cache.check('bob@bob', 'foobar', 'hash')
+        cache.add('bob@bob', 'foobar', 'hash')
+        assert cache.check('bob@bob', 'foobar', 'hash')
+        assert not cache.check('bob@bob', 'foobaz', 'hash')
+        assert not cache.check('alice@alice', 'foobar', 'hash')
+        # password changed
+        assert not cache.check('bob@bob', 'foobar', 'new_hash')
+
+    def test_unit__check__ok__expired(self, monkeypatch):
+        cache = VerifiedCredentialsCache(ttl=60)
+        cache.add('bob@bob', 'foobar', 'hash')
+        now = time.monotonic()
+        monkeypatch.setattr(time, 'monotonic', lambda: now + 61)
+        assert not cache.check('bob@bob', 'foobar', 'hash')
+
+    def test_unit__add__ok__max_size(self):
+        cache = VerifiedCredentialsCache(ttl=60, max_size=2)
+        cache.add('bob@bob', 'foobar', 'hash')
+        cache.add('alice@alice', 'foobar', 'hash')
+        assert cache.check('bob@bob', 'foobar', 'hash')
+        cache.add('john@john', 'foobar', 'hash')
+        assert cache.check('bob@bob', 'foobar', 'hash')
+        assert not cache.check('alice@alice', 'foobar', 'hash')
+        assert cache.check('john@john', 'foobar', 'hash')
+
+    def test_unit__check__ok__disabled(self):
+        cache = VerifiedCredentialsCache(ttl=0)
+        cache.add('bob@bob', 'foobar', 'hash')
+        assert not cache.check('bob@bob', 'foobar', 'hash')
+
+
+class TestAuthenticatedUserCache(object):
+
+    def test_unit__get__ok__nominal_case(self):
+        cache = AuthenticatedUserCache(ttl=60)
+        assert cache.get('bob@bob', 'foobar') is None
+        cache.add('bob@bob', 'foobar', 1)
+        assert cache.get('bob@bob', 'foobar') == 1
+        assert cache.get('bob@bob', 'foobaz') is None
+
+    def test_unit__get__ok__expired(self, monkeypatch):
+        cache = AuthenticatedUserCache(ttl=60)
+        cache.add('bob@bob', 'foobar', 1)
+        now = time.monotonic()
+        monkeypatch.setattr(time, 'monotonic', lambda: now + 61)
+        assert cache.get('bob@bob', 'foobar') is None
+
+    def test_unit__invalidate_user__ok__nominal_case(self):
+        cache = AuthenticatedUserCache(ttl=60)
+        cache.add('bob@bob', 'foobar', 1)
+        cache.add('bob@bob', 'old_password', 1)
+        cache.add('alice@alice', 'foobar', 2)
+        cache.invalidate_user(1)
+        assert cache.get('bob@bob', 'foobar') is None
+        assert cache.get('bob@bob', 'old_password') is None
+        assert cache.get('alice@alice', 'foobar') == 2
+        # nothing left to invalidate
+        cache.invalidate_user(1)
+
+    def test_unit__add__ok__max_size(self):
+        cache = AuthenticatedUserCache(ttl=60, max_size=2)
+        cache.add('bob@bob', 'foobar', 1)
+        cache.add('alice@alice', 'foobar', 2)
+        assert cache.get('bob@bob', 'foobar') == 1
+        cache.add('john@john', 'foobar', 3)
+        assert cache.get('alice@alice', 'foobar') is None
+        assert cache.get('bob@bob', 'foobar') == 1
+        assert cache.get('john@john', 'foobar') == 3
+        # dropped entries are not kept in user index
+        cache.invalidate_user(2)
+
+    def test_unit__get__ok__outdated_version(self):
+        cache = AuthenticatedUserCache(ttl=60)
+        cache.add('bob@bob', 'foobar', 1, version=3)
+        assert cache.get('bob@bob', 'foobar', get_version=lambda user_id: 3) == 1  # nopep8
+        # user modified by another node
+        assert cache.get('bob@bob', 'foobar', get_version=lambda user_id: 4) is None  # nopep8
+        assert cache.get('bob@bob', 'foobar', get_version=lambda user_id: 3) is None  # nopep8
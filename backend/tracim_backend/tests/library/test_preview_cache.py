@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+
+from tracim_backend.lib.preview.cache import PREVIEW_CACHE_LFU
+from tracim_backend.lib.preview.cache import PREVIEW_CACHE_LRU
+from tracim_backend.lib.preview.cache import PreviewCacheManager
+
+
+def create_preview(cache_dir: str, name: str, size: int, age: int) -> str:
+    preview_path = os.path.join(cache_dir, name)
+    with open(preview_path, 'wb') as preview_file:
+        preview_file.write(b'x' * size)
+    timestamp = time.time() - age
+    os.utime(preview_path, (timestamp, timestamp))
+    return preview_path
+
+
+class TestPreviewCacheManager(object):
+
+    def test_unit__record_access__ok__hits_and_misses(self, tmpdir):
+        cache_dir = str(tmpdir)
+        preview_cache = PreviewCacheManager(cache_dir)
+        old_preview = create_preview(cache_dir, 'old.jpeg', 10, age=3600)
+        preview_cache.record_access(old_preview, time.time())
+        new_preview = create_preview(cache_dir, 'new.jpeg', 20, age=0)
+        preview_cache.record_access(new_preview, time.time() - 10)
+
+        report = preview_cache.report()
+        assert report.hits == 1
+        assert report.misses == 1
+        assert report.hit_rate == 0.5
+        assert report.size == 30
+        assert report.files_count == 2
+
+    def test_unit__report__ok__untracked_previews(self, tmpdir):
+        cache_dir = str(tmpdir)
+        os.makedirs(os.path.join(cache_dir, '.locks'))
+        create_preview(cache_dir, '.locks/some.lock', 5, age=0)
+        create_preview(cache_dir, 'generated.pdf', 100, age=0)
+        report = PreviewCacheManager(cache_dir).report()
+        assert report.size == 100
+        assert report.files_count == 1
+        assert report.hit_rate is None
+
+    def test_unit__prune__ok__lru(self, tmpdir):
+        cache_dir = str(tmpdir)
+        preview_cache = PreviewCacheManager(
+            cache_dir,
+            max_size=100,
+            eviction_policy=PREVIEW_CACHE_LRU,
+            eviction_grace_delay=0,
+        )
+        oldest = create_preview(cache_dir, 'oldest.jpeg', 60, age=300)
+        newest = create_preview(cache_dir, 'newest.jpeg', 60, age=200)
+
+        evicted_entries = preview_cache.prune()
+        assert [entry.path for entry in evicted_entries] == [oldest]
+        assert not os.path.exists(oldest)
+        assert os.path.exists(newest)
+        assert preview_cache.report().evictions == 1
+
+    def test_unit__prune__ok__lfu(self, tmpdir):
+        cache_dir = str(tmpdir)
+        preview_cache = PreviewCacheManager(
+            cache_dir,
+            eviction_policy=PREVIEW_CACHE_LFU,
+            eviction_grace_delay=0,
+        )
+        frequent = create_preview(cache_dir, 'frequent.jpeg', 60, age=300)
+        rare = create_preview(cache_dir, 'rare.jpeg', 60, age=200)
+        for _ in range(3):
+            preview_cache.record_access(frequent, time.time())
+        preview_cache.record_access(rare, time.time())
+
+        evicted_entries = preview_cache.prune(max_size=100)
+        assert [entry.path for entry in evicted_entries] == [rare]
+        assert os.path.exists(frequent)
+
+    def test_unit__prune__ok__unlimited(self, tmpdir):
+        cache_dir = str(tmpdir)
+        preview = create_preview(cache_dir, 'preview.jpeg', 60, age=300)
+        assert PreviewCacheManager(cache_dir).prune() == []
+        assert os.path.exists(preview)
+
+    def test_unit__prune__ok__target_size(self, tmpdir):
+        cache_dir = str(tmpdir)
+        preview_cache = PreviewCacheManager(
+            cache_dir,
+            max_size=100,
+            eviction_grace_delay=0,
+        )
+        oldest = create_preview(cache_dir, 'oldest.jpeg', 40, age=300)
+        middle = create_preview(cache_dir, 'middle.jpeg', 40, age=200)
+        newest = create_preview(cache_dir, 'newest.jpeg', 40, age=100)
+
+        # explicit max size equal to configured one is respected
+        evicted_entries = preview_cache.prune(max_size=100)
+        assert [entry.path for entry in evicted_entries] == [oldest]
+
+        create_preview(cache_dir, 'other.jpeg', 40, age=0)
+        evicted_entries = preview_cache.prune(target_size=50)
+        assert [entry.path for entry in evicted_entries] == [middle, newest]
+
+    def test_unit__record_access__ok__no_eviction(self, tmpdir):
+        cache_dir = str(tmpdir)
+        preview_cache = PreviewCacheManager(
+            cache_dir,
+            max_size=100,
+            eviction_grace_delay=0,
+        )
+        first = create_preview(cache_dir, 'first.jpeg', 60, age=0)
+        preview_cache.record_access(first, time.time() - 10)
+        second = create_preview(cache_dir, 'second.jpeg', 60, age=0)
+        preview_cache.record_access(second, time.time() - 10)
+
+        # eviction is left to prune command
+        assert os.path.exists(first)
+        assert os.path.exists(second)
+        evicted_entries = preview_cache.prune()
+        assert [entry.path for entry in evicted_entries] == [first]
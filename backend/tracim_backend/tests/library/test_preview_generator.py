@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+import transaction
+from filelock import Timeout
+from mock import Mock
+
+from tracim_backend.config import CFG
+from tracim_backend.config import PreviewDim
+from tracim_backend.lib.preview import generator as generator_module
+from tracim_backend.lib.preview.generator import enqueue_previews_generation
+from tracim_backend.lib.preview.generator import generate_previews
+from tracim_backend.lib.preview.generator import get_preview_lock
+
+
+class TestPreviewLock(object):
+
+    def test_unit__get_preview_lock__ok__same_lock_for_same_file(self, tmpdir):
+        first_lock = get_preview_lock(str(tmpdir), '/tmp/file_a')
+        second_lock = get_preview_lock(str(tmpdir), '/tmp/file_a')
+        other_lock = get_preview_lock(str(tmpdir), '/tmp/file_b')
+        assert first_lock.lock_file == second_lock.lock_file
+        assert first_lock.lock_file != other_lock.lock_file
+        assert os.path.dirname(first_lock.lock_file).startswith(str(tmpdir))
+
+    def test_unit__get_preview_lock__ok__single_flight(self, tmpdir):
+        first_lock = get_preview_lock(str(tmpdir), '/tmp/file_a')
+        second_lock = get_preview_lock(str(tmpdir), '/tmp/file_a')
+        with first_lock:
+            assert first_lock.is_locked
+            assert not second_lock.is_locked
+            with pytest.raises(Timeout):
+                second_lock.acquire(timeout=0.01)
+
+
+class TestGeneratePreviews(object):
+
+    def test_unit__generate_previews__ok__missing_file_skipped(self, tmpdir):
+        cache_dir = str(tmpdir.join('cache'))
+        generate_previews(
+            cache_dir,
+            str(tmpdir.join('missing_file')),
+            [(256, 256)],
+            1,
+        )
+        assert not os.path.exists(cache_dir)
+
+    def test_unit__generate_previews__ok__preview_infos_stored(
+        self,
+        tmpdir,
+        monkeypatch,
+    ):
+        file_path = tmpdir.join('file.pdf')
+        file_path.write('content')
+        preview_manager = Mock()
+        preview_manager.get_page_nb.return_value = 2
+        preview_manager.has_pdf_preview.return_value = False
+        store_preview_infos = Mock()
+        session_factory = Mock()
+        monkeypatch.setattr(
+            generator_module,
+            'PreviewManager',
+            lambda *args, **kwargs: preview_manager,
+        )
+        monkeypatch.setattr(
+            generator_module,
+            'store_preview_infos',
+            store_preview_infos,
+        )
+        monkeypatch.setattr(generator_module, '_session_factory', session_factory)  # nopep8
+
+        generate_previews(
+            str(tmpdir.join('cache')),
+            str(file_path),
+            [(256, 256)],
+            1,
+            revision_id=12,
+        )
+        store_preview_infos.assert_called_once_with(
+            session_factory,
+            12,
+            True,
+            2,
+            False,
+        )
+        # only first page jpg preview is generated
+        assert preview_manager.get_jpeg_preview.call_count == 1
+
+
+class TestEnqueuePreviewsGeneration(object):
+
+    def test_unit__enqueue_previews_generation__ok__lazy_mode(self):
+        class FakeConfig(object):
+            CST = CFG.CST
+            PREVIEW_GENERATION_PROCESSING_MODE = CFG.CST.LAZY
+
+        class FailingDepotFile(object):
+            @property
+            def file(self):
+                raise AssertionError('depot file should not be read')
+
+        class FakeRevision(object):
+            depot_file = FailingDepotFile()
+
+        with transaction.manager as current_transaction:
+            enqueue_previews_generation(
+                FakeConfig(),
+                FakeRevision(),
+                transaction.manager,
+            )
+            assert not list(current_transaction.getAfterCommitHooks())
+
+    def test_unit__enqueue_previews_generation__ok__async_mode(
+        self,
+        tmpdir,
+        monkeypatch,
+    ):
+        file_path = str(tmpdir.join('file.pdf'))
+
+        class FakeConfig(object):
+            CST = CFG.CST
+            PREVIEW_GENERATION_PROCESSING_MODE = CFG.CST.ASYNC
+            PREVIEW_CACHE_DIR = str(tmpdir.join('cache'))
+            PREVIEW_JPG_ALLOWED_DIMS = [PreviewDim(256, 256)]
+            PREVIEW_GENERATION_JPG_PAGES = 1
+
+        class FakeRevision(object):
+            revision_id = None
+            depot_file = Mock()
+
+        revision = FakeRevision()
+        revision.depot_file.file._file_path = file_path
+        queue = Mock()
+        monkeypatch.setattr(
+            generator_module,
+            'get_redis_connection',
+            lambda config: None,
+        )
+        monkeypatch.setattr(
+            generator_module,
+            'get_rq_queue',
+            lambda redis_connection, queue_name: queue,
+        )
+
+        # As pyramid_tm request transaction manager
+        transaction_manager = transaction.TransactionManager(explicit=True)
+        with transaction_manager:
+            enqueue_previews_generation(
+                FakeConfig(),
+                revision,
+                transaction_manager,
+            )
+            # revision id is known once transaction is flushed
+            revision.revision_id = 12
+            assert not queue.enqueue_call.called
+        assert not list(transaction.get().getAfterCommitHooks())
+
+        assert queue.enqueue_call.call_count == 1
+        enqueue_kwargs = queue.enqueue_call.call_args[1]
+        assert enqueue_kwargs['func'] == generate_previews
+        assert enqueue_kwargs['args'] == (
+            str(tmpdir.join('cache')),
+            file_path,
+            [(256, 256)],
+            1,
+            12,
+        )
+
+    def test_unit__enqueue_previews_generation__ok__async_mode_abort(
+        self,
+        tmpdir,
+        monkeypatch,
+    ):
+        class FakeConfig(object):
+            CST = CFG.CST
+            PREVIEW_GENERATION_PROCESSING_MODE = CFG.CST.ASYNC
+            PREVIEW_JPG_ALLOWED_DIMS = [PreviewDim(256, 256)]
+
+        revision = Mock()
+        revision.depot_file.file._file_path = str(tmpdir.join('file.pdf'))
+        get_rq_queue = Mock()
+        monkeypatch.setattr(generator_module, 'get_rq_queue', get_rq_queue)
+
+        transaction_manager = transaction.TransactionManager(explicit=True)
+        transaction_manager.begin()
+        enqueue_previews_generation(FakeConfig(), revision, transaction_manager)
+        transaction_manager.abort()
+        assert not get_rq_queue.called
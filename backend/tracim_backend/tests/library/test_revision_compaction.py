@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+import transaction
+from depot.manager import DepotManager
+
+from tracim_backend.app_models.contents import CONTENT_TYPES
+from tracim_backend.lib.core.content import ContentApi
+from tracim_backend.lib.core.revision_compaction import RevisionCompactor
+from tracim_backend.models import get_session_factory
+from tracim_backend.models import get_tm_session
+from tracim_backend.models.auth import User
+from tracim_backend.models.data import ActionDescription
+from tracim_backend.models.data import Content
+from tracim_backend.models.data import ContentRevisionRO
+from tracim_backend.models.revision_protection import new_revision
+from tracim_backend.tests import DefaultTest
+
+
+class TestRevisionCompactor(DefaultTest):
+
+    def _create_file_with_revisions(self, updates_nb: int) -> Content:
+        admin = self.session.query(User)\
+            .filter(User.email == 'admin@admin.admin').one()
+        workspace = self._create_workspace_and_test('workspace_1', admin)
+        self.api = ContentApi(
+            current_user=admin,
+            session=self.session,
+            config=self.app_config,
+        )
+        with self.session.no_autoflush:
+            file_ = self.api.create(
+                content_type_slug=CONTENT_TYPES.File.slug,
+                workspace=workspace,
+                parent=None,
+                label='report',
+                do_save=False,
+            )
+            self.api.update_file_data(
+                file_, 'report.txt', 'text/plain', b'version 0'
+            )
+        self.api.save(file_, ActionDescription.CREATION)
+        transaction.commit()
+        for version in range(1, updates_nb + 1):
+            self._update_file(file_, version)
+        return file_
+
+    def _update_file(self, file_: Content, version: int) -> None:
+        with new_revision(
+            session=self.session,
+            tm=transaction.manager,
+            content=file_,
+        ):
+            self.api.update_file_data(
+                file_,
+                'report.txt',
+                'text/plain',
+                'version {}'.format(version).encode('utf-8'),
+            )
+            self.api.save(file_, ActionDescription.REVISION)
+        transaction.commit()
+
+    def _get_revision_ids(self, content_id: int):
+        return [
+            revision_id for revision_id, in self.session.query(
+                ContentRevisionRO.revision_id,
+            ).filter(ContentRevisionRO.content_id == content_id)
+            .order_by(ContentRevisionRO.revision_id)
+        ]
+
+    def test_unit__compact_content__ok__keep_creation_and_last(self):
+        file_ = self._create_file_with_revisions(3)
+        content_id = file_.content_id
+        revision_ids = self._get_revision_ids(content_id)
+        assert len(revision_ids) == 4
+        removed_files = [
+            revision.depot_file.file_id
+            for revision in file_.revisions
+            if revision.revision_id in revision_ids[1:3]
+        ]
+
+        compactor = RevisionCompactor(self.session, window=3600)
+        assert compactor.compact_content(file_) == 2
+        transaction.commit()
+
+        assert self._get_revision_ids(content_id) == [
+            revision_ids[0],
+            revision_ids[3],
+        ]
+        file_ = self.session.query(Content).get(content_id)
+        assert file_.depot_file.file.read() == b'version 3'
+        depot = DepotManager.get()
+        for file_id in removed_files:
+            assert not depot.exists(file_id)
+
+    def test_unit__compact_content__ok__session_transaction_manager(self):
+        file_ = self._create_file_with_revisions(2)
+        content_id = file_.content_id
+        removed_file_id = file_.revisions[1].depot_file.file_id
+
+        # as in requests and commands, session is bound to its own manager
+        transaction_manager = transaction.TransactionManager(explicit=True)
+        with transaction_manager:
+            session = get_tm_session(
+                get_session_factory(self.engine),
+                transaction_manager,
+            )
+            file_ = session.query(Content).get(content_id)
+            compactor = RevisionCompactor(session, window=3600)
+            assert compactor.compact_content(file_) == 1
+
+        assert not DepotManager.get().exists(removed_file_id)
+
+    def test_unit__compact_content__ok__retention(self):
+        file_ = self._create_file_with_revisions(3)
+        compactor = RevisionCompactor(
+            self.session,
+            window=3600,
+            retention_days=1,
+        )
+        assert compactor.compact_content(file_) == 0
+        assert RevisionCompactor(self.session, window=0).compact_all() == 0
+
+    def test_unit__coalesce_last_revision__ok__nominal_case(self):
+        file_ = self._create_file_with_revisions(1)
+        content_id = file_.content_id
+        compactor = RevisionCompactor(self.session, window=3600)
+        # creation is never coalesced
+        assert compactor.coalesce_last_revision(file_) is False
+
+        self._update_file(file_, 2)
+        revision_ids = self._get_revision_ids(content_id)
+        assert compactor.coalesce_last_revision(file_) is True
+        transaction.commit()
+
+        assert self._get_revision_ids(content_id) == [
+            revision_ids[0],
+            revision_ids[2],
+        ]
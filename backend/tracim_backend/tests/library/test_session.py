@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from mock import Mock
+
+from tracim_backend.lib.utils import session as session_module
+from tracim_backend.lib.utils.session import RedisSessionNamespaceManager
+from tracim_backend.lib.utils.session import get_session_user_summary
+from tracim_backend.lib.utils.session import get_user_session_version
+from tracim_backend.lib.utils.session import invalidate_user_sessions
+from tracim_backend.lib.utils.session import set_session_user_summary
+from tracim_backend.tests import FakeRedis
+
+
+def create_user(user_id: int) -> Mock:
+    user = Mock()
+    user.user_id = user_id
+    user.email = 'bob@fsf.local'
+    user.profile.name = 'users'
+    return user
+
+
+class TestRedisSessionNamespaceManager(object):
+
+    def test_unit__set_value__ok__nominal_case(self, monkeypatch):
+        redis = FakeRedis()
+        monkeypatch.setattr(session_module, '_redis_connection', redis)
+        monkeypatch.setattr(RedisSessionNamespaceManager, 'default_timeout', 60)  # nopep8
+        namespace = RedisSessionNamespaceManager('abc')
+        assert 'session' not in namespace
+        namespace.set_value('session', {'foo': 'bar'})
+        assert 'session' in namespace
+        assert namespace['session'] == {'foo': 'bar'}
+        assert redis.expirations['tracim:session:abc:session'] == 60
+        assert namespace.keys() == ['session']
+        # other sessions are isolated
+        assert 'session' not in RedisSessionNamespaceManager('abd')
+
+    def test_unit__do_remove__ok__nominal_case(self, monkeypatch):
+        redis = FakeRedis()
+        monkeypatch.setattr(session_module, '_redis_connection', redis)
+        namespace = RedisSessionNamespaceManager('abc')
+        namespace['session'] = {'foo': 'bar'}
+        RedisSessionNamespaceManager('abd')['session'] = {'foo': 'bar'}
+        namespace.do_remove()
+        assert 'session' not in namespace
+        assert list(redis.data) == ['tracim:session:abd:session']
+
+
+class TestSessionUserSummary(object):
+
+    def test_unit__get_session_user_summary__ok__invalidated(self, monkeypatch):  # nopep8
+        monkeypatch.setattr(session_module, '_redis_connection', FakeRedis())
+        session = {}
+        version = get_user_session_version(1)
+        assert get_session_user_summary(session, 1, version) is None
+        set_session_user_summary(session, create_user(1), version)
+        summary = get_session_user_summary(session, 1, get_user_session_version(1))  # nopep8
+        assert summary['email'] == 'bob@fsf.local'
+        assert summary['profile'] == 'users'
+        # other user sessions are not invalidated
+        invalidate_user_sessions(2)
+        assert get_session_user_summary(session, 1, get_user_session_version(1))  # nopep8
+        assert get_session_user_summary(session, 2, get_user_session_version(2)) is None  # nopep8
+        invalidate_user_sessions(1)
+        assert get_session_user_summary(session, 1, get_user_session_version(1)) is None  # nopep8
+
+    def test_unit__get_session_user_summary__ok__no_redis(self):
+        session = {}
+        version = get_user_session_version(1)
+        assert version is None
+        set_session_user_summary(session, create_user(1), version)
+        assert session == {}
+        assert get_session_user_summary(session, 1, version) is None
+        invalidate_user_sessions(1)
@@ -11,6 +11,9 @@ from tracim_backend.lib.core.group import GroupApi
 from tracim_backend.lib.core.user import UserApi
 from tracim_backend.lib.core.userworkspace import RoleApi
 from tracim_backend.lib.core.workspace import WorkspaceApi
+from tracim_backend.lib.utils.password import AuthenticatedUserCache
+from tracim_backend.lib.utils.password import get_authenticated_user_cache
+from tracim_backend.lib.utils.password import set_authenticated_user_cache
 from tracim_backend.models import User
 from tracim_backend.models.context_models import UserInContext
 from tracim_backend.models.data import UserRoleInWorkspace
@@ -357,6 +360,42 @@ class TestUserApi(DefaultTest):
         assert isinstance(user, User)
         assert user.email == 'admin@admin.admin'
 
+    def test_unit__authenticate_user___ok__legacy_hash_rehashed(self):
+        api = UserApi(
+            current_user=None,
+            session=self.session,
+            config=self.config,
+        )
+        user = api.get_one_by_email('admin@admin.admin')
+        # legacy salted sha256 hash
+        user._password = User._hash('admin@admin.admin')
+        assert len(user.password) == 128
+        user = api.authenticate_user('admin@admin.admin', 'admin@admin.admin')
+        assert user.password.startswith('$pbkdf2-sha256$')
+        assert user.validate_password('admin@admin.admin')
+
+    def test_unit__disable__ok__authentications_invalidated(self):
+        api = UserApi(
+            current_user=None,
+            session=self.session,
+            config=self.config,
+        )
+        user = api.get_one_by_email('admin@admin.admin')
+        previous_cache = get_authenticated_user_cache()
+        set_authenticated_user_cache(AuthenticatedUserCache(ttl=60))
+        try:
+            cache = get_authenticated_user_cache()
+            cache.add('admin@admin.admin', 'admin@admin.admin', user.user_id)
+            api.update(user, name='admin', do_save=True)
+            assert cache.get('admin@admin.admin', 'admin@admin.admin') == user.user_id  # nopep8
+            api.update(user, password='new_password', do_save=True)
+            assert cache.get('admin@admin.admin', 'admin@admin.admin') is None  # nopep8
+            cache.add('admin@admin.admin', 'new_password', user.user_id)
+            api.disable(user, do_save=True)
+            assert cache.get('admin@admin.admin', 'new_password') is None
+        finally:
+            set_authenticated_user_cache(previous_cache)
+
     def test_unit__authenticate_user___err__user_not_active(self):
         api = UserApi(
             current_user=None,
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import time
+
+from tracim_backend.lib.webdav.lock_storage import RedisLockStorage
+from tracim_backend.tests import FakeRedis
+
+
+def create_lock(timeout: int = 60) -> dict:
+    return {
+        'root': None,
+        'depth': 'infinity',
+        'type': 'write',
+        'scope': 'exclusive',
+        'owner': b'bob',
+        'timeout': timeout,
+        'principal': 'bob@fsf.local',
+    }
+
+
+class TestRedisLockStorage(object):
+
+    def test_unit__create__ok__shared_between_storages(self):
+        redis = FakeRedis()
+        lock = RedisLockStorage(redis).create('/workspace/file.txt', create_lock())  # nopep8
+        other_node_storage = RedisLockStorage(redis)
+        assert other_node_storage.get(lock['token'])['owner'] == b'bob'
+        assert other_node_storage.getLockList(
+            '/workspace/file.txt',
+            includeRoot=True,
+            includeChildren=False,
+            tokenOnly=True,
+        ) == [lock['token']]
+        assert other_node_storage.getLockList(
+            '/workspace',
+            includeRoot=False,
+            includeChildren=True,
+            tokenOnly=True,
+        ) == [lock['token']]
+        assert other_node_storage.getLockList(
+            '/other',
+            includeRoot=True,
+            includeChildren=True,
+            tokenOnly=True,
+        ) == []
+
+    def test_unit__refresh__ok__nominal_case(self):
+        storage = RedisLockStorage(FakeRedis())
+        lock = storage.create('/workspace/file.txt', create_lock(timeout=60))
+        lock = storage.refresh(lock['token'], 120)
+        assert lock['timeout'] == 120
+        assert storage.get(lock['token'])['expire'] > time.time() + 60
+
+    def test_unit__delete__ok__nominal_case(self):
+        redis = FakeRedis()
+        storage = RedisLockStorage(redis)
+        lock = storage.create('/workspace/file.txt', create_lock())
+        assert storage.delete(lock['token'])
+        assert storage.get(lock['token']) is None
+        assert not storage.delete(lock['token'])
+        assert storage.getLockList(
+            '/workspace',
+            includeRoot=True,
+            includeChildren=True,
+            tokenOnly=False,
+        ) == []
+        assert redis.data == {}
@@ -12,6 +12,7 @@ from tracim_backend.exceptions import ContentRevisionUpdateError
 from tracim_backend.lib.core.content import ContentApi
 from tracim_backend.models import Content
 from tracim_backend.models.revision_protection import new_revision
+from tracim_backend.models.revision_protection import RevisionsIntegrity
 from tracim_backend.models import User
 from tracim_backend.models.data import ActionDescription
 from tracim_backend.models.data import ContentRevisionRO
@@ -28,6 +29,24 @@ class TestContent(StandardTest):
             content1.description = 'FOO'
         # Raise ContentRevisionUpdateError because revision can't be updated
 
+    def test_update_revision_registry(self):
+        content1 = self.test_create()
+        with new_revision(
+                session=self.session,
+                tm=transaction.manager,
+                content=content1,
+        ):
+            revision = content1.revision
+            assert RevisionsIntegrity.is_updatable(revision)
+            assert revision in self.session.info[
+                RevisionsIntegrity.SESSION_INFO_KEY
+            ]
+            self.session.flush()
+            # revision now have identity but is still updatable
+            content1.description = 'FOO'
+        assert not RevisionsIntegrity.is_updatable(revision)
+        assert not self.session.info[RevisionsIntegrity.SESSION_INFO_KEY]
+
     def test_query(self):
         content1 = self.test_create()
         with new_revision(
@@ -330,3 +349,31 @@ class TestContent(StandardTest):
         # tests content of initialized depot file
         # using depot_file.file of type StoredFile to fetch content back
         eq_(content.depot_file.file.read(), b'test')
+
+    def test_unit__content_properties__ok__decoded_once(self):
+        content = self.test_create()
+        with new_revision(
+                session=self.session,
+                tm=transaction.manager,
+                content=content,
+        ):
+            content.properties = {
+                'allowed_content': {CONTENT_TYPES.Page.slug: True},
+            }
+        content_id = content.content_id
+        transaction.commit()
+        self.session.expunge_all()
+
+        content = self.session.query(Content).get(content_id)
+        assert isinstance(content.revision.properties, dict)
+        properties = content.properties
+        assert properties['allowed_content'] == {
+            CONTENT_TYPES.Page.slug: True,
+        }
+        # returned properties are a copy
+        properties['origin'] = {'content': 1}
+        properties['allowed_content'][CONTENT_TYPES.Thread.slug] = True
+        assert 'origin' not in content.properties
+        assert content.properties['allowed_content'] == {
+            CONTENT_TYPES.Page.slug: True,
+        }
@@ -19,6 +19,12 @@ class TestContentRevision(DefaultTest):
             'depot_file',
             'node',
             'revision_read_statuses',
+            # Preview informations are not cloned columns: they describe
+            # depot_file and are only copied with it (see
+            # ContentRevisionRO.copy_preview_infos)
+            'preview_available',
+            'preview_page_nb',
+            'preview_pdf_available',
         )
         revision_columns = [attr.key for attr in inspect(revision).attrs
                             if attr.key not in excluded_columns]
@@ -15,6 +15,7 @@ from tracim_backend.lib.utils.authorization import require_workspace_role
 from tracim_backend.lib.utils.authorization import require_comment_ownership_or_role
 from tracim_backend.views.controllers import Controller
 from tracim_backend.views.core_api.schemas import CommentSchema
+from tracim_backend.views.core_api.schemas import CommentsFilterQuerySchema
 from tracim_backend.views.core_api.schemas import CommentsPathSchema
 from tracim_backend.views.core_api.schemas import SetCommentSchema
 from tracim_backend.views.core_api.schemas import WorkspaceAndContentIdPathSchema
@@ -32,10 +33,12 @@ class CommentController(Controller):
     @hapic.with_api_doc(tags=[SWAGGER_TAG__COMMENT_ENDPOINTS])
     @require_workspace_role(UserRoleInWorkspace.READER)
     @hapic.input_path(WorkspaceAndContentIdPathSchema())
+    @hapic.input_query(CommentsFilterQuerySchema())
     @hapic.output_body(CommentSchema(many=True))
     def content_comments(self, context, request: TracimRequest, hapic_data=None):
         """
-        Get all comments related to a content in asc order (first is the oldest)
+        Get comments related to a content in asc order (first is the oldest),
+        all of them or a page of them with limit and offset.
         """
 
         # login = hapic_data.body
@@ -51,8 +54,12 @@ class CommentController(Controller):
             hapic_data.path.content_id,
             content_type=CONTENT_TYPES.Any_SLUG
         )
-        comments = content.get_comments()
-        comments.sort(key=lambda comment: comment.created)
+        comments_filter = hapic_data.query
+        comments = api.get_comments(
+            content,
+            limit=comments_filter.limit,
+            offset=comments_filter.offset,
+        )
         return [api.get_content_in_context(comment)
                 for comment in comments
         ]
@@ -30,6 +30,7 @@ from tracim_backend.views.core_api.schemas import FileContentModifySchema
 from tracim_backend.views.core_api.schemas import FileContentSchema
 from tracim_backend.views.core_api.schemas import FileQuerySchema
 from tracim_backend.views.core_api.schemas import FileRevisionSchema
+from tracim_backend.views.core_api.schemas import FileRevisionsFilterQuerySchema
 from tracim_backend.views.core_api.schemas import NoContentSchema
 from tracim_backend.views.core_api.schemas import PageQuerySchema
 from tracim_backend.views.core_api.schemas import \
@@ -530,6 +531,7 @@ class FileController(Controller):
     @require_workspace_role(UserRoleInWorkspace.READER)
     @require_content_types([FILE_TYPE])
     @hapic.input_path(WorkspaceAndContentIdPathSchema())
+    @hapic.input_query(FileRevisionsFilterQuerySchema())
     @hapic.output_body(FileRevisionSchema(many=True))
     def get_file_revisions(
             self,
@@ -552,11 +554,17 @@ class FileController(Controller):
             hapic_data.path.content_id,
             content_type=CONTENT_TYPES.Any_SLUG
         )
-        revisions = content.revisions
-        return [
-            api.get_revision_in_context(revision)
-            for revision in revisions
-        ]
+        revisions_filter = hapic_data.query
+        revisions = api.get_revisions(
+            content,
+            limit=revisions_filter.limit,
+            after_revision_id=revisions_filter.after_revision_id,
+        )
+        return api.get_revisions_in_context(
+            content,
+            revisions,
+            compute_preview_infos=bool(revisions_filter.preview_infos),
+        )
 
     @hapic.with_api_doc(tags=[SWAGGER_TAG__FILE_ENDPOINTS])
     @hapic.handle_exception(EmptyLabelNotAllowed, HTTPStatus.BAD_REQUEST)
@@ -19,10 +19,11 @@ from tracim_backend.models.data import UserRoleInWorkspace
 from tracim_backend.models.revision_protection import new_revision
 from tracim_backend.views.controllers import Controller
 from tracim_backend.views.core_api.schemas import FolderContentModifySchema
+from tracim_backend.views.core_api.schemas import FolderContentSchema
 from tracim_backend.views.core_api.schemas import NoContentSchema
 from tracim_backend.views.core_api.schemas import SetContentStatusSchema
-from tracim_backend.views.core_api.schemas import TextBasedContentSchema
 from tracim_backend.views.core_api.schemas import TextBasedRevisionSchema
+from tracim_backend.views.core_api.schemas import RevisionsFilterQuerySchema
 from tracim_backend.views.core_api.schemas import \
     WorkspaceAndContentIdPathSchema  # nopep8
 
@@ -41,7 +42,7 @@ class FolderController(Controller):
     @require_workspace_role(UserRoleInWorkspace.READER)
     @require_content_types([FOLDER_TYPE])
     @hapic.input_path(WorkspaceAndContentIdPathSchema())
-    @hapic.output_body(TextBasedContentSchema())
+    @hapic.output_body(FolderContentSchema())
     def get_folder(self, context, request: TracimRequest, hapic_data=None) -> ContentInContext:  # nopep8
         """
         Get folder info
@@ -67,7 +68,7 @@ class FolderController(Controller):
     @require_content_types([FOLDER_TYPE])
     @hapic.input_path(WorkspaceAndContentIdPathSchema())
     @hapic.input_body(FolderContentModifySchema())
-    @hapic.output_body(TextBasedContentSchema())
+    @hapic.output_body(FolderContentSchema())
     def update_folder(self, context, request: TracimRequest, hapic_data=None) -> ContentInContext:  # nopep8
         """
         update folder
@@ -106,6 +107,7 @@ class FolderController(Controller):
     @require_workspace_role(UserRoleInWorkspace.READER)
     @require_content_types([FOLDER_TYPE])
     @hapic.input_path(WorkspaceAndContentIdPathSchema())
+    @hapic.input_query(RevisionsFilterQuerySchema())
     @hapic.output_body(TextBasedRevisionSchema(many=True))
     def get_folder_revisions(
             self,
@@ -128,11 +130,16 @@ class FolderController(Controller):
             hapic_data.path.content_id,
             content_type=CONTENT_TYPES.Any_SLUG
         )
-        revisions = content.revisions
-        return [
-            api.get_revision_in_context(revision)
-            for revision in revisions
-        ]
+        revisions_filter = hapic_data.query
+        revisions = api.get_revisions(
+            content,
+            limit=revisions_filter.limit,
+            after_revision_id=revisions_filter.after_revision_id,
+        )
+        return api.get_revisions_in_context(
+            content,
+            revisions,
+        )
 
     @hapic.with_api_doc(tags=[SWAGGER_TAG__Folders_ENDPOINTS])
     @require_workspace_role(UserRoleInWorkspace.CONTRIBUTOR)
@@ -23,6 +23,7 @@ from tracim_backend.views.core_api.schemas import SetContentStatusSchema
 from tracim_backend.views.core_api.schemas import TextBasedContentModifySchema
 from tracim_backend.views.core_api.schemas import TextBasedContentSchema
 from tracim_backend.views.core_api.schemas import TextBasedRevisionSchema
+from tracim_backend.views.core_api.schemas import RevisionsFilterQuerySchema
 from tracim_backend.views.core_api.schemas import \
     WorkspaceAndContentIdPathSchema
 
@@ -102,6 +103,7 @@ class ThreadController(Controller):
     @require_workspace_role(UserRoleInWorkspace.READER)
     @require_content_types([THREAD_TYPE])
     @hapic.input_path(WorkspaceAndContentIdPathSchema())
+    @hapic.input_query(RevisionsFilterQuerySchema())
     @hapic.output_body(TextBasedRevisionSchema(many=True))
     def get_thread_revisions(
             self,
@@ -124,11 +126,16 @@ class ThreadController(Controller):
             hapic_data.path.content_id,
             content_type=CONTENT_TYPES.Any_SLUG
         )
-        revisions = content.revisions
-        return [
-            api.get_revision_in_context(revision)
-            for revision in revisions
-        ]
+        revisions_filter = hapic_data.query
+        revisions = api.get_revisions(
+            content,
+            limit=revisions_filter.limit,
+            after_revision_id=revisions_filter.after_revision_id,
+        )
+        return api.get_revisions_in_context(
+            content,
+            revisions,
+        )
 
     @hapic.with_api_doc(tags=[SWAGGER_TAG__THREAD_ENDPOINTS])
     @require_workspace_role(UserRoleInWorkspace.CONTRIBUTOR)
@@ -14,6 +14,8 @@ from tracim_backend.lib.utils.utils import DATETIME_FORMAT
 from tracim_backend.models.auth import Group
 from tracim_backend.models.auth import Profile
 from tracim_backend.models.context_models import ActiveContentFilter
+from tracim_backend.models.context_models import CommentsFilter
+from tracim_backend.models.context_models import RevisionsFilter
 from tracim_backend.models.context_models import ResetPasswordRequest
 from tracim_backend.models.context_models import ResetPasswordCheckToken
 from tracim_backend.models.context_models import ResetPasswordModify
@@ -485,6 +487,60 @@ class ActiveContentFilterQuerySchema(marshmallow.Schema):
         return ActiveContentFilter(**data)
 
 
+class RevisionsFilterQuerySchema(marshmallow.Schema):
+    limit = marshmallow.fields.Int(
+        example=100,
+        default=0,
+        description='if 0 or not set, return all elements, else return only '
+                    'the first limit elem (according to after_revision_id)',
+        validate=Range(min=0, error="Value must be positive or 0"),
+    )
+    after_revision_id = marshmallow.fields.Int(
+        example=41,
+        default=0,
+        description='return only revisions more recent than this revision, '
+                    'give last revision_id of previous page to get next one',
+        validate=Range(min=0, error="Value must be positive or 0"),
+    )
+
+    @post_load
+    def make_revisions_filter(self, data):
+        return RevisionsFilter(**data)
+
+
+class FileRevisionsFilterQuerySchema(RevisionsFilterQuerySchema):
+    preview_infos = marshmallow.fields.Int(
+        example=1,
+        default=0,
+        description='if 1, page_nb and pdf_available are computed from '
+                    'previews when not already known, which may be slow. '
+                    'If 0, they are only given if already known, '
+                    'pdf_available is null otherwise to tell unknown from '
+                    'unavailable',
+        validate=Range(min=0, max=1, error="Value must be 0 or 1"),
+    )
+
+
+class CommentsFilterQuerySchema(marshmallow.Schema):
+    limit = marshmallow.fields.Int(
+        example=20,
+        default=0,
+        description='if 0 or not set, return all elements, else return only '
+                    'the first limit elem (according to offset)',
+        validate=Range(min=0, error="Value must be positive or 0"),
+    )
+    offset = marshmallow.fields.Int(
+        example=20,
+        default=0,
+        description='number of oldest comments to skip',
+        validate=Range(min=0, error="Value must be positive or 0"),
+    )
+
+    @post_load
+    def make_comments_filter(self, data):
+        return CommentsFilter(**data)
+
+
 class ContentIdsQuerySchema(marshmallow.Schema):
     contents_ids = marshmallow.fields.List(
         marshmallow.fields.Int(
@@ -929,6 +985,41 @@ class ContentSchema(ContentDigestSchema):
     last_modifier = marshmallow.fields.Nested(UserDigestSchema)
 
 
+class ContentChildrenCountSchema(marshmallow.Schema):
+    content_type = marshmallow.fields.Str(
+        attribute='type',
+        example='html-document',
+        validate=all_content_types_validator,
+    )
+    status = marshmallow.fields.Str(
+        example='open',
+        validate=OneOf(CONTENT_STATUS.get_all_slugs_values()),
+    )
+    children_nb = marshmallow.fields.Int(example=3)
+
+
+class FolderStatsAbstractSchema(marshmallow.Schema):
+    children_nb = marshmallow.fields.Int(
+        example=12,
+        description='number of sub contents not deleted nor archived',
+    )
+    children_counts = marshmallow.fields.Nested(
+        ContentChildrenCountSchema,
+        many=True,
+        description='number of sub contents not deleted nor archived, '
+                    'by content type and status',
+    )
+    sub_contents_size = marshmallow.fields.Int(
+        example=1024,
+        description='size in bytes of files in folder and its sub folders, '
+                    'deleted or archived contents excluded',
+    )
+    last_activity = marshmallow.fields.DateTime(
+        format=DATETIME_FORMAT,
+        description='date of last modification of folder or its contents',
+    )
+
+
 class TextBasedDataAbstractSchema(marshmallow.Schema):
     raw_content = marshmallow.fields.String(
         description='Content of the object, may be raw text or <b>html</b> for example'  # nopep8
@@ -955,8 +1046,10 @@ class FileInfoAbstractSchema(marshmallow.Schema):
         allow_none=True,
     )
     pdf_available = marshmallow.fields.Bool(
-        description="Is pdf version of file available ?",
+        description="Is pdf version of file available ? null if not "
+                    "known yet (file revisions without preview_infos)",
         example=True,
+        allow_none=True,
     )
 
 
@@ -967,6 +1060,10 @@ class TextBasedContentSchema(ContentSchema, TextBasedDataAbstractSchema):
 class FileContentSchema(ContentSchema, FileInfoAbstractSchema):
     pass
 
+
+class FolderContentSchema(TextBasedContentSchema, FolderStatsAbstractSchema):
+    pass
+
 #####
 # Revision
 #####